@@ -7,6 +7,14 @@ from flask import Flask
 from flask_cors import CORS
 
 from .routes import register_routes
+from .services.admission import create_admission_controller
+from .services.frame_executor import create_frame_executor
+from .services.job_queue import JobQueue
+from .services.profiler import create_profiler
+from .services.result_cache import create_result_cache
+from .services.single_flight import create_single_flight
+from .services.target_cache import default_target_cache
+from .services.temp_store import create_temp_store
 
 
 def create_app() -> Flask:
@@ -19,14 +27,14 @@ def create_app() -> Flask:
         r"/api/*": {
             "origins": "*",  # Allow all origins for development
             "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-API-Key"],
             "supports_credentials": True
         }
     })
 
     project_root = Path(__file__).resolve().parent.parent
-    temp_dir = project_root / "temp"
-    temp_dir.mkdir(exist_ok=True)
+    temp_dir = Path(os.environ.get("TEMP_IMAGE_DIR", project_root / "temp"))
+    temp_dir.mkdir(parents=True, exist_ok=True)
     
     app.config.update(
         JSON_SORT_KEYS=False,
@@ -36,12 +44,145 @@ def create_app() -> Flask:
         DEFAULT_GIF_FRAME_COUNT=12,
         DEFAULT_GIF_DURATION=80,
         DEFAULT_RESPONSE_FORMAT="json",
+        DEFAULT_GIF_ENCODING="full",
+        # "pillow" (reference) or "numpy" (fused array kernel, needs numpy).
+        BLEND_ENGINE=os.environ.get("BLEND_ENGINE", "pillow"),
+        # Memory cap for the numpy engine's batched animation renderer.
+        FRAME_BATCH_MEMORY_BYTES=64 * 1024 * 1024,
+        # "serial", "thread" or "process"; see app.services.frame_executor.
+        FRAME_EXECUTOR=os.environ.get("FRAME_EXECUTOR", "serial"),
+        FRAME_EXECUTOR_WORKERS=int(os.environ.get("FRAME_EXECUTOR_WORKERS", os.cpu_count() or 1)),
+        # Animations with fewer distinct frames are rendered on the request thread.
+        FRAME_EXECUTOR_MIN_FRAMES=8,
+        # Encode binary/url GIF responses frame by frame instead of in memory.
+        STREAM_GIF_RESPONSES=True,
+        # Largest streamed GIF recorded for the result cache and for identical
+        # waiting requests; bigger ones are only sent, keeping memory bounded.
+        STREAM_RECORD_MAX_BYTES=16 * 1024 * 1024,
+        # Upload limits checked from the image header before any decoding.
+        MAX_IMAGE_PIXELS=40_000_000,
+        # Pixels actually decoded; JPEGs drafted to a smaller scale count less.
+        MAX_DECODE_PIXELS=20_000_000,
+        MAX_INPUT_FRAMES=500,
+        # Frames times pixels per frame, e.g. 25 frames of 2000x2000.
+        MAX_INPUT_FRAME_PIXELS=100_000_000,
+        ALLOWED_IMAGE_FORMATS=("JPEG", "MPO", "PNG", "GIF", "WEBP", "BMP", "TIFF"),
         DEFAULT_TARGET_IMAGE=str(project_root / "assets" / "pfp_transparent.png"),
         TEMP_IMAGE_DIR=str(temp_dir),
         TEMP_IMAGE_URL_BASE=os.environ.get("TEMP_IMAGE_URL_BASE", "http://localhost:8000"),
         TEMP_IMAGE_EXPIRY_HOURS=48,
+        # Oldest temporary images are evicted beyond this many bytes; 0 = no quota.
+        TEMP_IMAGE_MAX_BYTES=int(os.environ.get("TEMP_IMAGE_MAX_BYTES", 2 * 1024 * 1024 * 1024)),
+        # How often the background sweeper expires temporary images.
+        TEMP_SWEEP_INTERVAL_SECONDS=300,
+        # Resized copies of the default target kept per process.
+        TARGET_CACHE_VARIANTS=32,
+        # Memory-mapped target pyramids built by scripts/build_target_pyramid.py.
+        TARGET_PYRAMID_DIR=os.environ.get(
+            "TARGET_PYRAMID_DIR", str(project_root / "assets" / "pyramid")
+        ),
+        # Finished results keyed by input content; 0 disables the memory tier.
+        RESULT_CACHE_MAX_BYTES=int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        # Optional shared on-disk tier, off unless a directory is configured.
+        RESULT_CACHE_DIR=os.environ.get("RESULT_CACHE_DIR"),
+        RESULT_CACHE_DISK_MAX_BYTES=int(
+            os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024)
+        ),
+        # Let identical concurrent requests wait for one computation.
+        SINGLE_FLIGHT=True,
+        # Shared lock directory to also coalesce across local worker processes;
+        # the other processes pick the result up from RESULT_CACHE_DIR.
+        SINGLE_FLIGHT_LOCK_DIR=os.environ.get("SINGLE_FLIGHT_LOCK_DIR"),
+        SINGLE_FLIGHT_WAIT_SECONDS=60.0,
+        # Background transformations submitted through /api/jobs.
+        JOB_WORKERS=int(os.environ.get("JOB_WORKERS", 2)),
+        JOB_QUEUE_SIZE=32,
+        JOB_RETRY_AFTER_SECONDS=5,
+        # /api/transform/batch: sources per request and parallel renders.
+        BATCH_MAX_SOURCES=256,
+        BATCH_WORKERS=int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1)),
+        # Admission control: estimated cost in flight, in weighted output
+        # megapixel-frames (a 1024px PNG costs about 1); 0 disables it.
+        ADMISSION_COST_BUDGET=float(os.environ.get("ADMISSION_COST_BUDGET", 200.0)),
+        ADMISSION_MAX_WAIT_SECONDS=float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", 10.0)),
+        ADMISSION_RETRY_AFTER_SECONDS=5,
+        # Fair-queuing weight per X-API-Key; other clients weigh 1.
+        CLIENT_WEIGHTS={},
+        # Further X-API-Keys accepted as fair-queuing clients, with weight 1.
+        # Unknown keys are queued by remote address.
+        CLIENT_API_KEYS=frozenset(),
+        # Refuse a transform whose estimated memory use is above this, and
+        # abort one once the process RSS grew by this much per running
+        # transform (TransformationError, 422); 0 disables the ceiling.
+        MEMORY_LIMIT_BYTES=int(os.environ.get("MEMORY_LIMIT_BYTES", 0)),
+        # Send X-Memory-Peak-Bytes on complete responses (always in debug mode).
+        MEMORY_DEBUG_HEADER=False,
+        # cProfile captures of single requests: requests signed with
+        # PROFILING_SECRET (X-Profile-Token) and/or a random sample.
+        PROFILING_ENABLED=os.environ.get("PROFILING_ENABLED", "").lower() in {"1", "true", "yes", "on"},
+        PROFILING_SECRET=os.environ.get("PROFILING_SECRET"),
+        PROFILING_SAMPLE_RATE=float(os.environ.get("PROFILING_SAMPLE_RATE", 0.0)),
+        PROFILING_DIR=os.environ.get("PROFILING_DIR", str(project_root / "profiles")),
+        PROFILING_MAX_CAPTURES=50,
+        # Sent as X-Admin-Key to read the /api/admin endpoints that expose
+        # profiles or clients; unset, only a valid X-Profile-Token works.
+        ADMIN_API_KEY=os.environ.get("ADMIN_API_KEY"),
     )
 
+    app.extensions["frame_executor"] = create_frame_executor(
+        app.config["FRAME_EXECUTOR"],
+        max_workers=app.config["FRAME_EXECUTOR_WORKERS"],
+        min_frames=app.config["FRAME_EXECUTOR_MIN_FRAMES"],
+    )
+
+    app.extensions["result_cache"] = create_result_cache(
+        app.config["RESULT_CACHE_MAX_BYTES"],
+        app.config["RESULT_CACHE_DIR"],
+        app.config["RESULT_CACHE_DISK_MAX_BYTES"],
+    )
+
+    app.extensions["single_flight"] = create_single_flight(
+        app.config["SINGLE_FLIGHT"],
+        app.config["SINGLE_FLIGHT_LOCK_DIR"],
+        app.config["SINGLE_FLIGHT_WAIT_SECONDS"],
+    )
+
+    app.extensions["temp_store"] = create_temp_store(
+        app.config["TEMP_IMAGE_DIR"],
+        app.config["TEMP_IMAGE_EXPIRY_HOURS"],
+        app.config["TEMP_IMAGE_MAX_BYTES"],
+        app.config["TEMP_SWEEP_INTERVAL_SECONDS"],
+    )
+
+    app.extensions["job_queue"] = JobQueue(
+        max_workers=app.config["JOB_WORKERS"],
+        max_pending=app.config["JOB_QUEUE_SIZE"],
+        retention_seconds=app.config["TEMP_IMAGE_EXPIRY_HOURS"] * 3600,
+    )
+
+    app.extensions["admission"] = create_admission_controller(
+        app.config["ADMISSION_COST_BUDGET"],
+        app.config["ADMISSION_MAX_WAIT_SECONDS"],
+        app.config["ADMISSION_RETRY_AFTER_SECONDS"],
+    )
+
+    app.extensions["profiler"] = create_profiler(
+        app.config["PROFILING_ENABLED"],
+        app.config["PROFILING_DIR"],
+        app.config["PROFILING_SECRET"],
+        app.config["PROFILING_SAMPLE_RATE"],
+        app.config["PROFILING_MAX_CAPTURES"],
+    )
+
+    # Decode the default target once per process instead of once per request.
+    default_target_cache.max_variants = app.config["TARGET_CACHE_VARIANTS"]
+    default_target_cache.pyramid_dir = app.config["TARGET_PYRAMID_DIR"]
+    try:
+        default_target_cache.preload(app.config["DEFAULT_TARGET_IMAGE"])
+    except (FileNotFoundError, OSError):
+        app.logger.warning("Default target image could not be preloaded.")
+
     register_routes(app)
 
     return app
+
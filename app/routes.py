@@ -1,21 +1,64 @@
 from __future__ import annotations
 
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from contextlib import nullcontext
+from dataclasses import replace
+from functools import partial
 from http import HTTPStatus
-from typing import Any, Dict, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from flask import Blueprint, Flask, current_app, jsonify, request, send_file
+from flask import (
+    Blueprint,
+    Flask,
+    after_this_request,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    jsonify,
+    request,
+    send_file,
+    stream_with_context,
+    url_for,
+)
+from PIL import Image
 
 from .services.transformation_service import (
+    GIF_ENCODINGS,
     TransformationError,
     TransformationRequest,
+    TransformationResult,
+    TransformationStream,
     transform,
+    transform_many,
+    transform_stream,
     load_default_target,
+    load_registered_target,
+)
+from .services.admission import AdmissionRejected, Ticket, estimate_cost
+from .services.job_queue import Job, JobQueueFull
+from .services.metrics import ERRORS, REQUEST_SECONDS, StageTimer, registry, render_samples
+from .services.profiler import PROFILE_HEADER, ProfileCapture
+from .services.result_cache import ResultCache, digest_bytes, digest_stream, request_key
+from .services.single_flight import SingleFlight
+from .utils.image_io import (
+    ImageBudget,
+    ImageDecodingError,
+    ImageRejectedError,
+    decode_base64_bytes,
+    fit_within,
+    load_image_from_bytes,
+    load_image_from_file,
 )
-from .utils.image_io import ImageDecodingError, decode_base64_image, load_image_from_file
 from .utils.temp_file_manager import TempFileManager
 
 api_bp = Blueprint("api", __name__)
-_VALID_RESPONSE_FORMATS = {"json", "binary", "url"}
+_VALID_RESPONSE_FORMATS = {"json", "binary", "url", "multipart"}
+ADMIN_KEY_HEADER = "X-Admin-Key"
 
 
 class RequestValidationError(ValueError):
@@ -31,6 +74,14 @@ def health() -> Tuple[Any, int]:
     return jsonify({"status": "ok"}), HTTPStatus.OK
 
 
+@api_bp.route("/metrics", methods=["GET"])
+def metrics_endpoint() -> Any:
+    """Expose stage timings, errors and service queues in the Prometheus text format."""
+
+    body = registry.render() + _service_metrics()
+    return current_app.response_class(body, mimetype="text/plain; version=0.0.4")
+
+
 @api_bp.route("/api/temp/<filename>", methods=["GET"])
 def serve_temp_image(filename: str) -> Any:
     """Serve a temporary image file."""
@@ -65,69 +116,608 @@ def cleanup_temp_files() -> Tuple[Any, int]:
     }), HTTPStatus.OK
 
 
+@api_bp.route("/api/admin/admission", methods=["GET"])
+def admission_stats() -> Tuple[Any, int]:
+    """Report in-flight cost, queue depth and rejections of the admission controller."""
+
+    admission = current_app.extensions.get("admission")
+    if admission is None:
+        return jsonify({"enabled": False}), HTTPStatus.OK
+    return jsonify({"enabled": True, **admission.stats()}), HTTPStatus.OK
+
+
+@api_bp.route("/api/admin/clients", methods=["GET"])
+def client_stats() -> Tuple[Any, int]:
+    """Report queued and active work per client, as scheduled by admission control, to admins."""
+
+    if not _is_admin():
+        return jsonify({"error": "An admin key is required."}), HTTPStatus.UNAUTHORIZED
+    admission = current_app.extensions.get("admission")
+    clients = admission.clients() if admission is not None else {}
+    return jsonify({"clients": {_redact_client(client): state for client, state in clients.items()}}), HTTPStatus.OK
+
+
+@api_bp.route("/api/admin/profiles", methods=["GET"])
+def list_profiles() -> Tuple[Any, int]:
+    """List recent profile captures, newest first, to admins and profile token holders."""
+
+    profiler = current_app.extensions.get("profiler")
+    if profiler is None:
+        return jsonify({"error": "Profiling is disabled."}), HTTPStatus.NOT_FOUND
+    if not (_is_admin() or profiler.verify(request.headers.get(PROFILE_HEADER))):
+        return jsonify({"error": "An admin key or profile token is required."}), HTTPStatus.UNAUTHORIZED
+    limit = _parse_int(request.args.get("limit"), default=20, lower=1, upper=profiler.max_captures)
+    return jsonify({"enabled": True, "profiles": profiler.captures(limit)}), HTTPStatus.OK
+
+
 @api_bp.route("/api/transform", methods=["POST"])
 def transform_endpoint() -> Any:
+    started = time.perf_counter()
+    # Stages outside transform(): parsing, base64 decoding and temp writes.
+    timer = g.stage_timer = StageTimer()
+    profiler = current_app.extensions.get("profiler")
+    capture = profiler.start(request.headers.get(PROFILE_HEADER)) if profiler is not None else None
+    if capture is None:
+        response = current_app.make_response(_transform_response(timer))
+    else:
+        response = current_app.make_response(capture.run(_transform_response, timer))
+        _finish_profile(capture, response)
+    timer.flush()
+    peak_memory = g.get("peak_memory_bytes")
+    if peak_memory and (current_app.debug or current_app.config["MEMORY_DEBUG_HEADER"]):
+        # Streamed bodies are still being rendered, so only complete results carry it.
+        response.headers["X-Memory-Peak-Bytes"] = str(peak_memory)
+    # Streamed bodies are still being rendered, so stop the clock on close.
+    response.call_on_close(
+        partial(_record_request, "transform", timer, started, response.status_code)
+    )
+    return response
+
+
+def _transform_response(timer: StageTimer) -> Any:
     try:
-        payload, response_format = _deserialize_request()
-        result = transform(payload)
-    except RequestValidationError as exc:
-        return jsonify({"error": exc.message}), HTTPStatus.BAD_REQUEST
-    except ImageDecodingError as exc:
-        return jsonify({"error": str(exc)}), HTTPStatus.BAD_REQUEST
-    except TransformationError as exc:
-        return jsonify({"error": str(exc)}), HTTPStatus.UNPROCESSABLE_ENTITY
-    except Exception:  # pragma: no cover - defensive logging guard
-        current_app.logger.exception("Unexpected failure while processing transformation.")
-        return jsonify({"error": "An unexpected error occurred."}), HTTPStatus.INTERNAL_SERVER_ERROR
+        with timer.stage("parse"):
+            payload, response_format = _deserialize_request()
+        timer.set_labels(payload.make_gif, fit_within(payload.source.size, payload.max_dimension))
+        g.transform_request = (payload, response_format)
+        result = _compute(payload, response_format)
+        if response_format == "url":
+            # Streamed GIFs are rendered while they are written, so failures surface here.
+            temp_filename = _save_temp_result(result)
+        elif isinstance(result, TransformationStream):
+            # Render the first frame before the response starts, so setup errors
+            # still get a status; a failure later in the animation can only end
+            # the connection, leaving a truncated body.
+            result.prime()
+    except Exception as exc:
+        return _error_response(exc)
 
     if response_format == "binary":
         extension = "gif" if result.mime_type == "image/gif" else "png"
         filename = f"obamified.{extension}"
-        response = current_app.response_class(result.data, mimetype=result.mime_type)
+        body = result.chunks if isinstance(result, TransformationStream) else result.data
+        response = current_app.response_class(body, mimetype=result.mime_type)
         response.headers["Content-Disposition"] = f"inline; filename={filename}"
+        if payload.gif_encoding == "delta" and not isinstance(result, TransformationStream):
+            response.headers["X-GIF-Bytes-Saved"] = str(result.bytes_saved)
         response.status_code = HTTPStatus.OK
         return response
 
     if response_format == "url":
-        # Save the image temporarily and return the URL
-        temp_filename = TempFileManager.save_temp_image(result.data, result.mime_type)
-        temp_url = TempFileManager.get_temp_image_url(temp_filename)
-        
-        # Cleanup expired files (optional, can be done periodically)
-        TempFileManager.cleanup_expired_files()
-        
-        return (
-            jsonify(
-                {
-                    "url": temp_url,
+        return jsonify(_url_body(result, payload, temp_filename)), HTTPStatus.OK
+
+    if response_format == "multipart":
+        boundary = uuid.uuid4().hex
+        response = current_app.response_class(
+            _multipart_body(result, payload, boundary),
+            mimetype=f"multipart/mixed; boundary={boundary}",
+        )
+        response.status_code = HTTPStatus.OK
+        return response
+
+    body = {
+        "image": result.as_base64(),
+        "mime_type": result.mime_type,
+        "width": result.width,
+        "height": result.height,
+        "frame_count": result.frame_count,
+    }
+    if payload.gif_encoding == "delta":
+        body["bytes_saved"] = result.bytes_saved
+    return jsonify(body), HTTPStatus.OK
+
+
+@api_bp.route("/api/transform/batch", methods=["POST"])
+def transform_batch_endpoint() -> Any:
+    """Transform many sources against one target, streaming NDJSON results as they finish."""
+
+    try:
+        loaders, template, response_format = _deserialize_batch_request()
+    except Exception as exc:
+        return _error_response(exc)
+
+    results = transform_many(
+        loaders,
+        max_workers=current_app.config["BATCH_WORKERS"],
+        executor=current_app.extensions.get("frame_executor"),
+        admit=_batch_admission(),
+    )
+
+    def generate() -> Iterator[bytes]:
+        for index, result in results:
+            if isinstance(result, Exception):
+                message, status = _describe_error(result)
+                line = {"index": index, "error": message, "status": int(status)}
+            elif response_format == "url":
+                filename = _save_temp_result(result)
+                line = {"index": index, **_url_body(result, template, filename)}
+            else:
+                line = {
+                    "index": index,
+                    "image": result.as_base64(),
                     "mime_type": result.mime_type,
                     "width": result.width,
                     "height": result.height,
                     "frame_count": result.frame_count,
-                    "expires_in_hours": current_app.config["TEMP_IMAGE_EXPIRY_HOURS"],
                 }
-            ),
-            HTTPStatus.OK,
-        )
+            yield (json.dumps(line) + "\n").encode("utf-8")
 
-    return (
-        jsonify(
-            {
-                "image": result.as_base64(),
-                "mime_type": result.mime_type,
-                "width": result.width,
-                "height": result.height,
-                "frame_count": result.frame_count,
-            }
-        ),
-        HTTPStatus.OK,
+    return current_app.response_class(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
     )
 
 
+@api_bp.route("/api/jobs", methods=["POST"])
+def create_job() -> Any:
+    """Accept a transformation and run it in the background."""
+
+    try:
+        payload, _ = _deserialize_request()
+        job = current_app.extensions["job_queue"].submit(
+            partial(_run_job, current_app._get_current_object(), payload, _client_identity())
+        )
+    except JobQueueFull as exc:
+        response = jsonify({"error": str(exc)})
+        response.headers["Retry-After"] = str(current_app.config["JOB_RETRY_AFTER_SECONDS"])
+        return response, HTTPStatus.SERVICE_UNAVAILABLE
+    except Exception as exc:
+        return _error_response(exc)
+
+    status_url = url_for("api.get_job", job_id=job.id)
+    response = jsonify({**job.as_dict(), "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, HTTPStatus.ACCEPTED
+
+
+@api_bp.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str) -> Tuple[Any, int]:
+    job = current_app.extensions["job_queue"].get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), HTTPStatus.NOT_FOUND
+    return jsonify(job.as_dict()), HTTPStatus.OK
+
+
 def register_routes(app: Flask) -> None:
     app.register_blueprint(api_bp)
 
 
+def _error_response(exc: Exception) -> Tuple[Any, int]:
+    message, status = _describe_error(exc)
+    response = jsonify({"error": message})
+    if isinstance(exc, AdmissionRejected):
+        response.headers["Retry-After"] = str(exc.retry_after)
+    return response, status
+
+
+def _describe_error(exc: Exception) -> Tuple[str, int]:
+    ERRORS.inc(type=type(exc).__name__)
+    if isinstance(exc, RequestValidationError):
+        return exc.message, HTTPStatus.BAD_REQUEST
+    if isinstance(exc, ImageRejectedError):
+        status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE if exc.too_large else HTTPStatus.UNPROCESSABLE_ENTITY
+        return str(exc), status
+    if isinstance(exc, ImageDecodingError):
+        return str(exc), HTTPStatus.BAD_REQUEST
+    if isinstance(exc, TransformationError):
+        return str(exc), HTTPStatus.UNPROCESSABLE_ENTITY
+    if isinstance(exc, AdmissionRejected):
+        return str(exc), HTTPStatus.SERVICE_UNAVAILABLE
+    current_app.logger.exception("Unexpected failure while processing transformation.", exc_info=exc)
+    return "An unexpected error occurred.", HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def _compute(
+    payload: TransformationRequest,
+    response_format: str,
+    background: bool = False,
+    client: Optional[Tuple[str, float]] = None,
+) -> Any:
+    """Return the result for ``payload`` from the cache, an identical request in flight, or a new render.
+
+    Only new renders go through admission control, queued as ``client``
+    (``(client id, weight)``, by default the current request's client).
+    ``background`` work waits for capacity without a time limit instead of
+    being rejected.
+    """
+
+    cache = current_app.extensions.get("result_cache")
+    flight = current_app.extensions.get("single_flight")
+    cache_key = request_key(payload) if cache or flight else None
+    result = cache.get(cache_key) if cache and cache_key else None
+    if result is None:
+        result = _run_transform(payload, response_format, cache, flight, cache_key, background, client)
+        if has_request_context() and not isinstance(result, TransformationStream):
+            g.peak_memory_bytes = result.peak_memory_bytes
+    return result
+
+
+def _is_admin() -> bool:
+    """Whether the request carries the configured ``ADMIN_API_KEY`` in ``X-Admin-Key``."""
+
+    admin_key = current_app.config["ADMIN_API_KEY"]
+    supplied = request.headers.get(ADMIN_KEY_HEADER)
+    if not admin_key or not supplied:
+        return False
+    return hmac.compare_digest(supplied.encode("utf-8"), admin_key.encode("utf-8"))
+
+
+def _redact_client(client: str) -> str:
+    """Client id safe to report: API keys are already hashed, addresses are hashed here."""
+
+    kind, _, value = client.partition(":")
+    if kind == "key":
+        return client
+    return f"{kind}:" + hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+
+
+def _client_identity() -> Tuple[str, float]:
+    """Return the fair-queuing client id and weight of the current request.
+
+    Clients are told apart by ``X-API-Key`` when it is a known key (only a
+    hash of the key is kept), and by remote address otherwise, so made-up
+    keys cannot open new flows to get around fair queuing.
+    """
+
+    api_key = request.headers.get("X-API-Key")
+    weights = current_app.config["CLIENT_WEIGHTS"]
+    if api_key and (api_key in weights or api_key in current_app.config["CLIENT_API_KEYS"]):
+        client = "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        return client, float(weights.get(api_key, 1.0))
+    return f"addr:{request.remote_addr or 'unknown'}", 1.0
+
+
+def _admit(
+    payload: TransformationRequest, background: bool, client: Optional[Tuple[str, float]]
+) -> Optional[Ticket]:
+    admission = current_app.extensions.get("admission")
+    if admission is None:
+        return None
+    if client is None:
+        client = _client_identity() if has_request_context() else ("", 1.0)
+    client_id, weight = client
+    return admission.acquire(
+        estimate_cost(payload),
+        timeout=None if background else -1.0,
+        client=client_id,
+        weight=weight,
+    )
+
+
+def _batch_admission() -> Optional[Callable[[TransformationRequest], Callable[[], None]]]:
+    """Charge each batch item to the admission budget from the batch's worker threads."""
+
+    admission = current_app.extensions.get("admission")
+    if admission is None:
+        return None
+    client_id, weight = _client_identity()
+
+    def admit(payload: TransformationRequest) -> Callable[[], None]:
+        return admission.acquire(estimate_cost(payload), client=client_id, weight=weight).release
+
+    return admit
+
+
+def _hold_admission(result: Any, ticket: Optional[Ticket]) -> Any:
+    """Release ``ticket`` now, or for a stream once its body has been sent."""
+
+    if ticket is None:
+        return result
+    if not isinstance(result, TransformationStream):
+        ticket.release()
+        return result
+    result.on_close(ticket.release)
+    if has_request_context():
+        # Also covers a response closed before its body was ever iterated.
+        @after_this_request
+        def release_on_close(response: Any) -> Any:
+            response.call_on_close(ticket.release)
+            return response
+
+    return result
+
+
+def _run_job(
+    app: Flask, payload: TransformationRequest, client: Tuple[str, float], job: Job
+) -> Optional[Dict[str, Any]]:
+    with app.app_context():
+        try:
+            result = _compute(payload, "url", background=True, client=client)
+            filename = _save_temp_result(result, job)
+        except Exception as exc:
+            message, status = _describe_error(exc)
+            job.fail(message, int(status))
+            return None
+        return _url_body(result, payload, filename)
+
+
+def _save_temp_result(result: Any, job: Optional[Job] = None) -> str:
+    if not isinstance(result, TransformationStream):
+        with _stage("temp_write"):
+            return TempFileManager.save_temp_image(result.data, result.mime_type)
+    chunks = result.chunks
+    if job is not None:
+        chunks = _track_progress(result, job)
+    timer = _current_timer()
+    if timer is None:
+        return TempFileManager.save_temp_stream(chunks, result.mime_type)
+    # A streamed GIF is rendered while it is written; only count the writing.
+    rendering = [0.0]
+    started = time.perf_counter()
+    filename = TempFileManager.save_temp_stream(_time_production(chunks, rendering), result.mime_type)
+    timer.add("temp_write", time.perf_counter() - started - rendering[0])
+    return filename
+
+
+def _time_production(chunks: Iterator[bytes], elapsed: List[float]) -> Iterator[bytes]:
+    """Yield ``chunks``, adding the time spent producing them to ``elapsed[0]``."""
+
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            elapsed[0] += time.perf_counter() - started
+        yield chunk
+
+
+def _current_timer() -> Optional[StageTimer]:
+    return g.get("stage_timer") if has_app_context() else None
+
+
+def _stage(name: str) -> Any:
+    timer = _current_timer()
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def _finish_profile(capture: ProfileCapture, response: Any) -> None:
+    """Profile the rest of a streamed body too, and save the capture once the response closes."""
+
+    metadata: Dict[str, Any] = {"status": response.status_code}
+    parsed = g.get("transform_request")
+    if parsed is not None:
+        payload, response_format = parsed
+        metadata["params"] = {
+            "response_format": response_format,
+            "blend_ratio": payload.blend_ratio,
+            "make_gif": payload.make_gif,
+            "gif_frame_count": payload.gif_frame_count,
+            "gif_duration": payload.gif_duration,
+            "gif_encoding": payload.gif_encoding,
+            "max_dimension": payload.max_dimension,
+            "engine": payload.engine,
+        }
+        metadata["source"] = {"format": payload.source.format, "size": list(payload.source.size)}
+        metadata["target"] = {"default": payload.target_path is not None, "size": list(payload.target.size)}
+        metadata["output_size"] = list(fit_within(payload.source.size, payload.max_dimension))
+    if response.is_streamed:
+        response.response = capture.wrap(response.response)
+    response.call_on_close(partial(capture.finish, metadata))
+
+
+def _record_request(endpoint: str, timer: StageTimer, started: float, status: int) -> None:
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        endpoint=endpoint,
+        format=timer.format,
+        size=timer.size,
+        status=str(status),
+    )
+
+
+def _service_metrics() -> str:
+    """Render the current state of the per-app services (admission, caches, queues)."""
+
+    extensions = current_app.extensions
+    metrics: List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]] = []
+    admission = extensions.get("admission")
+    if admission is not None:
+        stats = admission.stats()
+        metrics += [
+            ("obamify_admission_queue_depth", "gauge", "Requests waiting for admission.",
+             [({}, stats["queue_depth"])]),
+            ("obamify_admission_running", "gauge", "Admitted renders in flight.",
+             [({}, stats["running"])]),
+            ("obamify_admission_in_flight_cost", "gauge", "Estimated cost of the renders in flight.",
+             [({}, stats["in_flight_cost"])]),
+            ("obamify_admission_admitted_total", "counter", "Renders admitted.",
+             [({}, stats["admitted"])]),
+            ("obamify_admission_rejected_total", "counter", "Requests rejected while waiting for admission.",
+             [({}, stats["rejected"])]),
+        ]
+    cache = extensions.get("result_cache")
+    if cache is not None:
+        stats = cache.stats()
+        metrics += [
+            ("obamify_result_cache_lookups_total", "counter", "Result cache lookups by outcome.",
+             [({"outcome": "hit"}, stats["hits"]),
+              ({"outcome": "disk_hit"}, stats["disk_hits"]),
+              ({"outcome": "miss"}, stats["misses"])]),
+            ("obamify_result_cache_bytes", "gauge", "Bytes held by the in-memory result cache.",
+             [({}, stats["bytes"])]),
+        ]
+    flight = extensions.get("single_flight")
+    if flight is not None:
+        metrics.append(
+            ("obamify_coalesced_requests_total", "counter",
+             "Requests that shared an identical in-flight computation.", [({}, flight.coalesced)])
+        )
+    store = extensions.get("temp_store")
+    if store is not None:
+        stats = store.stats()
+        metrics += [
+            ("obamify_temp_images", "gauge", "Temporary images indexed by this process.",
+             [({}, stats["files"])]),
+            ("obamify_temp_image_bytes", "gauge", "Bytes of temporary images indexed by this process.",
+             [({}, stats["bytes"])]),
+            ("obamify_temp_images_removed_total", "counter", "Temporary images removed, by reason.",
+             [({"reason": "expired"}, stats["expired"]), ({"reason": "quota"}, stats["evicted"])]),
+        ]
+    jobs = extensions.get("job_queue")
+    if jobs is not None:
+        metrics.append(
+            ("obamify_jobs_pending", "gauge", "Background jobs waiting for a worker.", [({}, jobs.pending())])
+        )
+    return "".join(
+        render_samples(name, help_text, metric_type, samples)
+        for name, metric_type, help_text, samples in metrics
+    )
+
+
+def _track_progress(stream: TransformationStream, job: Job) -> Iterator[bytes]:
+    for chunk in stream.chunks:
+        job.progress = stream.frames_encoded / max(1, stream.frame_count)
+        yield chunk
+
+
+def _url_body(result: Any, payload: TransformationRequest, filename: str) -> Dict[str, Any]:
+    body = {
+        "url": TempFileManager.get_temp_image_url(filename),
+        "mime_type": result.mime_type,
+        "width": result.width,
+        "height": result.height,
+        "frame_count": result.frame_count,
+        "expires_in_hours": current_app.config["TEMP_IMAGE_EXPIRY_HOURS"],
+    }
+    if payload.gif_encoding == "delta":
+        body["bytes_saved"] = result.bytes_saved
+    return body
+
+
+def _run_transform(
+    payload: TransformationRequest,
+    response_format: str,
+    cache: Optional[ResultCache],
+    flight: Optional[SingleFlight],
+    cache_key: Optional[str],
+    background: bool = False,
+    client: Optional[Tuple[str, float]] = None,
+) -> Any:
+    executor = current_app.extensions.get("frame_executor")
+
+    def render(stream: bool = False) -> Any:
+        ticket = _admit(payload, background, client)
+        try:
+            if stream:
+                result = transform_stream(payload, executor=executor)
+            else:
+                result = transform(payload, executor=executor)
+        except BaseException:
+            if ticket is not None:
+                ticket.release()
+            raise
+        return _hold_admission(result, ticket)
+
+    def compute() -> TransformationResult:
+        result = render()
+        if cache is not None and cache_key is not None:
+            cache.put(cache_key, result)
+        return result
+
+    if cache_key is None:
+        return render(_should_stream(payload, response_format))
+
+    if _should_stream(payload, response_format) and (flight is None or flight.lock_dir is None):
+        leader, call = flight.join(cache_key) if flight is not None else (True, None)
+        if not leader:
+            result = flight.wait(call)
+            return result if result is not None else compute()
+
+        def finish(result: Optional[TransformationResult]) -> None:
+            if result is not None and cache is not None:
+                cache.put(cache_key, result)
+            if call is not None:
+                flight.publish(cache_key, call, result)
+
+        try:
+            stream = render(stream=True)
+        except BaseException as exc:
+            if call is not None:
+                flight.publish(cache_key, call, error=exc)
+            raise
+        # The response body is recorded while it is sent, then cached and
+        # handed to any identical requests that arrived in the meantime. Past
+        # the cap nothing is kept, and the waiters compute for themselves.
+        limit = current_app.config["STREAM_RECORD_MAX_BYTES"]
+        if cache is not None:
+            limit = min(limit, cache.entry_limit)
+        return stream.tee(finish, limit)
+
+    if flight is not None:
+        # Identical concurrent requests share one result. Across processes the
+        # lock holder computes it and the others then find it in the cache.
+        recheck = (lambda: cache.get(cache_key)) if cache is not None else None
+        return flight.do(cache_key, compute, recheck)
+    return compute()
+
+
+def _multipart_body(result: Any, payload: TransformationRequest, boundary: str) -> Iterator[bytes]:
+    """Yield a ``multipart/mixed`` body: JSON metadata, then the raw image bytes.
+
+    This carries the same fields as the ``json`` format without base64, so the
+    image is sent (and, for GIFs, streamed) as-is.
+    """
+
+    metadata = {
+        "mime_type": result.mime_type,
+        "width": result.width,
+        "height": result.height,
+        "frame_count": result.frame_count,
+    }
+    streamed = isinstance(result, TransformationStream)
+    if payload.gif_encoding == "delta" and not streamed:
+        metadata["bytes_saved"] = result.bytes_saved
+    extension = "gif" if result.mime_type == "image/gif" else "png"
+
+    yield (
+        f"--{boundary}\r\n"
+        "Content-Type: application/json\r\n\r\n"
+        f"{json.dumps(metadata)}\r\n"
+        f"--{boundary}\r\n"
+        f"Content-Type: {result.mime_type}\r\n"
+        f"Content-Disposition: inline; filename=obamified.{extension}\r\n"
+    ).encode("ascii")
+    if streamed:
+        yield b"\r\n"
+        yield from result.chunks
+    else:
+        yield f"Content-Length: {len(result.data)}\r\n\r\n".encode("ascii")
+        yield result.data
+    yield f"\r\n--{boundary}--\r\n".encode("ascii")
+
+
+def _should_stream(payload: TransformationRequest, response_format: str) -> bool:
+    # JSON responses need the whole image for base64, so only binary, url and
+    # multipart GIF responses are encoded frame by frame.
+    return (
+        payload.make_gif
+        and response_format in {"binary", "url", "multipart"}
+        and current_app.config["STREAM_GIF_RESPONSES"]
+    )
+
+
 def _deserialize_request() -> Tuple[TransformationRequest, str]:
     config = current_app.config
 
@@ -145,24 +735,83 @@ def _deserialize_request() -> Tuple[TransformationRequest, str]:
     raise RequestValidationError("Unsupported payload type. Use JSON or multipart/form-data.")
 
 
+def _deserialize_batch_request() -> Tuple[List[Any], TransformationRequest, str]:
+    """Return one request (or loader) per source, the request they share options with, and the format."""
+
+    config = current_app.config
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise RequestValidationError("Request body must be a JSON object.")
+        sources = data.get("source_images")
+        if not isinstance(sources, list):
+            raise RequestValidationError("source_images must be a list of base64 images.")
+    elif request.files:
+        data = {**request.form}
+        data.update({key: request.files[key] for key in request.files if key != "source_images"})
+        sources = request.files.getlist("source_images")
+    else:
+        raise RequestValidationError("Unsupported payload type. Use JSON or multipart/form-data.")
+
+    if not sources:
+        raise RequestValidationError("source_images must contain at least one image.")
+    if len(sources) > config["BATCH_MAX_SOURCES"]:
+        raise RequestValidationError(
+            f"A batch may contain at most {config['BATCH_MAX_SOURCES']} source images."
+        )
+
+    # The first source is parsed with the shared options (and the target);
+    # the rest only swap in their own decoded source.
+    if request.is_json:
+        template, response_format = _deserialize_from_mapping({**data, "source_image": sources[0]}, config)
+    else:
+        template, response_format = _deserialize_from_multipart({**data, "source_image": sources[0]}, config)
+    if response_format not in {"json", "url"}:
+        raise RequestValidationError("Batch responses support response_format 'json' or 'url'.")
+
+    budget = _image_budget(config)
+    # Remaining sources are decoded lazily, on the batch worker threads.
+    loaders: List[Any] = [template]
+    loaders.extend(partial(_batch_payload, template, source, budget) for source in sources[1:])
+    return loaders, template, response_format
+
+
+def _batch_payload(template: TransformationRequest, source: Any, budget: ImageBudget) -> TransformationRequest:
+    if hasattr(source, "stream"):
+        image, digest = _load_upload(source, template.max_dimension, budget)
+    else:
+        image, digest = _decode_base64_field(str(source), template.max_dimension, budget)
+    return replace(template, source=image, source_digest=digest)
+
+
 def _deserialize_from_mapping(data: Dict[str, Any], config: Dict[str, Any]) -> Tuple[TransformationRequest, str]:
     source_payload = data.get("source_image")
     if not source_payload:
         raise RequestValidationError("source_image is required.")
 
-    try:
-        source = decode_base64_image(str(source_payload))
-    except ImageDecodingError as exc:
-        raise RequestValidationError(str(exc)) from exc
+    # Parsed first so the decoders can skip resolution the output won't use.
+    max_dimension = _parse_int(
+        data.get("max_dimension", data.get("size")),
+        default=config["DEFAULT_MAX_IMAGE_DIMENSION"],
+        lower=64,
+        upper=4096,
+    )
+    budget = _image_budget(config)
+    source, source_digest = _decode_base64_field(str(source_payload), max_dimension, budget)
 
     target_image = data.get("target_image")
+    target_path = None
+    target_id = None
+    target_digest = None
     if target_image:
-        try:
-            target = decode_base64_image(str(target_image))
-        except ImageDecodingError as exc:
-            raise RequestValidationError(str(exc)) from exc
+        target, target_digest = _decode_base64_field(str(target_image), max_dimension, budget)
+    elif data.get("target_id"):
+        target, target_id = _registered_target(data["target_id"])
+        target_digest = target_id
     else:
-        target = load_default_target(config["DEFAULT_TARGET_IMAGE"])
+        target_path = config["DEFAULT_TARGET_IMAGE"]
+        target = load_default_target(target_path)
 
     blend_ratio = _parse_float(
         data.get("blend_ratio", data.get("proximity_importance")),
@@ -183,15 +832,10 @@ def _deserialize_from_mapping(data: Dict[str, Any], config: Dict[str, Any]) -> T
         lower=20,
         upper=5000,
     )
-    max_dimension = _parse_int(
-        data.get("max_dimension", data.get("size")),
-        default=config["DEFAULT_MAX_IMAGE_DIMENSION"],
-        lower=64,
-        upper=4096,
-    )
     response_format = _parse_response_format(
         data.get("response_format", config["DEFAULT_RESPONSE_FORMAT"])
     )
+    gif_encoding = _parse_gif_encoding(data.get("gif_encoding", config["DEFAULT_GIF_ENCODING"]))
 
     payload = TransformationRequest(
         source=source,
@@ -201,6 +845,14 @@ def _deserialize_from_mapping(data: Dict[str, Any], config: Dict[str, Any]) -> T
         gif_frame_count=gif_frame_count,
         gif_duration=gif_duration,
         max_dimension=max_dimension,
+        engine=config["BLEND_ENGINE"],
+        frame_batch_bytes=config["FRAME_BATCH_MEMORY_BYTES"],
+        gif_encoding=gif_encoding,
+        target_path=target_path,
+        target_id=target_id,
+        source_digest=source_digest,
+        target_digest=target_digest,
+        memory_limit_bytes=config["MEMORY_LIMIT_BYTES"],
     )
 
     return payload, response_format
@@ -211,31 +863,37 @@ def _deserialize_from_multipart(data: Dict[str, Any], config: Dict[str, Any]) ->
     if source_field is None:
         raise RequestValidationError("source_image is required.")
 
+    # Parsed first so the decoders can skip resolution the output won't use.
+    max_dimension = _parse_int(
+        data.get("max_dimension", data.get("size")),
+        default=config["DEFAULT_MAX_IMAGE_DIMENSION"],
+        lower=64,
+        upper=4096,
+    )
+    budget = _image_budget(config)
     if isinstance(source_field, (str, bytes)):
         raw_source = source_field if isinstance(source_field, str) else source_field.decode("utf-8", errors="ignore")
-        try:
-            source = decode_base64_image(raw_source)
-        except ImageDecodingError as exc:
-            raise RequestValidationError(str(exc)) from exc
+        source, source_digest = _decode_base64_field(raw_source, max_dimension, budget)
     else:
-        source = load_image_from_file(source_field)
+        source, source_digest = _load_upload(source_field, max_dimension, budget)
 
     target_field = data.get("target_image")
+    target_path = None
+    target_id = None
+    target_digest = None
     if hasattr(target_field, "stream"):
-        target = load_image_from_file(target_field)
+        target, target_digest = _load_upload(target_field, max_dimension, budget)
     elif isinstance(target_field, bytes):
         raw_target = target_field.decode("utf-8", errors="ignore")
-        try:
-            target = decode_base64_image(raw_target)
-        except ImageDecodingError as exc:
-            raise RequestValidationError(str(exc)) from exc
+        target, target_digest = _decode_base64_field(raw_target, max_dimension, budget)
     elif isinstance(target_field, str) and target_field.strip():
-        try:
-            target = decode_base64_image(target_field)
-        except ImageDecodingError as exc:
-            raise RequestValidationError(str(exc)) from exc
+        target, target_digest = _decode_base64_field(target_field, max_dimension, budget)
+    elif data.get("target_id"):
+        target, target_id = _registered_target(data["target_id"])
+        target_digest = target_id
     else:
-        target = load_default_target(config["DEFAULT_TARGET_IMAGE"])
+        target_path = config["DEFAULT_TARGET_IMAGE"]
+        target = load_default_target(target_path)
 
     blend_ratio = _parse_float(
         data.get("blend_ratio", data.get("proximity_importance")),
@@ -256,15 +914,10 @@ def _deserialize_from_multipart(data: Dict[str, Any], config: Dict[str, Any]) ->
         lower=20,
         upper=5000,
     )
-    max_dimension = _parse_int(
-        data.get("max_dimension", data.get("size")),
-        default=config["DEFAULT_MAX_IMAGE_DIMENSION"],
-        lower=64,
-        upper=4096,
-    )
     response_format = _parse_response_format(
         data.get("response_format", config["DEFAULT_RESPONSE_FORMAT"])
     )
+    gif_encoding = _parse_gif_encoding(data.get("gif_encoding", config["DEFAULT_GIF_ENCODING"]))
 
     payload = TransformationRequest(
         source=source,
@@ -274,11 +927,60 @@ def _deserialize_from_multipart(data: Dict[str, Any], config: Dict[str, Any]) ->
         gif_frame_count=gif_frame_count,
         gif_duration=gif_duration,
         max_dimension=max_dimension,
+        engine=config["BLEND_ENGINE"],
+        frame_batch_bytes=config["FRAME_BATCH_MEMORY_BYTES"],
+        gif_encoding=gif_encoding,
+        target_path=target_path,
+        target_id=target_id,
+        source_digest=source_digest,
+        target_digest=target_digest,
+        memory_limit_bytes=config["MEMORY_LIMIT_BYTES"],
     )
 
     return payload, response_format
 
 
+def _registered_target(value: Any) -> Tuple[Image.Image, str]:
+    # The id is the SHA-256 of the target file, the same digest an upload of
+    # that file gets, so both share result cache entries.
+    target_id = str(value).strip().lower()
+    try:
+        return load_registered_target(target_id), target_id
+    except TransformationError as exc:
+        raise RequestValidationError(str(exc)) from None
+
+
+def _image_budget(config: Dict[str, Any]) -> ImageBudget:
+    formats = config["ALLOWED_IMAGE_FORMATS"]
+    return ImageBudget(
+        max_pixels=config["MAX_IMAGE_PIXELS"],
+        max_decode_pixels=config["MAX_DECODE_PIXELS"],
+        max_frames=config["MAX_INPUT_FRAMES"],
+        max_frame_pixels=config["MAX_INPUT_FRAME_PIXELS"],
+        formats=frozenset(formats) if formats else None,
+    )
+
+
+def _decode_base64_field(
+    value: str, max_dimension: int, budget: ImageBudget
+) -> Tuple[Image.Image, str]:
+    try:
+        with _stage("base64_decode"):
+            binary = decode_base64_bytes(value)
+        return load_image_from_bytes(binary, max_dimension, budget), digest_bytes(binary)
+    except ImageRejectedError:
+        raise
+    except ImageDecodingError as exc:
+        raise RequestValidationError(str(exc)) from exc
+
+
+def _load_upload(
+    file: Any, max_dimension: int, budget: ImageBudget
+) -> Tuple[Image.Image, Optional[str]]:
+    digest = digest_stream(file.stream) if file is not None else None
+    return load_image_from_file(file, max_dimension, budget), digest
+
+
 def _parse_response_format(value: Any) -> str:
     if not value:
         return "json"
@@ -290,6 +992,15 @@ def _parse_response_format(value: Any) -> str:
     return candidate
 
 
+def _parse_gif_encoding(value: Any) -> str:
+    if not value:
+        return "full"
+    candidate = str(value).strip().lower()
+    if candidate not in GIF_ENCODINGS:
+        raise RequestValidationError(f"gif_encoding must be one of {sorted(GIF_ENCODINGS)}")
+    return candidate
+
+
 def _parse_bool(value: Any, *, default: bool) -> bool:
     if value is None:
         return default
@@ -0,0 +1,259 @@
+"""Cost-based admission control for transformations.
+
+Every request is given an estimated cost before any rendering starts (see
+:func:`estimate_cost`). :class:`AdmissionController` admits requests while the
+total cost in flight stays within a budget. Requests that do not fit wait for
+capacity for a bounded time and are then rejected with
+:class:`AdmissionRejected`, so a burst of huge GIFs queues up instead of
+taking every worker, and small requests keep predictable latency.
+
+A request costing more than the whole budget is admitted only when nothing
+else is running. Once it is first in line no new work is admitted, so the
+work in flight drains and it runs even under steady traffic.
+
+Waiting requests are queued per client (API key or remote address) and
+dispatched by weighted fair queuing on their estimated cost, so one heavy
+client cannot starve the others.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from ..utils.image_io import fit_within
+from .transformation_service import TransformationRequest
+
+# Relative cost of one output pixel-frame. GIF frames are also quantized and
+# LZW-encoded, which costs roughly half as much again as rendering them.
+FORMAT_WEIGHTS = {"image/png": 1.0, "image/gif": 1.5}
+
+
+def estimate_cost(payload: TransformationRequest) -> float:
+    """Estimate the work for ``payload`` in weighted output megapixel-frames."""
+
+    width, height = fit_within(payload.source.size, payload.max_dimension)
+    if payload.make_gif:
+        frames = max(2, payload.gif_frame_count)
+        weight = FORMAT_WEIGHTS["image/gif"]
+    else:
+        frames = 1
+        weight = FORMAT_WEIGHTS["image/png"]
+    return width * height * frames * weight / 1_000_000
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request could not be admitted within the wait limit."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Admitted cost that must be released exactly once when the work ends."""
+
+    def __init__(self, controller: "AdmissionController", cost: float, client: str) -> None:
+        self._controller = controller
+        self.cost = cost
+        self.client = client
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release(self.cost, self.client)
+
+
+@dataclass
+class ClientState:
+    """Queued and running work of one client."""
+
+    weight: float = 1.0
+    queued: int = 0
+    queued_cost: float = 0.0
+    active: int = 0
+    active_cost: float = 0.0
+    admitted: int = 0
+    rejected: int = 0
+    # Virtual time at which the client's last queued request finishes.
+    last_finish: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "weight": self.weight,
+            "queued": self.queued,
+            "queued_cost": round(self.queued_cost, 3),
+            "active": self.active,
+            "active_cost": round(self.active_cost, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+@dataclass
+class _Waiter:
+    cost: float
+    client: str
+    start: float
+    finish: float
+    sequence: int
+    granted: threading.Event = field(default_factory=threading.Event)
+
+
+class AdmissionController:
+    """Admit work while the in-flight cost stays within ``budget``.
+
+    Waiting requests are dispatched by start-time fair queuing per client: a
+    request's virtual start is where its client's previous request finishes,
+    at ``cost / weight`` per request. A client that queues many large GIFs
+    therefore only gets its weighted share, and every other client's next
+    request is dispatched ahead of that backlog. A request which fits is not
+    held back behind one that does not, so cheap requests keep flowing while
+    a large one waits for room, unless the large one costs more than the
+    whole budget: then nothing queued after it is admitted until it has run.
+    """
+
+    def __init__(self, budget: float, max_wait: float = 10.0, retry_after: int = 5) -> None:
+        self.budget = budget
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._in_flight = 0.0
+        self._running = 0
+        self._waiters: List[_Waiter] = []
+        self._clients: Dict[str, ClientState] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+
+    def acquire(
+        self,
+        cost: float,
+        timeout: Optional[float] = -1.0,
+        client: str = "",
+        weight: float = 1.0,
+    ) -> Ticket:
+        """Block until ``cost`` fits in the budget and return its :class:`Ticket`.
+
+        ``timeout`` defaults to ``max_wait``; ``None`` waits indefinitely.
+        ``client`` identifies the fair-queuing flow and ``weight`` its share.
+        Raises :class:`AdmissionRejected` when the wait runs out.
+        """
+
+        if timeout is not None and timeout < 0:
+            timeout = self.max_wait
+        started = time.monotonic()
+        with self._lock:
+            state = self._clients.setdefault(client, ClientState())
+            state.weight = max(weight, 1e-6)
+            start = max(self._virtual_time, state.last_finish)
+            state.last_finish = start + cost / state.weight
+            state.queued += 1
+            state.queued_cost += cost
+            waiter = _Waiter(cost, client, start, state.last_finish, next(self._sequence))
+            self._waiters.append(waiter)
+            self._dispatch()
+        if not waiter.granted.wait(timeout):
+            with self._lock:
+                # Granted between the timeout and taking the lock: keep it.
+                if not waiter.granted.is_set():
+                    self._waiters.remove(waiter)
+                    state.queued -= 1
+                    state.queued_cost -= cost
+                    state.rejected += 1
+                    if state.last_finish == waiter.finish:
+                        # Give back the virtual time of work that never ran.
+                        state.last_finish = waiter.start
+                    self.rejected += 1
+                    self._prune_idle()
+                    raise AdmissionRejected(
+                        "The server is busy with other transformations; retry later.",
+                        self.retry_after,
+                    )
+        with self._lock:
+            self.total_wait_seconds += time.monotonic() - started
+        return Ticket(self, cost, client)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "in_flight_cost": round(self._in_flight, 3),
+                "running": self._running,
+                "queue_depth": len(self._waiters),
+                "queued_cost": round(sum(waiter.cost for waiter in self._waiters), 3),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "total_wait_seconds": round(self.total_wait_seconds, 3),
+                "clients": len(self._clients),
+            }
+
+    def clients(self) -> Dict[str, Dict[str, float]]:
+        """Queued and active work of every client with recent work, keyed by client id."""
+
+        with self._lock:
+            return {client: state.as_dict() for client, state in self._clients.items()}
+
+    def _release(self, cost: float, client: str) -> None:
+        with self._lock:
+            self._in_flight = max(0.0, self._in_flight - cost)
+            self._running -= 1
+            state = self._clients.get(client)
+            if state is not None:
+                state.active -= 1
+                state.active_cost = max(0.0, state.active_cost - cost)
+            self._dispatch()
+            self._prune_idle()
+
+    def _dispatch(self) -> None:
+        # Called with the lock held.
+        self._waiters.sort(key=lambda waiter: (waiter.start, waiter.sequence))
+        for waiter in list(self._waiters):
+            if self._running and self._in_flight + waiter.cost > self.budget:
+                if waiter.cost > self.budget:
+                    # It can only run alone, so let the running work drain.
+                    break
+                continue
+            self._waiters.remove(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.start)
+            self._in_flight += waiter.cost
+            self._running += 1
+            self.admitted += 1
+            state = self._clients[waiter.client]
+            state.queued -= 1
+            state.queued_cost -= waiter.cost
+            state.active += 1
+            state.active_cost += waiter.cost
+            state.admitted += 1
+            waiter.granted.set()
+
+    def _prune_idle(self) -> None:
+        # Called with the lock held. Without a backlog there is nothing to be
+        # fair about, so virtual time catches up with every client. A client
+        # is dropped once it has no work left and no virtual-time lead over
+        # the others, so the table only holds clients with recent work.
+        if not self._waiters:
+            for state in self._clients.values():
+                self._virtual_time = max(self._virtual_time, state.last_finish)
+        for client, state in list(self._clients.items()):
+            if not state.queued and not state.active and state.last_finish <= self._virtual_time:
+                del self._clients[client]
+
+
+def create_admission_controller(
+    budget: float, max_wait: float = 10.0, retry_after: int = 5
+) -> Optional[AdmissionController]:
+    """Build the controller, or ``None`` when ``budget`` is not positive."""
+
+    if budget <= 0:
+        return None
+    return AdmissionController(budget, max_wait, retry_after)
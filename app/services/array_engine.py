@@ -0,0 +1,148 @@
+"""Vectorised NumPy implementation of the frame blending pipeline.
+
+The Pillow pipeline in :mod:`transformation_service` allocates a new image for
+every step (blend, contrast, saturation, source re-mix and the final RGB
+conversion). This module folds those steps into a handful of float32 array
+operations over the RGB channels and only quantises to ``uint8`` once at the
+end. The work is done in bands of rows so the intermediates stay in cache,
+and animations render many frames per array operation.
+
+Because Pillow truncates to ``uint8`` after every intermediate step while this
+kernel keeps full precision until the end, outputs differ slightly. The
+difference is bounded by :data:`PILLOW_TOLERANCE` levels per channel.
+"""
+
+from __future__ import annotations
+
+from typing import Iterator, Sequence
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional accelerator
+    np = None  # type: ignore[assignment]
+
+# Maximum absolute per-channel difference against the Pillow pipeline.
+PILLOW_TOLERANCE = 3
+
+# Target size of each float32 band intermediate so the working set stays in cache.
+_BAND_BYTES = 256 * 1024
+
+# Frames per batch. Larger batches shrink the bands below a few rows, at which
+# point per-band overhead outweighs the shared source/target reads.
+_BATCH_FRAMES = 8
+
+# ITU-R 601-2 luma weights, matching Pillow's RGB -> L conversion.
+_LUMA = (
+    np.array([19595, 38470, 7471], dtype=np.float32) / 65536 if np is not None else None
+)
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+def blend_pixels(source, target, softened, mix: float, mean: float):
+    """Run the fused kernel over ``uint8`` RGB arrays and return a ``uint8`` array.
+
+    ``softened`` is the blurred source mixed back in (``None`` to skip it) and
+    ``mean`` is the mean luma of the blended frame used by the contrast step.
+    """
+
+    mask_strength = min(0.4, mix * 0.4) if softened is not None else 0.0
+    return _blend_chunk(source, target, softened, [mix], [mean], [mask_strength])[0]
+
+
+def blend_batch(
+    source,
+    target,
+    softened,
+    mixes: Sequence[float],
+    means: Sequence[float],
+    memory_budget: int,
+) -> Iterator:
+    """Yield one ``uint8`` RGB array per mix, rendering whole chunks of frames at once.
+
+    Every frame in a chunk is computed by the same N x H x W x 3 array
+    operations. Chunks hold at most ``_BATCH_FRAMES`` frames and are shrunk
+    so their output tensor stays within ``memory_budget`` bytes, down to one
+    frame at a time.
+    """
+
+    frame_bytes = source.shape[0] * source.shape[1] * 3
+    chunk_size = max(1, min(_BATCH_FRAMES, memory_budget // max(1, frame_bytes)))
+    for start in range(0, len(mixes), chunk_size):
+        chunk_mixes = mixes[start:start + chunk_size]
+        chunk = _blend_chunk(
+            source,
+            target,
+            softened,
+            chunk_mixes,
+            means[start:start + chunk_size],
+            [min(0.4, mix * 0.4) for mix in chunk_mixes],
+        )
+        yield from chunk
+
+
+def _blend_chunk(source, target, softened, mixes, means, mask_strengths):
+    count = len(mixes)
+    height, width = source.shape[:2]
+    mix = np.asarray(mixes, dtype=np.float32)
+    mask_strength = np.asarray(mask_strengths, dtype=np.float32)
+
+    # Blend and contrast are both affine, so they fold into
+    # a * source + b * target + offset around the blended mean luma.
+    contrast = 1 + mix * 0.35
+    source_weight = _per_frame(contrast * (1 - mix))
+    target_weight = _per_frame(contrast * mix)
+    offset = _per_frame((1 - contrast) * np.asarray(means, dtype=np.float32))
+
+    # Saturation stretches every pixel away from its own luma, which is a 3x3
+    # colour matrix. The source re-mix weight is folded into the same matrix.
+    saturation = 1 + mix * 0.25
+    matrix = np.eye(3, dtype=np.float32) * saturation[:, np.newaxis, np.newaxis]
+    matrix += (1 - saturation)[:, np.newaxis, np.newaxis] * _LUMA[:, np.newaxis]
+    matrix *= (1 - mask_strength)[:, np.newaxis, np.newaxis]
+    matrix = matrix[:, np.newaxis]
+    ceiling = _per_frame(255.0 * (1 - mask_strength))
+    remix = _per_frame(mask_strength) if mask_strength.any() else None
+
+    # Band height keeps each float32 intermediate around _BAND_BYTES.
+    band_rows = max(1, min(height, _BAND_BYTES // (count * width * 3 * 4)))
+    band_shape = (count, band_rows, width, 3)
+    graded = np.empty(band_shape, dtype=np.float32)
+    mixed = np.empty(band_shape, dtype=np.float32)
+    scratch = np.empty(band_shape, dtype=np.float32)
+    out = np.empty((count, height, width, 3), dtype=np.uint8)
+
+    for top in range(0, height, band_rows):
+        bottom = min(height, top + band_rows)
+        rows = bottom - top
+        band, result, tmp = graded[:, :rows], mixed[:, :rows], scratch[:, :rows]
+
+        np.multiply(source[np.newaxis, top:bottom], source_weight, out=band)
+        np.multiply(target[np.newaxis, top:bottom], target_weight, out=tmp)
+        band += tmp
+        band += offset
+        np.clip(band, 0.0, 255.0, out=band)
+
+        np.matmul(band, matrix, out=result)
+        np.minimum(result, ceiling, out=result)
+        np.maximum(result, 0.0, out=result)
+        if remix is not None:
+            np.multiply(softened[np.newaxis, top:bottom], remix, out=tmp)
+            result += tmp
+        out[:, top:bottom] = result
+
+    return out
+
+
+def _per_frame(values):
+    return np.asarray(values, dtype=np.float32).reshape(-1, 1, 1, 1)
+
+
+def as_rgb_array(image: Image.Image):
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
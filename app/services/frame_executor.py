@@ -0,0 +1,179 @@
+"""Pluggable executors that render animation frames in parallel.
+
+An executor receives a render context and the distinct mix values of an
+animation and returns one RGB frame per mix, in order. The context only needs
+to provide ``render(mix)``; the process executor additionally relies on
+``shared_images()``, ``shared_params()`` and ``from_shared()`` to rebuild the
+context inside worker processes from shared memory instead of pickling the
+images for every task.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+_EXECUTOR_KINDS = {"serial", "thread", "process"}
+
+
+class FrameExecutor(ABC):
+    """Base class for parallel frame renderers with a lazily created pool."""
+
+    def __init__(self, max_workers: Optional[int] = None, min_frames: int = 8) -> None:
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.min_frames = max(1, min_frames)
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def should_parallelise(self, frame_count: int) -> bool:
+        return frame_count >= self.min_frames
+
+    @abstractmethod
+    def render(self, context: Any, mixes: Sequence[float]) -> List[Image.Image]:
+        """Return one frame per mix value, in order."""
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
+            return self._pool
+
+    @abstractmethod
+    def _create_pool(self) -> Executor:
+        """Build the pool on first use."""
+
+
+class ThreadFrameExecutor(FrameExecutor):
+    """Renders frames on a thread pool; Pillow and NumPy release the GIL in their kernels."""
+
+    kind = "thread"
+
+    def render(self, context: Any, mixes: Sequence[float]) -> List[Image.Image]:
+        return list(self._get_pool().map(context.render, mixes))
+
+    def _create_pool(self) -> Executor:
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="frame-render")
+
+
+class ProcessFrameExecutor(FrameExecutor):
+    """Renders frames on a process pool, exchanging pixels through shared memory.
+
+    The endpoints are copied once into a shared block that every worker maps,
+    and workers write finished frames into a second shared block, so only the
+    mix values and block names cross the process boundary.
+    """
+
+    kind = "process"
+
+    def render(self, context: Any, mixes: Sequence[float]) -> List[Image.Image]:
+        images = context.shared_images()
+        size = next(iter(images.values())).size
+        frame_bytes = size[0] * size[1] * 3
+
+        layout: List[Tuple[str, int]] = []
+        offset = 0
+        for name in images:
+            layout.append((name, offset))
+            offset += frame_bytes
+
+        inputs = SharedMemory(create=True, size=offset)
+        outputs = SharedMemory(create=True, size=frame_bytes * len(mixes))
+        try:
+            for name, start in layout:
+                inputs.buf[start:start + frame_bytes] = images[name].convert("RGB").tobytes()
+
+            jobs = list(enumerate(mixes))
+            per_worker = -(-len(jobs) // self.max_workers)
+            pool = self._get_pool()
+            futures = [
+                pool.submit(
+                    _render_shared_frames,
+                    type(context),
+                    context.shared_params(),
+                    size,
+                    layout,
+                    inputs.name,
+                    outputs.name,
+                    jobs[start:start + per_worker],
+                )
+                for start in range(0, len(jobs), per_worker)
+            ]
+            for future in futures:
+                future.result()
+
+            return [
+                Image.frombytes(
+                    "RGB", size, bytes(outputs.buf[index * frame_bytes:(index + 1) * frame_bytes])
+                )
+                for index in range(len(mixes))
+            ]
+        finally:
+            for block in (inputs, outputs):
+                block.close()
+                block.unlink()
+
+    def _create_pool(self) -> Executor:
+        # "spawn" avoids forking a multi-threaded WSGI worker.
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+
+def create_frame_executor(
+    kind: str,
+    max_workers: Optional[int] = None,
+    min_frames: int = 8,
+) -> Optional[FrameExecutor]:
+    """Build the executor named by ``kind``; ``"serial"`` returns ``None``."""
+
+    candidate = (kind or "serial").strip().lower()
+    if candidate not in _EXECUTOR_KINDS:
+        raise ValueError(f"FRAME_EXECUTOR must be one of {sorted(_EXECUTOR_KINDS)}.")
+    if candidate == "thread":
+        return ThreadFrameExecutor(max_workers, min_frames)
+    if candidate == "process":
+        return ProcessFrameExecutor(max_workers, min_frames)
+    return None
+
+
+def _render_shared_frames(
+    context_type: Any,
+    params: Dict[str, Any],
+    size: Tuple[int, int],
+    layout: List[Tuple[str, int]],
+    inputs_name: str,
+    outputs_name: str,
+    jobs: List[Tuple[int, float]],
+) -> None:
+    frame_bytes = size[0] * size[1] * 3
+    # Pool workers share the parent's resource tracker, so attaching here does
+    # not register a second owner; the parent unlinks both blocks.
+    inputs = SharedMemory(name=inputs_name)
+    outputs = SharedMemory(name=outputs_name)
+    try:
+        images = {
+            name: Image.frombytes("RGB", size, bytes(inputs.buf[start:start + frame_bytes]))
+            for name, start in layout
+        }
+        context = context_type.from_shared(images, params)
+        for index, mix in jobs:
+            frame = context.render(mix)
+            outputs.buf[index * frame_bytes:(index + 1) * frame_bytes] = frame.tobytes()
+    finally:
+        inputs.close()
+        outputs.close()
+
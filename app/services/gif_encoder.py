@@ -0,0 +1,207 @@
+"""Incremental GIF encoding.
+
+:class:`GifStreamWriter` writes an animated GIF one frame at a time, so callers
+never need to hold the whole animation in memory. Frames are LZW-encoded by
+Pillow's GIF plugin as soon as they are added, and encoded frames are returned
+as opaque blocks that can be written again later, for example when an
+animation revisits an earlier frame.
+
+Two layouts are supported: every frame carrying its own local colour table
+(``palette=None``), or one global colour table shared by all frames, which
+:func:`delta_frame` relies on to write only the changed region of a frame.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import IO, Hashable, List, Optional, Tuple
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+# Disposal method 1 leaves the frame in place for the next one to draw over,
+# which delta frames need; 2 restores the background, matching the
+# full-frame animations Pillow's ``save_all`` produced.
+DISPOSE_NONE = 1
+DISPOSE_TO_BACKGROUND = 2
+
+# Palette index reserved for "unchanged" pixels in delta frames.
+TRANSPARENT_INDEX = 255
+
+# Lookup table mapping a zero index difference to an opaque mask value.
+_UNCHANGED_LUT = [255] + [0] * 255
+
+
+class GifStreamWriter:
+    """Write an animated GIF incrementally to ``fp``.
+
+    Consecutive frames with the same key are merged into a single frame with a
+    longer delay, like Pillow does for identical frames. The writer keeps at
+    most one encoded frame pending for that purpose.
+    """
+
+    def __init__(
+        self,
+        fp: IO[bytes],
+        size: Tuple[int, int],
+        *,
+        duration: int,
+        loop: int = 0,
+        disposal: int = DISPOSE_TO_BACKGROUND,
+        palette: Optional[bytes] = None,
+    ) -> None:
+        self._fp = fp
+        self._duration = duration
+        self._disposal = disposal
+        self._pending: Optional[bytes] = None
+        self._pending_key: Optional[Hashable] = None
+        self._pending_duration = 0
+        self._pending_transparency: Optional[int] = None
+        self.frames_written = 0
+        self.bytes_written = 0
+        self._write_header(size, loop, palette)
+
+    @staticmethod
+    def encode(
+        frame: Image.Image,
+        *,
+        offset: Tuple[int, int] = (0, 0),
+        include_color_table: bool = True,
+    ) -> bytes:
+        """LZW-encode one frame (image descriptor, optional local palette and pixel data)."""
+
+        if frame.mode != "P":
+            frame = quantize_frame(frame)
+        parts = GifImagePlugin.getdata(frame, offset, include_color_table=include_color_table)
+        try:
+            return b"".join(parts)
+        finally:
+            # Pillow collects the parts in a list on a class it creates per
+            # call; the class is a reference cycle, so without clearing, the
+            # encoded data lives until the cyclic garbage collector runs.
+            parts.clear()
+
+    def add(
+        self,
+        block: bytes,
+        key: Optional[Hashable] = None,
+        *,
+        transparency: Optional[int] = None,
+    ) -> None:
+        """Queue an encoded frame; ``key`` identifies repeats of the same frame."""
+
+        if self._pending is not None and key is not None and key == self._pending_key:
+            self.extend()
+            return
+        self._flush()
+        self._pending = block
+        self._pending_key = key
+        self._pending_duration = self._duration
+        self._pending_transparency = transparency
+
+    def extend(self) -> None:
+        """Show the pending frame for one more frame duration."""
+
+        self._pending_duration += self._duration
+
+    def close(self) -> None:
+        self._flush()
+        self._write(b";")
+
+    def _flush(self) -> None:
+        if self._pending is None:
+            return
+        # Graphic control extension: disposal, transparency and delay in 1/100 s.
+        packed = self._disposal << 2
+        if self._pending_transparency is not None:
+            packed |= 1
+        delay = int(self._pending_duration / 10)
+        self._write(
+            b"!\xf9\x04"
+            + struct.pack("<BHBB", packed, delay, self._pending_transparency or 0, 0)
+        )
+        self._write(self._pending)
+        self.frames_written += 1
+        self._pending = None
+        self._pending_key = None
+
+    def _write_header(
+        self, size: Tuple[int, int], loop: int, palette: Optional[bytes]
+    ) -> None:
+        width, height = size
+        # Logical screen descriptor, followed by the global colour table if any.
+        flags = 0
+        if palette is not None:
+            palette = palette[:768].ljust(768, b"\x00")
+            flags = 0x80 | 0x07  # global table present, 2 ** (7 + 1) entries
+        self._write(b"GIF89a" + struct.pack("<HHBBB", width, height, flags, 0, 0))
+        if palette is not None:
+            self._write(palette)
+        # NETSCAPE2.0 application extension controls looping.
+        self._write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+    def _write(self, data: bytes) -> None:
+        self._fp.write(data)
+        self.bytes_written += len(data)
+
+
+def quantize_frame(frame: Image.Image) -> Image.Image:
+    """Palette-quantize a frame the way Pillow's GIF encoder does for RGB input."""
+
+    return frame.convert("P", palette=Image.Palette.ADAPTIVE)
+
+
+def build_shared_palette(samples: List[Image.Image], max_side: int = 512) -> Image.Image:
+    """Build one palette image from representative frames.
+
+    The samples are downscaled side by side before median-cut quantization,
+    and one entry is left free for :data:`TRANSPARENT_INDEX`.
+    """
+
+    thumbnails = []
+    for sample in samples:
+        thumbnail = sample.convert("RGB")
+        thumbnail.thumbnail((max_side, max_side))
+        thumbnails.append(thumbnail)
+
+    width = sum(thumbnail.width for thumbnail in thumbnails)
+    height = max(thumbnail.height for thumbnail in thumbnails)
+    sheet = Image.new("RGB", (width, height))
+    left = 0
+    for thumbnail in thumbnails:
+        sheet.paste(thumbnail, (left, 0))
+        left += thumbnail.width
+    return sheet.quantize(colors=TRANSPARENT_INDEX)
+
+
+def palette_bytes(palette_image: Image.Image) -> bytes:
+    return bytes(palette_image.getpalette() or [])
+
+
+def apply_palette(frame: Image.Image, palette_image: Image.Image) -> Image.Image:
+    """Map a frame onto the shared palette without dithering.
+
+    Dithering would make unchanged regions flicker between frames and defeat
+    delta encoding.
+    """
+
+    return frame.convert("RGB").quantize(palette=palette_image, dither=Image.Dither.NONE)
+
+
+def delta_frame(
+    previous: Image.Image, current: Image.Image
+) -> Optional[Tuple[Image.Image, Tuple[int, int]]]:
+    """Return the changed region of ``current`` and its offset, or ``None`` if unchanged.
+
+    Both frames must be indexed against the same shared palette. Pixels inside
+    the changed bounding box that match ``previous`` are set to
+    :data:`TRANSPARENT_INDEX` so the earlier frame shows through.
+    """
+
+    difference = ImageChops.difference(previous, current)
+    bbox = difference.getbbox()
+    if bbox is None:
+        return None
+    region = current.crop(bbox)
+    unchanged = difference.crop(bbox).point(_UNCHANGED_LUT, "L")
+    region.paste(TRANSPARENT_INDEX, mask=unchanged)
+    return region, bbox[:2]
@@ -0,0 +1,136 @@
+"""Background execution of long-running transformations.
+
+:class:`JobQueue` runs submitted work on a bounded thread pool and keeps the
+state of recent jobs so clients can poll them. Admission is bounded too:
+once ``max_pending`` jobs are waiting, :meth:`JobQueue.submit` raises
+:class:`JobQueueFull` instead of queueing without limit.
+
+Job state lives in the memory of the process that accepted the job, so
+polling must reach the same process (a single worker, or sticky routing).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = QUEUED
+    progress: float = 0.0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    # HTTP status the same failure would have produced synchronously.
+    error_status: Optional[int] = None
+
+    def fail(self, message: str, status: int) -> None:
+        self.error = message
+        self.error_status = status
+        self.status = FAILED
+
+    def as_dict(self) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "created_at": self.created_at,
+        }
+        if self.started_at is not None:
+            body["started_at"] = self.started_at
+        if self.finished_at is not None:
+            body["finished_at"] = self.finished_at
+        if self.result is not None:
+            body["result"] = self.result
+        if self.error is not None:
+            body["error"] = self.error
+        return body
+
+
+class JobQueue:
+    """Bounded pool of worker threads plus a registry of recent jobs."""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 32,
+        retention_seconds: float = 3600.0,
+        max_jobs: int = 1000,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(0, max_pending)
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="transform-job")
+
+    def submit(self, work: Callable[[Job], Optional[Dict[str, Any]]]) -> Job:
+        """Queue ``work(job)``; its return value becomes ``job.result``.
+
+        ``work`` may update ``job.progress`` while it runs and may call
+        :meth:`Job.fail` to record an expected failure.
+        """
+
+        job = Job(id=uuid.uuid4().hex)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull("Too many jobs are waiting; retry later.")
+            self._prune()
+            self._pending += 1
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _run(self, job: Job, work: Callable[[Job], Optional[Dict[str, Any]]]) -> None:
+        with self._lock:
+            self._pending -= 1
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            result = work(job)
+            if job.status != FAILED:
+                job.result = result
+                job.progress = 1.0
+                job.status = SUCCEEDED
+        except Exception as exc:  # pragma: no cover - work is expected to call fail()
+            job.fail(str(exc) or type(exc).__name__, 500)
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            finished = job.finished_at is not None
+            if finished and (job.finished_at < cutoff or len(self._jobs) >= self.max_jobs):
+                del self._jobs[job_id]
@@ -0,0 +1,145 @@
+"""Approximate per-transform memory accounting from the process RSS.
+
+:class:`MemoryMeter` records how far the resident set size of the process
+grows above its value when the transform started. It counts Pillow's pixel
+buffers, which ``tracemalloc`` cannot see. A shared sampler thread reads the
+RSS every few milliseconds while any meter is open, so short spikes inside a
+single Pillow call are seen too, and :meth:`MemoryMeter.sample` takes an
+exact reading at stage boundaries.
+
+The figure is an approximation: with several transforms running in one
+process, each meter also sees the others' growth, and memory the allocator
+kept from earlier requests is reused without raising the RSS. A meter that
+was ever open alongside another is marked ``shared``. The growth it sees is
+not its own, so it is held to a process-wide ceiling instead: the limits of
+all open meters added up.
+
+Readings come from ``/proc/self/statm``. Where it is missing, meters report
+nothing and limits are not enforced.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+SAMPLE_INTERVAL_SECONDS = 0.005
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # pragma: no cover - non-POSIX
+    _PAGE_SIZE = 4096
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or ``None`` if unavailable."""
+
+    try:
+        with open("/proc/self/statm", "rb") as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryMeter:
+    """Peak RSS growth of the process between creation and :meth:`close`."""
+
+    def __init__(self, limit_bytes: int = 0) -> None:
+        self.limit_bytes = limit_bytes
+        self.baseline = current_rss()
+        self.peak_bytes = 0
+        # Set once another meter is open at the same time.
+        self.shared = False
+        self._lock = threading.Lock()
+        if self.baseline is not None:
+            _sampler.register(self)
+
+    @property
+    def available(self) -> bool:
+        return self.baseline is not None
+
+    def observe(self, rss: int) -> int:
+        growth = rss - self.baseline if self.baseline is not None else 0
+        with self._lock:
+            if growth > self.peak_bytes:
+                self.peak_bytes = growth
+        return growth
+
+    def sample(self) -> int:
+        """Read the RSS now and return the current growth."""
+
+        rss = current_rss()
+        return self.observe(rss) if rss is not None else 0
+
+    def over_limit(self) -> bool:
+        """Whether the growth, or a peak the sampler saw, exceeds ``limit_bytes``.
+
+        A ``shared`` meter compares the current growth with ``limit_bytes``
+        times the number of open meters, so it only trips once the process
+        as a whole is over the combined ceiling.
+        """
+
+        if not self.limit_bytes or not self.available:
+            return False
+        growth = self.sample()
+        if self.shared:
+            return growth > self.limit_bytes * max(1, _sampler.open_meters())
+        return self.peak_bytes > self.limit_bytes
+
+    def close(self) -> int:
+        _sampler.unregister(self)
+        if self.available:
+            self.sample()
+        return self.peak_bytes
+
+
+class _Sampler:
+    """Background thread that feeds RSS readings to every open meter."""
+
+    def __init__(self) -> None:
+        self._meters: "weakref.WeakSet[MemoryMeter]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, meter: MemoryMeter) -> None:
+        with self._lock:
+            self._meters.add(meter)
+            if len(self._meters) > 1:
+                for other in self._meters:
+                    other.shared = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def open_meters(self) -> int:
+        with self._lock:
+            return len(self._meters)
+
+    def unregister(self, meter: MemoryMeter) -> None:
+        with self._lock:
+            self._meters.discard(meter)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                meters = list(self._meters)
+                if not meters:
+                    self._wake.clear()
+            if not meters:
+                # Sleep until the next meter opens; no work while idle.
+                self._wake.wait()
+                continue
+            rss = current_rss()
+            if rss is not None:
+                for meter in meters:
+                    meter.observe(rss)
+            del meters
+            time.sleep(SAMPLE_INTERVAL_SECONDS)
+
+
+_sampler = _Sampler()
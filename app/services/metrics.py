@@ -0,0 +1,268 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Only the pieces this service needs are implemented: labelled counters and
+histograms, plus :class:`StageTimer`, which adds up the time one request
+spends in each pipeline stage and records the totals once it finishes.
+
+Metrics are kept per process. Under a multi-process server every worker
+reports its own values, so scrape each worker or aggregate in Prometheus.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; a 4096px, 120-frame GIF takes minutes end to end on one core.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+# Bytes, from 1 MiB to 4 GiB.
+MEMORY_BUCKETS = tuple(float(1 << shift) for shift in range(20, 33))
+# Upper bounds of the ``size`` label: the longest side of the output image.
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_values(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_label_values(self.labels, labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            samples = sorted(self._values.items())
+        lines = _header(self.name, self.help, "counter")
+        lines.extend(
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in samples
+        )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: one count per bucket plus +Inf, then the sum.
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_values(self.labels, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(_label_values(self.labels, labels))
+            return sum(entry[0]) if entry else 0
+
+    def sum(self, **labels: str) -> float:
+        with self._lock:
+            entry = self._values.get(_label_values(self.labels, labels))
+            return entry[1][0] if entry else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            samples = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = _header(self.name, self.help, "histogram")
+        for key, (counts, total) in samples:
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        with self._lock:
+            # Re-registering returns the existing metric, so modules can be reloaded.
+            return self._metrics.setdefault(metric.name, metric)
+
+
+def render_samples(
+    name: str,
+    help_text: str,
+    metric_type: str,
+    samples: Iterable[Tuple[Dict[str, str], float]],
+) -> str:
+    """Render values read from elsewhere (queue depths, cache counters) as one metric."""
+
+    lines = _header(name, help_text, metric_type)
+    for labels, value in samples:
+        names = tuple(sorted(labels))
+        values = tuple(str(labels[label]) for label in names)
+        lines.append(f"{name}{_format_labels(names, values)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def size_bucket(size: Tuple[int, int]) -> str:
+    """Label for an output size: the smallest :data:`SIZE_BUCKETS` bound covering its longest side."""
+
+    longest = max(size)
+    for bound in SIZE_BUCKETS:
+        if longest <= bound:
+            return str(bound)
+    return "larger"
+
+
+class StageTimer:
+    """Per-request totals of the time spent in each pipeline stage.
+
+    Stages are timed with :meth:`stage`, possibly many times each (once per
+    GIF frame). Time spent in a stage nested inside another is only counted
+    for the inner one, so the totals never overlap. :meth:`flush` records one
+    observation per stage into
+    :data:`STAGE_SECONDS`. Labels may be filled in after timing has started,
+    since the output format and size are only known once the request is parsed.
+
+    ``checkpoint``, if set, runs after every stage that completes and may
+    raise to abort the work (the memory ceiling uses it).
+    """
+
+    def __init__(self, output_format: str = "unknown", size: str = "unknown") -> None:
+        self.format = output_format
+        self.size = size
+        self.totals: Dict[str, float] = {}
+        self.checkpoint: Optional[Callable[[], None]] = None
+        # Per thread, the time taken by stages nested in each open stage.
+        self._nested = threading.local()
+
+    def set_labels(self, make_gif: bool, size: Tuple[int, int]) -> "StageTimer":
+        self.format = "gif" if make_gif else "png"
+        self.size = size_bucket(size)
+        return self
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        open_stages = getattr(self._nested, "stack", None)
+        if open_stages is None:
+            open_stages = self._nested.stack = []
+        open_stages.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.add(name, elapsed - open_stages.pop())
+            if open_stages:
+                open_stages[-1] += elapsed
+        if self.checkpoint is not None:
+            self.checkpoint()
+
+    def add(self, name: str, seconds: float) -> None:
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def flush(self) -> None:
+        totals, self.totals = self.totals, {}
+        for name, seconds in totals.items():
+            STAGE_SECONDS.observe(seconds, stage=name, format=self.format, size=self.size)
+
+
+def _label_values(names: Tuple[str, ...], labels: Dict[str, str]) -> LabelValues:
+    if set(labels) != set(names):
+        raise ValueError(f"Expected labels {names}, got {tuple(labels)}.")
+    return tuple(str(labels[name]) for name in names)
+
+
+def _header(name: str, help_text: str, metric_type: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+
+
+def _format_labels(names: Tuple[str, ...], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "obamify_stage_seconds",
+    "Time spent per request in each transformation stage.",
+    ("stage", "format", "size"),
+)
+REQUEST_SECONDS = registry.histogram(
+    "obamify_request_seconds",
+    "Time to serve a transformation request, including a streamed body.",
+    ("endpoint", "format", "size", "status"),
+)
+PEAK_MEMORY_BYTES = registry.histogram(
+    "obamify_transform_peak_memory_bytes",
+    "Peak growth of the process RSS during a transform.",
+    ("format", "size"),
+    buckets=MEMORY_BUCKETS,
+)
+ERRORS = registry.counter(
+    "obamify_errors_total",
+    "Failed transformations by exception type.",
+    ("type",),
+)
@@ -0,0 +1,166 @@
+"""Opt-in cProfile captures of individual transformation requests.
+
+A request is profiled when it carries a valid signed ``X-Profile-Token``
+header (see :func:`make_profile_token`), or when it is picked by the sampling
+rate. Each capture is written as a ``.pstats`` file next to a JSON file
+holding the request parameters and image dimensions. Only the newest
+``max_captures`` are kept.
+
+When profiling is disabled no :class:`RequestProfiler` is created at all, so
+requests pay nothing for it.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+PROFILE_HEADER = "X-Profile-Token"
+
+
+def make_profile_token(secret: str, ttl_seconds: int = 300, now: Optional[float] = None) -> str:
+    """Return a token accepted by :meth:`RequestProfiler.start` until it expires."""
+
+    expires = int((time.time() if now is None else now) + ttl_seconds)
+    return f"{expires}.{_sign(secret, str(expires))}"
+
+
+class ProfileCapture:
+    """Profiler for one request, enabled around the code that serves it."""
+
+    def __init__(self, profiler: "RequestProfiler", reason: str) -> None:
+        self._profiler = profiler
+        self.reason = reason
+        self.profile = cProfile.Profile()
+        self.started = time.time()
+        self._finished = False
+
+    def run(self, fn, *args: Any, **kwargs: Any) -> Any:
+        return self.profile.runcall(fn, *args, **kwargs)
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Keep profiling while a streamed body is being produced."""
+
+        iterator = iter(chunks)
+        while True:
+            self.profile.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.profile.disable()
+            yield chunk
+
+    def finish(self, metadata: Dict[str, Any]) -> Optional[Path]:
+        if self._finished:
+            return None
+        self._finished = True
+        return self._profiler.save(self, metadata)
+
+
+class RequestProfiler:
+    """Decide which requests to profile and keep a bounded set of captures."""
+
+    def __init__(
+        self,
+        directory: str,
+        secret: Optional[str] = None,
+        sample_rate: float = 0.0,
+        max_captures: int = 50,
+    ) -> None:
+        self.directory = Path(directory)
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.max_captures = max(1, max_captures)
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def start(self, token: Optional[str] = None) -> Optional[ProfileCapture]:
+        """Return a capture if this request should be profiled, else ``None``."""
+
+        if self.verify(token):
+            return ProfileCapture(self, "token")
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return ProfileCapture(self, "sample")
+        return None
+
+    def save(self, capture: ProfileCapture, metadata: Dict[str, Any]) -> Path:
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(capture.started))
+        micros = int(capture.started * 1_000_000) % 1_000_000
+        name = f"{stamp}.{micros:06d}-{uuid.uuid4().hex[:8]}"
+        stats_path = self.directory / f"{name}.pstats"
+        capture.profile.dump_stats(str(stats_path))
+        record = {
+            "name": name,
+            "profile": stats_path.name,
+            "reason": capture.reason,
+            "started_at": capture.started,
+            "duration_seconds": round(time.time() - capture.started, 6),
+            **metadata,
+        }
+        _write_json(self.directory / f"{name}.json", record)
+        self._trim()
+        return stats_path
+
+    def captures(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Metadata of the stored captures, newest first."""
+
+        records = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[:limit]:
+            try:
+                records.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return records
+
+    def verify(self, token: Optional[str]) -> bool:
+        """Whether ``token`` was signed with ``secret`` and has not expired."""
+
+        if not token or not self.secret:
+            return False
+        expires, _, signature = token.partition(".")
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        return hmac.compare_digest(signature, _sign(self.secret, expires))
+
+    def _trim(self) -> None:
+        with self._lock:
+            # Names start with a UTC timestamp, so they sort oldest first.
+            names = sorted(path.stem for path in self.directory.glob("*.json"))
+            for name in names[: max(0, len(names) - self.max_captures)]:
+                (self.directory / f"{name}.json").unlink(missing_ok=True)
+                (self.directory / f"{name}.pstats").unlink(missing_ok=True)
+
+
+def create_profiler(
+    enabled: bool,
+    directory: str,
+    secret: Optional[str] = None,
+    sample_rate: float = 0.0,
+    max_captures: int = 50,
+) -> Optional[RequestProfiler]:
+    """Build the profiler, or ``None`` when disabled or nothing could trigger it."""
+
+    if not enabled or (not secret and sample_rate <= 0):
+        return None
+    return RequestProfiler(directory, secret, sample_rate, max_captures)
+
+
+def _sign(secret: str, message: str) -> str:
+    return hmac.new(secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _write_json(path: Path, record: Dict[str, Any]) -> None:
+    partial = path.with_name(f"{path.name}.tmp")
+    partial.write_text(json.dumps(record, indent=2), encoding="utf-8")
+    os.replace(partial, path)
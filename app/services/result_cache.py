@@ -0,0 +1,239 @@
+"""Content-addressed cache of finished transformations.
+
+Results are keyed by :func:`request_key`, a hash of the raw source bytes, the
+target bytes (or the default target's path and mtime) and the normalised
+request parameters, so resubmitting the same image with the same settings
+returns the stored bytes without rendering or encoding anything again.
+
+:class:`ResultCache` keeps an in-memory LRU bounded by total bytes and can
+spill to an optional on-disk tier that survives restarts and is shared by
+every worker process using the same directory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import IO, Optional
+
+from .transformation_service import TransformationRequest, TransformationResult
+
+# Bump when a change to the pipeline alters output bytes for the same inputs.
+_KEY_VERSION = "2"
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_stream(stream: IO[bytes]) -> str:
+    """Hash a seekable stream from the start and rewind it."""
+
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1 << 20), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def request_key(payload: TransformationRequest) -> Optional[str]:
+    """Return the cache key for ``payload``, or ``None`` if its inputs are not addressable.
+
+    Parameters that cannot affect the output (GIF settings for still images)
+    are left out so equivalent requests share one entry.
+    """
+
+    if payload.source_digest is None:
+        return None
+    if payload.target_digest is not None:
+        target_id = payload.target_digest
+    elif payload.target_path:
+        try:
+            stat = os.stat(payload.target_path)
+        except OSError:
+            return None
+        target_id = f"{Path(payload.target_path).resolve()}:{stat.st_mtime_ns}"
+    else:
+        return None
+
+    params = {
+        "blend_ratio": round(payload.blend_ratio, 6),
+        "max_dimension": payload.max_dimension,
+        "make_gif": payload.make_gif,
+        "engine": payload.engine,
+    }
+    if payload.make_gif:
+        params.update(
+            gif_frame_count=payload.gif_frame_count,
+            gif_duration=payload.gif_duration,
+            gif_encoding=payload.gif_encoding,
+        )
+
+    digest = hashlib.sha256()
+    for part in (_KEY_VERSION, payload.source_digest, target_id, json.dumps(params, sort_keys=True)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Byte-bounded LRU of :class:`TransformationResult` with an optional disk tier."""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, TransformationResult]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[TransformationResult]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._store_memory(key, result)
+        return result
+
+    def put(self, key: str, result: TransformationResult) -> None:
+        self._store_memory(key, result)
+        self._write_disk(key, result)
+
+    @property
+    def entry_limit(self) -> int:
+        """Largest result either tier will store."""
+
+        return max(self.max_bytes, self.disk_max_bytes if self.disk_dir else 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _store_memory(self, key: str, result: TransformationResult) -> None:
+        size = len(result.data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.data)
+            self._entries[key] = result
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.data)
+
+    def _read_disk(self, key: str) -> Optional[TransformationResult]:
+        if self.disk_dir is None:
+            return None
+        try:
+            meta = json.loads((self.disk_dir / f"{key}.json").read_text(encoding="utf-8"))
+            data = (self.disk_dir / f"{key}.bin").read_bytes()
+        except (OSError, ValueError):
+            return None
+        if len(data) != meta.get("size"):
+            return None
+        return TransformationResult(
+            data=data,
+            mime_type=meta["mime_type"],
+            width=meta["width"],
+            height=meta["height"],
+            frame_count=meta["frame_count"],
+            bytes_saved=meta.get("bytes_saved", 0),
+        )
+
+    def _write_disk(self, key: str, result: TransformationResult) -> None:
+        if self.disk_dir is None or len(result.data) > self.disk_max_bytes:
+            return
+        meta = {
+            "size": len(result.data),
+            "mime_type": result.mime_type,
+            "width": result.width,
+            "height": result.height,
+            "frame_count": result.frame_count,
+            "bytes_saved": result.bytes_saved,
+        }
+        try:
+            # Data first and metadata last, each via rename, so readers in
+            # other processes never see a partial entry.
+            _write_atomic(self.disk_dir / f"{key}.bin", result.data)
+            _write_atomic(self.disk_dir / f"{key}.json", json.dumps(meta).encode("utf-8"))
+            self._trim_disk()
+        except OSError:
+            pass
+
+    def _trim_disk(self) -> None:
+        assert self.disk_dir is not None
+        files = []
+        total = 0
+        for path in self.disk_dir.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            path.with_suffix(".json").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def create_result_cache(
+    max_bytes: int,
+    disk_dir: Optional[str] = None,
+    disk_max_bytes: int = 0,
+) -> Optional[ResultCache]:
+    """Build the configured cache, or ``None`` when both tiers are disabled."""
+
+    if max_bytes <= 0 and not disk_dir:
+        return None
+    return ResultCache(max(0, max_bytes), disk_dir, disk_max_bytes)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
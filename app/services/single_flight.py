@@ -0,0 +1,171 @@
+"""Coalescing of identical in-flight transformations.
+
+When several requests with the same :func:`~app.services.result_cache.request_key`
+arrive together, :class:`SingleFlight` lets the first one compute the result
+while the others wait for it and share the same :class:`TransformationResult`
+(or the same exception).
+
+Within a process the waiters block on an event. Across worker processes on the
+same host, an optional directory of ``flock`` lock files serialises identical
+requests. A process that acquires the lock after another one finished first
+calls ``recheck`` (typically a lookup in a shared on-disk result cache) before
+computing anything itself.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+_LOCK_POLL_SECONDS = 0.05
+_LOCK_STRIPE_CHARS = 4
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share its outcome."""
+
+    def __init__(self, lock_dir: Optional[str] = None, wait_timeout: float = 60.0) -> None:
+        self.lock_dir = Path(lock_dir) if lock_dir and fcntl is not None else None
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        if self.lock_dir is not None:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], T],
+        recheck: Optional[Callable[[], Optional[T]]] = None,
+    ) -> T:
+        """Return ``fn()``, or the result of an identical call already in flight."""
+
+        leader, call = self.join(key)
+        if not leader:
+            result = self.wait(call)
+            if result is not None:
+                return result
+            # The leader gave up without a result; compute independently.
+            return fn()
+
+        try:
+            result = self._run_locked(key, fn, recheck)
+        except BaseException as exc:
+            self.publish(key, call, error=exc)
+            raise
+        self.publish(key, call, result)
+        return result
+
+    def join(self, key: str) -> Tuple[bool, _Call]:
+        """Register for ``key`` and return ``(is_leader, call)``.
+
+        The leader must eventually :meth:`publish` the call; everyone else
+        :meth:`wait` s on it. This split lets a leader publish only once a
+        streamed response has been fully produced.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return False, call
+            call = _Call()
+            self._calls[key] = call
+            self.leaders += 1
+            return True, call
+
+    def wait(self, call: _Call) -> Optional[T]:
+        """Return the leader's result, or ``None`` if it gave up or did not finish in time."""
+
+        if not call.done.wait(self.wait_timeout):
+            return None
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def publish(
+        self,
+        key: str,
+        call: _Call,
+        result: Optional[T] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Hand ``result`` (``None`` if the leader gave up) or ``error`` to the waiters."""
+
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _run_locked(
+        self,
+        key: str,
+        fn: Callable[[], T],
+        recheck: Optional[Callable[[], Optional[T]]],
+    ) -> T:
+        if self.lock_dir is None:
+            return fn()
+
+        # Keys are striped over a bounded set of lock files; two different keys
+        # sharing a stripe only serialise, the recheck still misses correctly.
+        with open(self.lock_dir / f"{key[:_LOCK_STRIPE_CHARS]}.lock", "a+b") as handle:
+            locked = _try_lock(handle)
+            try:
+                if not locked:
+                    deadline = time.monotonic() + self.wait_timeout
+                    # Another process is computing the same result; after the
+                    # timeout compute it here rather than fail the request.
+                    while time.monotonic() < deadline:
+                        locked = _try_lock(handle)
+                        if locked:
+                            break
+                        time.sleep(_LOCK_POLL_SECONDS)
+                    if recheck is not None:
+                        cached = recheck()
+                        if cached is not None:
+                            return cached
+                return fn()
+            finally:
+                # After a timeout the lock was never acquired, so there is nothing to release.
+                if locked:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _try_lock(handle) -> bool:
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def create_single_flight(
+    enabled: bool, lock_dir: Optional[str] = None, wait_timeout: float = 60.0
+) -> Optional[SingleFlight]:
+    if not enabled:
+        return None
+    return SingleFlight(lock_dir, wait_timeout)
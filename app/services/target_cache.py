@@ -0,0 +1,188 @@
+"""Process-wide cache of decoded target images and their resized variants.
+
+Almost every request blends against the same default portrait. Decoding it,
+applying the EXIF orientation and resizing it to the source size is the same
+work every time, so :class:`TargetCache` keeps the decoded image per path and
+a bounded LRU of resized copies keyed by ``(path, mtime, size)``. Editing the
+file on disk changes its mtime and naturally invalidates both.
+
+When ``pyramid_dir`` points at pyramids written by
+:func:`~app.services.target_pyramid.build_pyramid`, targets are memory-mapped
+from there instead of decoded, and variants are resized from the nearest
+larger pyramid level rather than the full-resolution original. Pyramids
+built for custom targets are registered under their content hash, and
+requests refer to them by that ``target_id`` (see :meth:`TargetCache.get_registered`).
+
+Cached images are shared between requests and must be treated as read-only.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from .target_pyramid import TargetPyramid, load_pyramid
+
+try:  # Pillow>=9.1 provides the Resampling namespace.
+    _RESAMPLING = Image.Resampling.LANCZOS  # type: ignore[attr-defined]
+except AttributeError:  # pragma: no cover - compatibility with older Pillow
+    _RESAMPLING = Image.LANCZOS  # type: ignore[attr-defined]
+
+_VariantKey = Tuple[str, int, Tuple[int, int]]
+
+# Registered targets are named by the SHA-256 of their source file.
+_TARGET_ID = re.compile(r"[0-9a-f]{64}")
+
+
+class TargetCache:
+    """Decoded targets per path plus an LRU of their resized variants."""
+
+    def __init__(self, max_variants: int = 32, pyramid_dir: Optional[str] = None) -> None:
+        self.max_variants = max_variants
+        self.pyramid_dir = pyramid_dir
+        self._decoded: Dict[str, Tuple[int, Image.Image]] = {}
+        self._pyramids: Dict[str, Tuple[int, Optional[TargetPyramid]]] = {}
+        self._variants: "OrderedDict[_VariantKey, Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> Image.Image:
+        """Return the decoded RGBA image at ``path``, reloading it if the file changed."""
+
+        key, mtime = _cache_key(path)
+        with self._lock:
+            cached = self._decoded.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        pyramid = self._pyramid(key, mtime)
+        image = pyramid.original if pyramid is not None else _decode(key)
+        with self._lock:
+            self._decoded[key] = (mtime, image)
+        return image
+
+    def get_resized(self, path: str, size: Tuple[int, int]) -> Image.Image:
+        """Return the image at ``path`` resized to ``size``, from the LRU when possible."""
+
+        key, mtime = _cache_key(path)
+        variant_key = (key, mtime, tuple(size))
+        with self._lock:
+            cached = self._variants.get(variant_key)
+            if cached is not None:
+                self._variants.move_to_end(variant_key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        pyramid = self._pyramid(key, mtime)
+        image = pyramid.level_for(size) if pyramid is not None else self.get(path)
+        return self._store_variant(variant_key, image)
+
+    def is_registered(self, target_id: str) -> bool:
+        return self._registered(target_id) is not None
+
+    def get_registered(self, target_id: str) -> Image.Image:
+        """Return the full-resolution target registered under ``target_id``."""
+
+        pyramid = self._registered(target_id)
+        if pyramid is None:
+            raise FileNotFoundError(target_id)
+        return pyramid.original
+
+    def get_registered_resized(self, target_id: str, size: Tuple[int, int]) -> Image.Image:
+        """Return the registered target resized to ``size``, from the LRU when possible."""
+
+        # Content-addressed, so the pyramid never changes under its id.
+        variant_key = (f"id:{target_id}", 0, tuple(size))
+        with self._lock:
+            cached = self._variants.get(variant_key)
+            if cached is not None:
+                self._variants.move_to_end(variant_key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        pyramid = self._registered(target_id)
+        if pyramid is None:
+            raise FileNotFoundError(target_id)
+        return self._store_variant(variant_key, pyramid.level_for(size))
+
+    def preload(self, path: str, sizes: Tuple[Tuple[int, int], ...] = ()) -> None:
+        self.get(path)
+        for size in sizes:
+            self.get_resized(path, size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._decoded.clear()
+            self._pyramids.clear()
+            self._variants.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _store_variant(self, variant_key: _VariantKey, image: Image.Image) -> Image.Image:
+        size = variant_key[2]
+        if image.size != size:
+            image = image.resize(size, _RESAMPLING)
+
+        with self._lock:
+            self._variants[variant_key] = image
+            self._variants.move_to_end(variant_key)
+            while len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)
+        return image
+
+    def _registered(self, target_id: str) -> Optional[TargetPyramid]:
+        if not self.pyramid_dir or not _TARGET_ID.fullmatch(target_id):
+            return None
+        key = f"id:{target_id}"
+        with self._lock:
+            cached = self._pyramids.get(key)
+        if cached is not None and cached[1] is not None:
+            return cached[1]
+        # Missing ids are looked up again, so pyramids built later are picked up.
+        pyramid = load_pyramid(self.pyramid_dir, "", digest=target_id)
+        if pyramid is not None:
+            with self._lock:
+                self._pyramids[key] = (0, pyramid)
+        return pyramid
+
+    def _pyramid(self, key: str, mtime: int) -> Optional[TargetPyramid]:
+        if not self.pyramid_dir:
+            return None
+        with self._lock:
+            cached = self._pyramids.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        # Looked up by content hash; a missing pyramid is remembered as None.
+        pyramid = load_pyramid(self.pyramid_dir, key)
+        with self._lock:
+            self._pyramids[key] = (mtime, pyramid)
+        return pyramid
+
+
+def _cache_key(path: str) -> Tuple[str, int]:
+    resolved = str(Path(path).resolve())
+    try:
+        mtime = os.stat(resolved).st_mtime_ns
+    except OSError as exc:
+        raise FileNotFoundError(resolved) from exc
+    return resolved, mtime
+
+
+def _decode(path: str) -> Image.Image:
+    with open(path, "rb") as handle:
+        image = Image.open(handle)
+        image.load()
+    return ImageOps.exif_transpose(image).convert("RGBA")
+
+
+# Shared by every request in this process; sized by create_app().
+default_target_cache = TargetCache()
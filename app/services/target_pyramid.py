@@ -0,0 +1,180 @@
+"""Precomputed multi-resolution target images stored as raw, memory-mapped RGBA.
+
+:func:`build_pyramid` decodes a target once and writes it at a ladder of
+widths as headerless RGBA files, plus a small JSON index. :func:`load_pyramid`
+memory-maps those files, so every worker process on a host serves targets
+from one shared page-cache copy instead of each keeping its own decoded image.
+
+Pyramids live in ``<root>/<sha256 of the source file>/``. A target is found by
+its content, so moving or re-checking-out the repository keeps the pyramid
+valid, and editing the source simply stops matching it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+try:  # Pillow>=9.1 provides the Resampling namespace.
+    _RESAMPLING = Image.Resampling.LANCZOS  # type: ignore[attr-defined]
+except AttributeError:  # pragma: no cover - compatibility with older Pillow
+    _RESAMPLING = Image.LANCZOS  # type: ignore[attr-defined]
+
+# Level widths, capped by the 4096px ``max_dimension`` limit and the source width.
+DEFAULT_LEVEL_WIDTHS = (128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096)
+
+INDEX_NAME = "index.json"
+_FORMAT_VERSION = 1
+
+
+@dataclass
+class PyramidLevel:
+    width: int
+    height: int
+    filename: str
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+
+@dataclass
+class TargetPyramid:
+    """Memory-mapped levels of one target, smallest first.
+
+    Images returned by :meth:`level_for` and :attr:`original` share the mapped
+    pages and are read-only. The mappings are released when the images are
+    garbage collected.
+    """
+
+    levels: List[PyramidLevel]
+    images: List[Image.Image] = field(repr=False)
+
+    @property
+    def original(self) -> Image.Image:
+        return self.images[-1]
+
+    def level_for(self, size: Tuple[int, int]) -> Image.Image:
+        """Return the smallest level at least ``size`` in both dimensions.
+
+        Falls back to the full-resolution level when ``size`` is larger than
+        every level.
+        """
+
+        width, height = size
+        for level, image in zip(self.levels, self.images):
+            if level.width >= width and level.height >= height:
+                return image
+        return self.original
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pyramid_dir(root: str, source_path: str, digest: Optional[str] = None) -> Path:
+    return Path(root) / (digest or file_digest(source_path))
+
+
+def build_pyramid(
+    source_path: str,
+    root: str,
+    widths: Iterable[int] = DEFAULT_LEVEL_WIDTHS,
+) -> Path:
+    """Write the pyramid for ``source_path`` under ``root`` and return its directory.
+
+    Every level is resized directly from the decoded original, and the original
+    itself is stored as the top level.
+    """
+
+    digest = file_digest(source_path)
+    directory = pyramid_dir(root, source_path, digest)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with open(source_path, "rb") as handle:
+        decoded = Image.open(handle)
+        decoded.load()
+    original = ImageOps.exif_transpose(decoded).convert("RGBA")
+
+    sizes = []
+    for width in sorted(set(widths)):
+        if width >= original.width:
+            break
+        height = max(1, int(round(original.height * width / original.width)))
+        sizes.append((width, height))
+    sizes.append(original.size)
+
+    levels = []
+    for size in sizes:
+        image = original if size == original.size else original.resize(size, _RESAMPLING)
+        filename = f"level-{size[0]}x{size[1]}.rgba"
+        _write_atomic(directory / filename, image.tobytes())
+        levels.append({"width": size[0], "height": size[1], "file": filename})
+
+    index = {
+        "version": _FORMAT_VERSION,
+        "source": os.path.basename(source_path),
+        "sha256": digest,
+        "mode": "RGBA",
+        "levels": levels,
+    }
+    # The index is written last, so a partially built pyramid is never loaded.
+    _write_atomic(directory / INDEX_NAME, json.dumps(index, indent=2).encode("utf-8"))
+    return directory
+
+
+def load_pyramid(
+    root: str, source_path: str, digest: Optional[str] = None
+) -> Optional[TargetPyramid]:
+    """Memory-map the pyramid built for ``source_path``, or return ``None`` if there is none."""
+
+    directory = pyramid_dir(root, source_path, digest)
+    try:
+        index = json.loads((directory / INDEX_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != _FORMAT_VERSION or index.get("mode") != "RGBA":
+        return None
+
+    levels = [
+        PyramidLevel(int(entry["width"]), int(entry["height"]), str(entry["file"]))
+        for entry in index["levels"]
+    ]
+    levels.sort(key=lambda level: level.width)
+
+    images: List[Image.Image] = []
+    try:
+        for level in levels:
+            with open(directory / level.filename, "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(mapped) != level.width * level.height * 4:
+                raise ValueError(f"Pyramid level '{level.filename}' has an unexpected size.")
+            images.append(
+                Image.frombuffer("RGBA", level.size, mapped, "raw", "RGBA", 0, 1)
+            )
+    except (OSError, ValueError):
+        return None
+    return TargetPyramid(levels=levels, images=images)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # A unique partial name, so processes building the same level at once
+    # don't overwrite each other's file before the rename.
+    partial = path.with_name(f"{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+    try:
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
@@ -0,0 +1,277 @@
+"""Temporary images for ``response_format=url``, bucketed by hour and bounded in size.
+
+Files keep their public names, ``<uuid>.<created>.<ext>``, but live in one
+subdirectory per creation hour. The hour is read from the name, so a lookup
+goes straight to its bucket. Expiry removes whole buckets once every file in
+them is older than ``expiry_seconds``, and trims the one bucket straddling
+the cutoff.
+
+An in-memory index of file sizes per bucket makes the ``max_bytes`` quota
+cheap to enforce on every write: the oldest files are evicted until the store
+fits. A background sweeper thread, started with the store, expires files on
+a schedule and reconciles the index with the disk, so files written by other
+worker processes sharing the directory are counted too. Requests never scan
+the directory, and whole buckets are deleted outside the index lock.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+BUCKET_SECONDS = 3600
+
+
+class TempImageStore:
+    def __init__(
+        self,
+        directory: str,
+        expiry_seconds: float,
+        max_bytes: int = 0,
+        sweep_interval: float = 300.0,
+    ) -> None:
+        self.directory = Path(directory)
+        self.expiry_seconds = expiry_seconds
+        self.max_bytes = max(0, max_bytes)
+        self.sweep_interval = sweep_interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # hour -> filename -> size in bytes
+        self._buckets: Dict[int, Dict[str, int]] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        # Buckets from this hour on may still receive files from other processes.
+        self._rescan_from = 0
+        self._wake = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_pid: Optional[int] = None
+        self.evicted = 0
+        self.expired = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def save(self, data: bytes, mime_type: str) -> str:
+        return self.save_stream([data], mime_type)
+
+    def save_stream(self, chunks: Iterable[bytes], mime_type: str) -> str:
+        """Write ``chunks`` to a new file as they are produced and return its name."""
+
+        extension = "gif" if mime_type == "image/gif" else "png"
+        created = int(time.time())
+        filename = f"{uuid.uuid4().hex}.{created}.{extension}"
+        bucket = self.directory / str(created // BUCKET_SECONDS)
+        bucket.mkdir(exist_ok=True)
+        filepath = bucket / filename
+        size = 0
+        try:
+            with open(filepath, "wb") as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # Don't leave a truncated image behind if encoding fails midway
+            filepath.unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._buckets.setdefault(created // BUCKET_SECONDS, {})[filename] = size
+            self._total += size
+            if self.max_bytes and self._total > self.max_bytes:
+                self._evict(keep=filename)
+        self._ensure_sweeper()
+        return filename
+
+    def path(self, filename: str) -> Optional[Path]:
+        """Location of a stored, unexpired file, or ``None``."""
+
+        created = _created(filename)
+        if created is None or self.is_expired(filename):
+            return None
+        filepath = self.directory / str(created // BUCKET_SECONDS) / filename
+        if filepath.is_file():
+            return filepath
+        # Written before files were bucketed.
+        legacy = self.directory / filename
+        return legacy if legacy.is_file() else None
+
+    def is_expired(self, filename: str, now: Optional[float] = None) -> bool:
+        created = _created(filename)
+        if created is None:
+            return True  # Treat unparseable filenames as expired
+        return (time.time() if now is None else now) - created > self.expiry_seconds
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Expire old files, reconcile the index with the disk and return how many were removed."""
+
+        now = time.time() if now is None else now
+        cutoff = now - self.expiry_seconds
+        removed = self._remove_legacy(now)
+        on_disk = {int(entry.name) for entry in os.scandir(self.directory) if _is_bucket(entry)}
+
+        with self._lock:
+            rescan = {hour for hour in on_disk if hour >= self._rescan_from or hour not in self._buckets}
+            self._rescan_from = int(now // BUCKET_SECONDS) - 1
+        scanned = {
+            hour: _scan(self.directory / str(hour)) for hour in rescan if not _bucket_expired(hour, cutoff)
+        }
+
+        # hour -> number of indexed files, or None when it was never indexed
+        expired_buckets: Dict[int, Optional[int]] = {}
+        with self._lock:
+            for hour in set(self._buckets) - on_disk:
+                self._drop(hour)
+            for hour, files in scanned.items():
+                self._drop(hour)
+                self._buckets[hour] = files
+                self._total += sum(files.values())
+            for hour in sorted(on_disk):
+                if _bucket_expired(hour, cutoff):
+                    # Only unindexed here; the directory is deleted below,
+                    # outside the lock, so saves are not held up by it.
+                    files = self._buckets.get(hour)
+                    expired_buckets[hour] = len(files) if files else None
+                    self._drop(hour)
+                elif hour * BUCKET_SECONDS < cutoff:
+                    # Straddles the cutoff: only some of its files expired.
+                    removed += self._expire_files(hour, now)
+                else:
+                    break
+            if self.max_bytes and self._total > self.max_bytes:
+                self._evict()
+
+        for hour, count in expired_buckets.items():
+            bucket = self.directory / str(hour)
+            removed += count if count is not None else len(_scan(bucket))
+            shutil.rmtree(bucket, ignore_errors=True)
+        with self._lock:
+            self.expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": sum(len(files) for files in self._buckets.values()),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "buckets": len(self._buckets),
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def close(self) -> None:
+        self._sweeper_pid = None
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the background sweeper now rather than on the first save."""
+
+        self._ensure_sweeper()
+
+    def _ensure_sweeper(self) -> None:
+        # Started with the store, and again by a save in a forked worker,
+        # since threads don't survive fork.
+        if self._sweeper_pid == os.getpid() and self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid() and self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._wake.clear()
+            self._sweeper_pid = os.getpid()
+            self._sweeper = threading.Thread(target=self._run, name="temp-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _run(self) -> None:
+        # The first sweep indexes files left by earlier runs and other processes.
+        pid = os.getpid()
+        while self._sweeper_pid == pid:
+            try:
+                self.sweep()
+            except OSError:
+                pass
+            if self._wake.wait(self.sweep_interval):
+                return
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Delete the oldest files until the store fits its quota. Needs ``_lock``."""
+
+        for hour in sorted(self._buckets):
+            files = self._buckets[hour]
+            for filename in sorted(files, key=_sort_key):
+                if self._total <= self.max_bytes:
+                    return
+                if filename == keep:
+                    continue
+                (self.directory / str(hour) / filename).unlink(missing_ok=True)
+                self._total -= files.pop(filename)
+                self.evicted += 1
+
+    def _expire_files(self, hour: int, now: float) -> int:
+        files = self._buckets.get(hour, {})
+        expired = [name for name in files if self.is_expired(name, now)]
+        for filename in expired:
+            (self.directory / str(hour) / filename).unlink(missing_ok=True)
+            self._total -= files.pop(filename)
+        return len(expired)
+
+    def _drop(self, hour: int) -> None:
+        self._total -= sum(self._buckets.pop(hour, {}).values())
+
+    def _remove_legacy(self, now: float) -> int:
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and self.is_expired(entry.name, now) and _created(entry.name) is not None:
+                Path(entry.path).unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+def create_temp_store(
+    directory: str, expiry_hours: float, max_bytes: int = 0, sweep_interval: float = 300.0
+) -> TempImageStore:
+    """Build the store and start its sweeper, so old buckets expire even in a process that never saves."""
+
+    store = TempImageStore(directory, expiry_hours * 3600, max_bytes, sweep_interval)
+    store.start()
+    return store
+
+
+def _created(filename: str) -> Optional[int]:
+    # Format: uuid.timestamp.extension
+    parts = filename.split(".")
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def _bucket_expired(hour: int, cutoff: float) -> bool:
+    # Every file in it is expired once its last possible second is.
+    return (hour + 1) * BUCKET_SECONDS - 1 < cutoff
+
+
+def _sort_key(filename: str) -> Tuple[int, str]:
+    return (_created(filename) or 0, filename)
+
+
+def _is_bucket(entry: os.DirEntry) -> bool:
+    return entry.name.isdigit() and entry.is_dir()
+
+
+def _scan(bucket: Path) -> Dict[str, int]:
+    files = {}
+    try:
+        entries = list(os.scandir(bucket))
+    except FileNotFoundError:
+        return {}
+    for entry in entries:
+        try:
+            if entry.is_file() and _created(entry.name) is not None:
+                files[entry.name] = entry.stat().st_size
+        except FileNotFoundError:
+            continue
+    return files
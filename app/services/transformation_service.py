@@ -1,13 +1,26 @@
 from __future__ import annotations
 
 import base64
+import itertools
 import math
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from functools import partial
 from io import BytesIO
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageStat
+
+from . import array_engine, gif_encoder, metrics
+from .frame_executor import FrameExecutor
+from .gif_encoder import GifStreamWriter
+from .memory import MemoryMeter
+from .metrics import StageTimer
+from .target_cache import default_target_cache
+from ..utils.image_io import DRAFT_REDUCING_GAP, fit_within
 
 # Pillow safety guard to avoid decompression bombs on massive inputs.
 Image.MAX_IMAGE_PIXELS = 20_000_000
@@ -17,6 +30,22 @@ try:  # Pillow>=9.1 provides the Resampling namespace.
 except AttributeError:  # pragma: no cover - compatibility with older Pillow
     _RESAMPLING = Image.LANCZOS  # type: ignore[attr-defined]
 
+# "pillow" runs the reference ImageEnhance pipeline, "numpy" the fused array
+# kernel from :mod:`array_engine` (within ``array_engine.PILLOW_TOLERANCE``).
+_BLEND_ENGINES = {"pillow", "numpy"}
+
+# "full" writes every GIF frame with its own palette; "delta" shares one
+# global palette and writes only the changed region of each frame.
+GIF_ENCODINGS = {"full", "delta"}
+
+# Upper bound for the uint8 frame tensor the numpy engine renders per batch.
+DEFAULT_FRAME_BATCH_BYTES = 64 * 1024 * 1024
+
+# A prepared animation frame is kept for reuse at its mirrored position only
+# when that position comes at most this many frames later; otherwise it is
+# rendered again, so memory does not grow with the frame count.
+MIRROR_WINDOW = 8
+
 
 class TransformationError(Exception):
     """Domain error raised when the transformation cannot be performed."""
@@ -31,6 +60,22 @@ class TransformationRequest:
     gif_frame_count: int
     gif_duration: int
     max_dimension: Optional[int]
+    engine: str = "pillow"
+    frame_batch_bytes: int = DEFAULT_FRAME_BATCH_BYTES
+    gif_encoding: str = "full"
+    # Set when ``target`` came from the target cache, so resized variants
+    # can be reused instead of resizing ``target`` again.
+    target_path: Optional[str] = None
+    # Set when ``target`` is a registered pyramid target (the SHA-256 of its
+    # source file); variants are then resized from its pyramid levels.
+    target_id: Optional[str] = None
+    # SHA-256 of the raw uploaded bytes, used to address cached results.
+    source_digest: Optional[str] = None
+    target_digest: Optional[str] = None
+    # Refuse with TransformationError when the estimated memory use exceeds
+    # this many bytes, or abort once the process RSS has grown by more per
+    # running transform; 0 disables the ceiling.
+    memory_limit_bytes: int = 0
 
 
 @dataclass
@@ -40,116 +85,762 @@ class TransformationResult:
     width: int
     height: int
     frame_count: int
+    bytes_saved: int = 0
+    peak_memory_bytes: int = 0
 
     def as_base64(self) -> str:
         return base64.b64encode(self.data).decode("ascii")
 
 
+@dataclass
+class TransformationStream:
+    """A transformation whose encoded output is produced lazily in chunks.
+
+    Rendering and encoding happen while ``chunks`` is consumed, so the whole
+    output never has to be held in memory. ``frames_encoded`` counts GIF
+    frames as they are written, ``bytes_saved`` is filled in by delta GIF
+    encoding, and ``peak_memory_bytes`` once the stream is finished.
+    """
+
+    mime_type: str
+    width: int
+    height: int
+    frame_count: int
+    chunks: Iterator[bytes]
+    gif_encoding: str = "full"
+    bytes_saved: int = 0
+    frames_encoded: int = 0
+    peak_memory_bytes: int = 0
+
+    def write_to(self, fp: IO[bytes]) -> int:
+        written = 0
+        for chunk in self.chunks:
+            fp.write(chunk)
+            written += len(chunk)
+        return written
+
+    def read_all(self) -> bytes:
+        return b"".join(self.chunks)
+
+    def prime(self) -> "TransformationStream":
+        """Produce the first chunk now, rendering the first GIF frame.
+
+        Errors in setting up the render are then raised here, before any
+        response has started, instead of while the body is being sent.
+        """
+
+        rest = self.chunks
+        try:
+            first = next(rest)
+        except StopIteration:
+            self.chunks = iter(())
+            return self
+        self.chunks = self._prepend(first, rest)
+        return self
+
+    def tee(
+        self,
+        callback: Callable[[Optional[TransformationResult]], None],
+        limit: Optional[int] = None,
+    ) -> "TransformationStream":
+        """Record the chunks as they are consumed and report the finished result.
+
+        ``callback`` is called exactly once: with the complete
+        :class:`TransformationResult` when the stream is exhausted, or with
+        ``None`` if it is abandoned, fails, or grows beyond ``limit`` bytes.
+        """
+
+        self.chunks = self._recording(self.chunks, callback, limit)
+        return self
+
+    def on_close(self, callback: Callable[[], None]) -> "TransformationStream":
+        """Call ``callback`` once consumption of the chunks ends, however it ends.
+
+        A stream that is never iterated never calls it; callers that may drop
+        a stream unread must also arrange a release of their own.
+        """
+
+        self.chunks = self._closing(self.chunks, callback)
+        return self
+
+    @staticmethod
+    def _prepend(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+        try:
+            yield first
+            yield from rest
+        finally:
+            # Also runs the close callbacks of a stream closed before its first chunk.
+            close = getattr(rest, "close", None)
+            if close is not None:
+                close()
+
+    @staticmethod
+    def _closing(chunks: Iterator[bytes], callback: Callable[[], None]) -> Iterator[bytes]:
+        try:
+            yield from chunks
+        finally:
+            callback()
+
+    def _recording(
+        self,
+        chunks: Iterator[bytes],
+        callback: Callable[[Optional[TransformationResult]], None],
+        limit: Optional[int],
+    ) -> Iterator[bytes]:
+        recorded: Optional[List[bytes]] = []
+        size = 0
+        completed = False
+        try:
+            for chunk in chunks:
+                if recorded is not None:
+                    size += len(chunk)
+                    if limit is not None and size > limit:
+                        recorded = None
+                    else:
+                        recorded.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed and recorded is not None:
+                callback(
+                    TransformationResult(
+                        data=b"".join(recorded),
+                        mime_type=self.mime_type,
+                        width=self.width,
+                        height=self.height,
+                        frame_count=self.frame_count,
+                        bytes_saved=self.bytes_saved,
+                    )
+                )
+            else:
+                callback(None)
+
+
+@dataclass
+class _RenderContext:
+    """Per-request invariants shared by every rendered frame.
+
+    Only the per-mix arithmetic depends on the frame, so the RGB endpoints,
+    the blurred source and the endpoint luma means are computed once.
+    """
+
+    source: Image.Image
+    target: Image.Image
+    softened: Image.Image
+    source_mean: float
+    target_mean: float
+    engine: str
+    batch_bytes: int = DEFAULT_FRAME_BATCH_BYTES
+    source_pixels: Any = None
+    target_pixels: Any = None
+    softened_pixels: Any = None
+
+    @property
+    def size(self):
+        return self.source.size
+
+    def blended_mean(self, mix: float) -> int:
+        # Luma is linear, so the mean of a blend is the blend of the means.
+        return int((1 - mix) * self.source_mean + mix * self.target_mean + 0.5)
+
+    def render(self, mix: float) -> Image.Image:
+        return _blend_frame(self, mix)
+
+    def shared_images(self) -> Dict[str, Image.Image]:
+        return {"source": self.source, "target": self.target, "softened": self.softened}
+
+    def shared_params(self) -> Dict[str, Any]:
+        return {
+            "source_mean": self.source_mean,
+            "target_mean": self.target_mean,
+            "engine": self.engine,
+            "batch_bytes": self.batch_bytes,
+        }
+
+    @classmethod
+    def from_shared(cls, images: Dict[str, Image.Image], params: Dict[str, Any]) -> "_RenderContext":
+        """Rebuild a context in a frame executor worker without re-blurring the source."""
+
+        context = cls(**images, **params)
+        context._attach_arrays()
+        return context
+
+    def _attach_arrays(self) -> None:
+        if self.engine == "numpy":
+            self.source_pixels = array_engine.as_rgb_array(self.source)
+            self.target_pixels = array_engine.as_rgb_array(self.target)
+            self.softened_pixels = array_engine.as_rgb_array(self.softened)
+
+
 def load_default_target(path: str) -> Image.Image:
-    default_path = Path(path)
-    if not default_path.exists():
+    """Return the decoded default target, served from the process-wide target cache."""
+
+    try:
+        return default_target_cache.get(path)
+    except FileNotFoundError:
         raise TransformationError(
-            f"Default target image was not found at '{default_path}'."
-        )
-    with default_path.open("rb") as handle:
-        image = Image.open(handle)
-        image.load()
-    return ImageOps.exif_transpose(image).convert("RGBA")
+            f"Default target image was not found at '{Path(path)}'."
+        ) from None
+
+
+def load_registered_target(target_id: str) -> Image.Image:
+    """Return a target registered with ``scripts/build_target_pyramid.py`` by its id."""
+
+    try:
+        return default_target_cache.get_registered(target_id)
+    except FileNotFoundError:
+        raise TransformationError(f"No target is registered under id '{target_id}'.") from None
+
+
+def transform(
+    payload: TransformationRequest,
+    *,
+    executor: Optional[FrameExecutor] = None,
+    target_variants: Optional["_TargetVariants"] = None,
+) -> TransformationResult:
+    if payload.memory_limit_bytes:
+        # The whole output is held in memory as well.
+        _check_memory_estimate(payload, _resolve_engine(payload.engine), buffered=True)
+    stream = transform_stream(payload, executor=executor, target_variants=target_variants)
+    data = stream.read_all()
+    return TransformationResult(
+        data=data,
+        mime_type=stream.mime_type,
+        width=stream.width,
+        height=stream.height,
+        frame_count=stream.frame_count,
+        bytes_saved=stream.bytes_saved,
+        peak_memory_bytes=stream.peak_memory_bytes,
+    )
 
 
-def transform(payload: TransformationRequest) -> TransformationResult:
-    source = _prepare_image(payload.source, payload.max_dimension)
-    target = _prepare_image(payload.target, payload.max_dimension)
+def transform_stream(
+    payload: TransformationRequest,
+    *,
+    executor: Optional[FrameExecutor] = None,
+    target_variants: Optional["_TargetVariants"] = None,
+) -> TransformationStream:
+    """Prepare the images and return a stream that renders and encodes on demand.
 
-    # Ensure the two images have identical dimensions before blending.
-    if target.size != source.size:
-        target = target.resize(source.size, _RESAMPLING)
+    GIF frames are rendered, quantized and written one at a time, so memory
+    use is bounded by a few frames rather than ``gif_frame_count``.
+    """
 
-    blend_ratio = _clamp(payload.blend_ratio, 0.0, 1.0)
+    engine = _resolve_engine(payload.engine)
+    if payload.gif_encoding not in GIF_ENCODINGS:
+        raise TransformationError(
+            f"Unknown GIF encoding '{payload.gif_encoding}'. Expected one of {sorted(GIF_ENCODINGS)}."
+        )
+    if payload.memory_limit_bytes:
+        _check_memory_estimate(payload, engine)
+    timer = StageTimer().set_labels(
+        payload.make_gif, fit_within(payload.source.size, payload.max_dimension)
+    )
+    meter = MemoryMeter(payload.memory_limit_bytes)
+    timer.checkpoint = partial(_check_memory, meter)
+    try:
+        stream = _build_stream(payload, engine, executor, target_variants, timer)
+    except BaseException:
+        meter.close()
+        raise
+    # Stage totals and peak memory are recorded once the output has been consumed.
+    return stream.on_close(partial(_finish_stream, stream, timer, meter))
+
+
+def _build_stream(
+    payload: TransformationRequest,
+    engine: str,
+    executor: Optional[FrameExecutor],
+    target_variants: Optional["_TargetVariants"],
+    timer: StageTimer,
+) -> TransformationStream:
+    with timer.stage("prepare"):
+        source = _prepare_image(payload.source, payload.max_dimension)
+        if payload.target_id:
+            target = _load_registered_target(payload.target_id, source.size)
+        elif payload.target_path:
+            # Cached targets are resized straight from the decoded original.
+            target = _load_cached_target(payload.target_path, source.size)
+        elif target_variants is not None:
+            target = target_variants.get(payload.target, payload.max_dimension, source.size)
+        else:
+            target = _prepare_image(payload.target, payload.max_dimension)
+
+        # Ensure the two images have identical dimensions before blending.
+        if target.size != source.size:
+            target = target.resize(source.size, _RESAMPLING)
+
+        blend_ratio = _clamp(payload.blend_ratio, 0.0, 1.0)
+        context = _build_render_context(source, target, engine, payload.frame_batch_bytes)
+    width, height = context.size
 
     if payload.make_gif:
-        frames = _render_animation_frames(source, target, blend_ratio, payload.gif_frame_count)
-        if not frames:
-            raise TransformationError("Unable to create GIF frames from the provided images.")
-
-        buffer = BytesIO()
-        first, rest = frames[0], frames[1:]
-        first.save(
-            buffer,
-            format="GIF",
-            save_all=True,
-            append_images=rest,
-            loop=0,
-            duration=max(20, payload.gif_duration),
-            disposal=2,
-        )
-        data = buffer.getvalue()
-        width, height = frames[0].size
-        return TransformationResult(
-            data=data,
+        count = max(2, payload.gif_frame_count)
+        stream = TransformationStream(
             mime_type="image/gif",
             width=width,
             height=height,
-            frame_count=len(frames),
+            frame_count=count,
+            chunks=iter(()),
+            gif_encoding=payload.gif_encoding,
         )
+        stream.chunks = _encode_animation(
+            context, blend_ratio, count, max(20, payload.gif_duration), executor, stream, timer
+        )
+        return stream
 
-    final_image = _blend_frame(source, target, blend_ratio)
-    buffer = BytesIO()
-    final_image.save(buffer, format="PNG")
-    data = buffer.getvalue()
-    width, height = final_image.size
-    return TransformationResult(
-        data=data,
+    with timer.stage("blend"):
+        final_image = _blend_frame(context, blend_ratio)
+    with timer.stage("encode"):
+        buffer = BytesIO()
+        final_image.save(buffer, format="PNG")
+    return TransformationStream(
         mime_type="image/png",
         width=width,
         height=height,
         frame_count=1,
+        chunks=iter([buffer.getvalue()]),
     )
 
 
+def estimate_memory(payload: TransformationRequest, engine: str = "pillow", buffered: bool = False) -> int:
+    """Estimate the bytes ``payload`` allocates while it renders.
+
+    Counts the prepared source and target, the frames in flight and the frames
+    kept for the mirrored half of an animation, all at the output size. With
+    ``buffered``, the encoded output held in memory is counted too. The decoded inputs are not counted; they exist
+    before the transform starts.
+    """
+
+    width, height = fit_within(payload.source.size, payload.max_dimension)
+    frame = width * height * 4
+    # Prepared source and target, a blended frame and its encoded copy.
+    total = 4 * frame
+    frames = 1
+    if payload.make_gif:
+        frames = max(2, payload.gif_frame_count)
+        # The previous frame kept for delta encoding and a quantized frame.
+        total += 2 * frame
+        total += min(frames // 2, MIRROR_WINDOW) * frame
+        if engine == "numpy":
+            total += min(payload.frame_batch_bytes, frame * frames)
+    if buffered:
+        # LZW output of noisy frames reaches about 1.5 bytes per pixel, and
+        # it is held twice while the chunks are joined.
+        total += 3 * width * height * frames
+    return total
+
+
+def _check_memory_estimate(payload: TransformationRequest, engine: str, buffered: bool = False) -> None:
+    # Checked before anything is rendered, so even a streamed response can
+    # still be refused with an error status.
+    estimate = estimate_memory(payload, engine, buffered)
+    if estimate > payload.memory_limit_bytes:
+        raise TransformationError(
+            f"The transformation would need about {estimate / (1024 * 1024):.0f} MB of memory, "
+            f"over the limit of {payload.memory_limit_bytes / (1024 * 1024):.0f} MB. "
+            "Try a smaller max_dimension or fewer GIF frames."
+        )
+
+
+def _check_memory(meter: MemoryMeter) -> None:
+    if meter.over_limit():
+        limit_mb = meter.limit_bytes / (1024 * 1024)
+        raise TransformationError(
+            f"The transformation needed more than {limit_mb:.0f} MB of memory and was stopped. "
+            "Try a smaller max_dimension or fewer GIF frames."
+        )
+
+
+def _finish_stream(stream: TransformationStream, timer: StageTimer, meter: MemoryMeter) -> None:
+    stream.peak_memory_bytes = meter.close()
+    timer.flush()
+    if meter.available:
+        metrics.PEAK_MEMORY_BYTES.observe(stream.peak_memory_bytes, format=timer.format, size=timer.size)
+
+
+def transform_many(
+    payloads: Iterable[Union[TransformationRequest, Callable[[], TransformationRequest]]],
+    *,
+    max_workers: Optional[int] = None,
+    executor: Optional[FrameExecutor] = None,
+    admit: Optional[Callable[[TransformationRequest], Callable[[], None]]] = None,
+) -> Iterator[Tuple[int, Union[TransformationResult, Exception]]]:
+    """Transform many sources in parallel, yielding ``(index, result)`` as each finishes.
+
+    Items may be requests or zero-argument callables returning one, so
+    sources can be decoded on the worker threads too. Uploaded targets shared
+    between requests are prepared once and resized once per distinct output
+    size. A failing item yields its exception instead of a result, without
+    stopping the rest of the batch. At most ``2 * max_workers`` items are
+    in flight, so ``payloads`` is consumed lazily.
+
+    ``admit`` is called with each request before it renders, and may block
+    or raise to hold it back; the callable it returns is called once the
+    render ends.
+    """
+
+    workers = max(1, max_workers or os.cpu_count() or 1)
+    variants = _TargetVariants()
+
+    def run(item: Union[TransformationRequest, Callable[[], TransformationRequest]]) -> TransformationResult:
+        payload = item() if callable(item) else item
+        release = admit(payload) if admit is not None else None
+        try:
+            return transform(payload, executor=executor, target_variants=variants)
+        finally:
+            if release is not None:
+                release()
+
+    items = enumerate(payloads)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transform-batch")
+    pending: Dict[Future, int] = {}
+    try:
+        for index, item in itertools.islice(items, workers * 2):
+            pending[pool.submit(run, item)] = index
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    yield index, future.result()
+                except Exception as exc:
+                    yield index, exc
+                for next_index, item in itertools.islice(items, 1):
+                    pending[pool.submit(run, item)] = next_index
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _TargetVariants:
+    """Prepared copies of shared uploaded targets, one per output size."""
+
+    def __init__(self) -> None:
+        self._prepared: Dict[Tuple[int, Optional[int]], Tuple[Image.Image, Image.Image]] = {}
+        self._resized: Dict[Tuple[int, Optional[int], Tuple[int, int]], Image.Image] = {}
+        self._lock = threading.Lock()
+
+    def get(self, target: Image.Image, max_dimension: Optional[int], size: Tuple[int, int]) -> Image.Image:
+        # Keyed by identity; the original is kept alive alongside its variants
+        # so its id cannot be reused by another image.
+        key = (id(target), max_dimension)
+        with self._lock:
+            entry = self._prepared.get(key)
+            if entry is None:
+                entry = (target, _prepare_image(target, max_dimension))
+                self._prepared[key] = entry
+            variant = self._resized.get(key + (size,))
+            if variant is None:
+                prepared = entry[1]
+                variant = prepared if prepared.size == size else prepared.resize(size, _RESAMPLING)
+                self._resized[key + (size,)] = variant
+        return variant
+
+
+def _load_cached_target(path: str, size) -> Image.Image:
+    try:
+        return default_target_cache.get_resized(path, size)
+    except FileNotFoundError:
+        raise TransformationError(f"Target image was not found at '{Path(path)}'.") from None
+
+
+def _load_registered_target(target_id: str, size) -> Image.Image:
+    try:
+        return default_target_cache.get_registered_resized(target_id, size)
+    except FileNotFoundError:
+        raise TransformationError(f"No target is registered under id '{target_id}'.") from None
+
+
 def _prepare_image(image: Image.Image, max_dimension: Optional[int]) -> Image.Image:
-    processed = ImageOps.exif_transpose(image).convert("RGBA")
-    if max_dimension:
-        width, height = processed.size
-        longest_side = max(width, height)
-        if longest_side > max_dimension:
-            scale = max_dimension / float(longest_side)
-            new_size = (
-                max(1, int(round(width * scale))),
-                max(1, int(round(height * scale))),
-            )
-            processed = processed.resize(new_size, _RESAMPLING)
-    return processed
-
-
-def _render_animation_frames(
+    # Resize in the stored orientation (rotation does not change the longest
+    # side) so the EXIF transpose and RGBA conversion run on the small image.
+    if image.mode not in {"RGB", "RGBA"}:
+        # Palette and bilevel images would otherwise resize with NEAREST.
+        image = image.convert("RGBA")
+    new_size = fit_within(image.size, max_dimension)
+    if new_size != image.size:
+        # reducing_gap lets Pillow box-reduce() by an integer factor first and
+        # only run LANCZOS over the last 2x.
+        image = image.resize(new_size, _RESAMPLING, reducing_gap=DRAFT_REDUCING_GAP)
+    return ImageOps.exif_transpose(image).convert("RGBA")
+
+
+def _build_render_context(
     source: Image.Image,
     target: Image.Image,
+    engine: str = "pillow",
+    batch_bytes: int = DEFAULT_FRAME_BATCH_BYTES,
+) -> _RenderContext:
+    rgb_source = source.convert("RGB")
+    rgb_target = target.convert("RGB")
+    context = _RenderContext(
+        source=rgb_source,
+        target=rgb_target,
+        softened=rgb_source.filter(ImageFilter.GaussianBlur(radius=1.5)),
+        source_mean=ImageStat.Stat(rgb_source.convert("L")).mean[0],
+        target_mean=ImageStat.Stat(rgb_target.convert("L")).mean[0],
+        engine=engine,
+        batch_bytes=batch_bytes,
+    )
+    context._attach_arrays()
+    return context
+
+
+def _encode_animation(
+    context: _RenderContext,
+    blend_ratio: float,
+    frame_count: int,
+    duration: int,
+    executor: Optional[FrameExecutor],
+    report: TransformationStream,
+    timer: StageTimer,
+) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    if report.gif_encoding == "delta":
+        frames = _encode_delta_frames(
+            context, blend_ratio, frame_count, duration, executor, sink, report, timer
+        )
+    else:
+        frames = _encode_full_frames(context, blend_ratio, frame_count, duration, executor, sink, timer)
+    for _ in frames:
+        report.frames_encoded += 1
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    yield sink.drain()
+
+
+def _encode_full_frames(
+    context: _RenderContext,
     blend_ratio: float,
     frame_count: int,
-) -> List[Image.Image]:
-    count = max(2, frame_count)
-    mixes = _animation_mix_values(blend_ratio, count)
-    return [_blend_frame(source, target, mix) for mix in mixes]
+    duration: int,
+    executor: Optional[FrameExecutor],
+    sink: "_ChunkSink",
+    timer: StageTimer,
+) -> Iterator[None]:
+    """Write every frame in full with its own adaptive palette, one frame per step."""
+
+    def prepare(frame: Image.Image) -> bytes:
+        with timer.stage("quantize"):
+            indexed = gif_encoder.quantize_frame(frame)
+        with timer.stage("encode"):
+            return GifStreamWriter.encode(indexed)
+
+    writer = GifStreamWriter(sink, context.size, duration=duration)
+    for key, block in _iter_animation_loop(context, blend_ratio, frame_count, executor, prepare, timer):
+        writer.add(block, key)
+        yield
+    writer.close()
+
+
+def _encode_delta_frames(
+    context: _RenderContext,
+    blend_ratio: float,
+    frame_count: int,
+    duration: int,
+    executor: Optional[FrameExecutor],
+    sink: "_ChunkSink",
+    report: TransformationStream,
+    timer: StageTimer,
+) -> Iterator[None]:
+    """Write frames against one global palette, each as its changed bounding box.
+
+    The palette comes from the two ends of the animation: the untouched
+    source and the frame at the full blend ratio. ``report.bytes_saved``
+    adds up how much smaller each written frame is than the same frame
+    written whole with its own colour table, as full encoding writes it.
+    Besides the previous frame, indexed frames are only kept within
+    :data:`MIRROR_WINDOW` of their mirrored position.
+    """
+
+    with timer.stage("quantize"):
+        palette = gif_encoder.build_shared_palette([context.source, context.render(blend_ratio)])
+    writer = GifStreamWriter(
+        sink,
+        context.size,
+        duration=duration,
+        disposal=gif_encoder.DISPOSE_NONE,
+        palette=gif_encoder.palette_bytes(palette),
+    )
+    previous: Optional[Image.Image] = None
+    previous_key: Optional[float] = None
+    # Size of each distinct frame written in full; mirrored frames reuse it.
+    full_sizes: Dict[float, int] = {}
+
+    def full_size(key: float, indexed: Image.Image) -> int:
+        if key not in full_sizes:
+            full_sizes[key] = len(GifStreamWriter.encode(indexed))
+        return full_sizes[key]
+
+    def prepare(frame: Image.Image) -> Image.Image:
+        with timer.stage("quantize"):
+            return gif_encoder.apply_palette(frame, palette)
+
+    for key, indexed in _iter_animation_loop(context, blend_ratio, frame_count, executor, prepare, timer):
+        if previous is None:
+            with timer.stage("encode"):
+                block = GifStreamWriter.encode(indexed, include_color_table=False)
+                saved = full_size(key, indexed) - len(block)
+            report.bytes_saved += max(0, saved)
+            writer.add(block, key, transparency=gif_encoder.TRANSPARENT_INDEX)
+        elif key == previous_key:
+            writer.extend()
+        else:
+            with timer.stage("encode"):
+                delta = gif_encoder.delta_frame(previous, indexed)
+                if delta is not None:
+                    region, offset = delta
+                    block = GifStreamWriter.encode(region, offset=offset, include_color_table=False)
+                saved = full_size(key, indexed) - (len(block) if delta is not None else 0)
+            report.bytes_saved += max(0, saved)
+            if delta is None:
+                writer.extend()
+            else:
+                writer.add(block, key, transparency=gif_encoder.TRANSPARENT_INDEX)
+        previous, previous_key = indexed, key
+        yield
+    writer.close()
+
+
+def _iter_animation_loop(
+    context: _RenderContext,
+    blend_ratio: float,
+    frame_count: int,
+    executor: Optional[FrameExecutor],
+    prepare: Callable[[Image.Image], Any],
+    timer: StageTimer,
+) -> Iterator[Tuple[float, Any]]:
+    """Yield ``(mix key, prepared frame)`` for every position of the animation loop.
+
+    The sin^2 easing is palindromic, so most mixes occur twice. A prepared
+    value is kept for the mirrored position only when that comes within
+    :data:`MIRROR_WINDOW` frames, which holds at most that many values at
+    once; frames further apart are rendered and prepared again.
+    """
+
+    mixes = list(_animation_mix_values(blend_ratio, frame_count))
+    keys = [_mix_key(mix) for mix in mixes]
+    # Whether each position's value is kept for the next use of its mix.
+    keep = [False] * len(keys)
+    next_use: Dict[float, int] = {}
+    for index in range(len(keys) - 1, -1, -1):
+        following = next_use.get(keys[index])
+        keep[index] = following is not None and following - index <= MIRROR_WINDOW
+        next_use[keys[index]] = index
+
+    # Render, in loop order, every position whose value was not kept.
+    renders = []
+    kept = set()
+    for index, (key, mix) in enumerate(zip(keys, mixes)):
+        if key in kept:
+            kept.discard(key)
+        else:
+            renders.append(mix)
+        if keep[index]:
+            kept.add(key)
+    frames = _iter_rendered_frames(context, renders, executor)
+    prepared: Dict[float, Any] = {}
+
+    for index, key in enumerate(keys):
+        item = prepared.pop(key, None)
+        if item is None:
+            with timer.stage("blend"):
+                frame = next(frames)
+            item = prepare(frame)
+        if keep[index]:
+            prepared[key] = item
+        yield key, item
+
+
+def _iter_rendered_frames(
+    context: _RenderContext,
+    mixes: List[float],
+    executor: Optional[FrameExecutor] = None,
+) -> Iterator[Image.Image]:
+    """Yield one RGB frame per mix, rendering ahead only as far as one batch."""
+
+    if executor is not None and executor.should_parallelise(len(mixes)):
+        step = max(executor.min_frames, executor.max_workers * 2)
+        for start in range(0, len(mixes), step):
+            yield from executor.render(context, mixes[start:start + step])
+    elif context.engine == "numpy":
+        pixels = array_engine.blend_batch(
+            context.source_pixels,
+            context.target_pixels,
+            context.softened_pixels,
+            mixes,
+            [context.blended_mean(mix) for mix in mixes],
+            context.batch_bytes,
+        )
+        for frame in pixels:
+            yield Image.fromarray(frame, "RGB")
+    else:
+        for mix in mixes:
+            yield context.render(mix)
+
+
+class _ChunkSink:
+    """Write target that collects encoder output until it is drained."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
 
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
 
-def _blend_frame(source: Image.Image, target: Image.Image, mix: float) -> Image.Image:
+
+def _mix_key(mix: float) -> float:
+    # sin(pi * p) and sin(pi * (1 - p)) can differ in the last few bits.
+    return round(mix, 9)
+
+
+def _resolve_engine(engine: str) -> str:
+    candidate = (engine or "pillow").strip().lower()
+    if candidate not in _BLEND_ENGINES:
+        raise TransformationError(
+            f"Unknown blend engine '{engine}'. Expected one of {sorted(_BLEND_ENGINES)}."
+        )
+    if candidate == "numpy" and not array_engine.is_available():
+        raise TransformationError("The numpy blend engine requires numpy to be installed.")
+    return candidate
+
+
+def _blend_frame(context: _RenderContext, mix: float) -> Image.Image:
     mix = _clamp(mix, 0.0, 1.0)
+    if context.engine == "numpy":
+        pixels = array_engine.blend_pixels(
+            context.source_pixels,
+            context.target_pixels,
+            context.softened_pixels if mix > 0 else None,
+            mix,
+            context.blended_mean(mix),
+        )
+        return Image.fromarray(pixels, "RGB")
+
     # Primary blend between the source and the target.
-    blended = Image.blend(source, target, mix)
+    blended = Image.blend(context.source, context.target, mix)
 
-    # Enhance definition so the result retains recognisable details.
-    detail = ImageEnhance.Contrast(blended).enhance(1 + mix * 0.35)
+    # Enhance definition so the result retains recognisable details. This is
+    # ImageEnhance.Contrast with the mean taken from the render context.
+    mean = context.blended_mean(mix)
+    degenerate = Image.new("RGB", context.size, (mean, mean, mean))
+    detail = Image.blend(degenerate, blended, 1 + mix * 0.35)
     colorised = ImageEnhance.Color(detail).enhance(1 + mix * 0.25)
 
     if mix > 0:
         # Reintroduce a hint of the original source to keep eyes and facial
         # features readable while still leaning into the target colours.
         mask_strength = min(0.4, mix * 0.4)
-        softened = source.filter(ImageFilter.GaussianBlur(radius=1.5))
-        colorised = Image.blend(colorised, softened, mask_strength)
+        colorised = Image.blend(colorised, context.softened, mask_strength)
 
-    return colorised.convert("RGB")
+    return colorised
 
 
 def _animation_mix_values(blend_ratio: float, frame_count: int) -> Iterable[float]:
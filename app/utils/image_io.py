@@ -1,57 +1,399 @@
 from __future__ import annotations
 
-import base64
 import binascii
-import re
-from io import BytesIO
+import io
+import math
+from dataclasses import dataclass, replace
+from typing import FrozenSet, Optional, Tuple, Union
 
 from PIL import Image, ImageFile
 from werkzeug.datastructures import FileStorage
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-_DATA_URL_RE = re.compile(r"^data:(?P<mime>[^;]+);base64,(?P<data>.+)$", re.IGNORECASE)
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Decoders only shrink by DCT scaling down to this multiple of the output size,
+# leaving the final step to a high-quality resample.
+DRAFT_REDUCING_GAP = 2.0
+
+_ORIENTATION_TAG = 0x0112
+
+# Base64 characters decoded per step; a multiple of 4 so chunks stay aligned.
+_BASE64_CHUNK_CHARS = 256 * 1024
+_DATA_URL_MAX_HEADER = 256
 
 
 class ImageDecodingError(ValueError):
     """Raised when raw image input cannot be decoded into a Pillow image."""
 
 
-def decode_base64_image(encoded: str) -> Image.Image:
+class ImageRejectedError(ImageDecodingError):
+    """Raised by the header probe when an image is refused before decoding.
+
+    ``too_large`` distinguishes inputs that exceed the size budget (HTTP 413)
+    from inputs that are unsupported (HTTP 422).
+    """
+
+    def __init__(self, message: str, *, too_large: bool) -> None:
+        super().__init__(message)
+        self.too_large = too_large
+
+
+@dataclass(frozen=True)
+class ImageBudget:
+    """Per-request limits checked against the image header before decoding."""
+
+    # Pixels declared by the header, whatever the decoder would do with them.
+    max_pixels: int = 40_000_000
+    # Pixels actually decoded, after any JPEG draft reduction.
+    max_decode_pixels: int = 20_000_000
+    max_frames: int = 500
+    # Frames times pixels per frame, so large animations are refused too.
+    max_frame_pixels: int = 100_000_000
+    formats: Optional[FrozenSet[str]] = None
+
+
+@dataclass(frozen=True)
+class ImageProbe:
+    format: str
+    width: int
+    height: int
+    frame_count: int
+    orientation: int
+    # Pixels the decoder will produce for the requested output size.
+    decode_pixels: int
+
+
+def decode_base64_image(
+    encoded: str,
+    max_dimension: Optional[int] = None,
+    budget: Optional[ImageBudget] = None,
+) -> Image.Image:
+    return load_image_from_bytes(decode_base64_bytes(encoded), max_dimension, budget)
+
+
+def decode_base64_bytes(encoded: str) -> bytearray:
+    """Decode base64 (optionally a ``data:`` URL) into a single preallocated buffer.
+
+    JSON payloads can be several megabytes, so the string is never stripped,
+    regex-matched or encoded as a whole. Only the bounds of the base64 body
+    are located, and it is decoded in fixed-size chunks straight into the
+    output buffer.
+    """
+
     if not encoded:
         raise ImageDecodingError("No base64 encoded image data was provided.")
 
-    payload = encoded.strip()
-    match = _DATA_URL_RE.match(payload)
-    if match:
-        payload = match.group("data")
+    start, end = _base64_bounds(encoded)
+    length = end - start
+    padding = 0
+    while padding < min(length, 3) and encoded[end - 1 - padding] == "=":
+        padding += 1
+    if length == 0 or length % 4 or padding > 2:
+        raise ImageDecodingError("The provided string is not valid base64 image data.")
 
+    binary = bytearray(length // 4 * 3 - padding)
+    view = memoryview(binary)
+    written = 0
     try:
-        binary = base64.b64decode(payload, validate=True)
-    except (binascii.Error, ValueError) as exc:  # pragma: no cover - defensive
+        for offset in range(start, end, _BASE64_CHUNK_CHARS):
+            chunk = binascii.a2b_base64(
+                encoded[offset:min(end, offset + _BASE64_CHUNK_CHARS)].encode("ascii")
+            )
+            # a2b_base64 skips characters outside the alphabet, so a short
+            # chunk means the input was not strictly valid base64.
+            expected = min(_BASE64_CHUNK_CHARS, end - offset) // 4 * 3
+            if offset + _BASE64_CHUNK_CHARS >= end:
+                expected -= padding
+            if len(chunk) != expected:
+                raise ValueError("invalid base64 chunk")
+            view[written:written + expected] = chunk
+            written += expected
+    except (binascii.Error, UnicodeEncodeError, ValueError) as exc:
         raise ImageDecodingError("The provided string is not valid base64 image data.") from exc
+    finally:
+        view.release()
 
-    return _load_image_from_bytes(binary)
+    return binary
 
 
-def load_image_from_file(file: FileStorage) -> Image.Image:
+def load_image_from_file(
+    file: FileStorage,
+    max_dimension: Optional[int] = None,
+    budget: Optional[ImageBudget] = None,
+) -> Image.Image:
     if file is None:
         raise ImageDecodingError("No uploaded image file was provided.")
 
     try:
         file.stream.seek(0)
-        image = Image.open(file.stream)
+        image = _open(file.stream)
+        if budget is not None:
+            inspect_image(image, max_dimension, budget)
+        _draft(image, max_dimension)
         image.load()
+    except ImageRejectedError:
+        raise
     except (OSError, ValueError) as exc:
         raise ImageDecodingError("Unable to read the uploaded image file.") from exc
 
     return image
 
 
-def _load_image_from_bytes(binary: bytes) -> Image.Image:
+def load_image_from_bytes(
+    binary: Buffer,
+    max_dimension: Optional[int] = None,
+    budget: Optional[ImageBudget] = None,
+) -> Image.Image:
     try:
-        image = Image.open(BytesIO(binary))
+        image = _open(BufferReader(binary))
+        if budget is not None:
+            inspect_image(image, max_dimension, budget)
+        _draft(image, max_dimension)
         image.load()
+    except ImageRejectedError:
+        raise
     except (OSError, ValueError) as exc:
         raise ImageDecodingError("Unable to decode the provided image bytes.") from exc
     return image
+
+
+def probe_image(
+    image: Image.Image,
+    max_dimension: Optional[int] = None,
+    frame_limit: Optional[int] = None,
+) -> ImageProbe:
+    """Describe an opened but not yet loaded image using only its headers.
+
+    GIF frames can only be counted by walking the file's blocks, so counting
+    stops after ``frame_limit + 1`` frames. No frame is decoded.
+    """
+
+    try:
+        orientation = int(image.getexif().get(_ORIENTATION_TAG, 1))
+    except (OSError, ValueError, TypeError):
+        orientation = 1
+    scale = _draft_scale(image, max_dimension)
+    return ImageProbe(
+        format=image.format or "",
+        width=image.width,
+        height=image.height,
+        frame_count=_count_frames(image, frame_limit),
+        orientation=orientation,
+        decode_pixels=-(-image.width // scale) * -(-image.height // scale),
+    )
+
+
+def inspect_image(
+    image: Image.Image, max_dimension: Optional[int], budget: ImageBudget
+) -> ImageProbe:
+    """Probe ``image`` and reject it if it exceeds ``budget``, cheapest checks first.
+
+    Format and dimensions are checked before any frames are counted, and
+    frames are only counted as far as the budget allows.
+    """
+
+    probe = probe_image(image, max_dimension, frame_limit=0)
+    check_budget(probe, budget)
+    frame_limit = min(budget.max_frames, budget.max_frame_pixels // max(1, probe.width * probe.height))
+    probe = replace(probe, frame_count=_count_frames(image, frame_limit))
+    check_budget(probe, budget)
+    return probe
+
+
+def check_budget(probe: ImageProbe, budget: ImageBudget) -> None:
+    if budget.formats is not None and probe.format not in budget.formats:
+        raise ImageRejectedError(
+            f"Unsupported image format '{probe.format or 'unknown'}'. "
+            f"Expected one of {sorted(budget.formats)}.",
+            too_large=False,
+        )
+    if probe.width * probe.height > budget.max_pixels:
+        raise ImageRejectedError(
+            f"Image dimensions {probe.width}x{probe.height} exceed the limit of "
+            f"{budget.max_pixels} pixels.",
+            too_large=True,
+        )
+    if probe.decode_pixels > budget.max_decode_pixels:
+        raise ImageRejectedError(
+            f"Decoding a {probe.width}x{probe.height} {probe.format} image exceeds the "
+            f"budget of {budget.max_decode_pixels} pixels; upload a smaller image.",
+            too_large=True,
+        )
+    if probe.frame_count > budget.max_frames:
+        raise ImageRejectedError(
+            f"Image has more than the limit of {budget.max_frames} frames.",
+            too_large=True,
+        )
+    if probe.frame_count * probe.width * probe.height > budget.max_frame_pixels:
+        raise ImageRejectedError(
+            f"Image has too many {probe.width}x{probe.height} frames; frames times pixels "
+            f"exceed the budget of {budget.max_frame_pixels}.",
+            too_large=True,
+        )
+
+
+def _base64_bounds(encoded: str) -> Tuple[int, int]:
+    """Return the slice of ``encoded`` holding the base64 body, without copying it."""
+
+    start, end = 0, len(encoded)
+    while start < end and encoded[start].isspace():
+        start += 1
+    while end > start and encoded[end - 1].isspace():
+        end -= 1
+    # A data URL header is short; only its first few hundred characters are searched.
+    if encoded[start:start + 5].lower() == "data:":
+        separator = encoded.find(";", start + 5, min(end, start + _DATA_URL_MAX_HEADER))
+        if separator > start + 5 and encoded[separator:separator + 8].lower() == ";base64,":
+            start = separator + 8
+    return start, end
+
+
+def fit_within(size: Tuple[int, int], max_dimension: Optional[int]) -> Tuple[int, int]:
+    """Return ``size`` scaled down so its longest side is at most ``max_dimension``."""
+
+    width, height = size
+    longest_side = max(width, height)
+    if not max_dimension or longest_side <= max_dimension:
+        return size
+    scale = max_dimension / float(longest_side)
+    return (
+        max(1, int(round(width * scale))),
+        max(1, int(round(height * scale))),
+    )
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a buffer, without copying it.
+
+    ``BytesIO`` copies anything that is not ``bytes``, which would double the
+    memory held for a decoded upload.
+    """
+
+    def __init__(self, buffer: Buffer) -> None:
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), len(self._view) - self._position)
+        if count <= 0:
+            return 0
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _open(fp) -> Image.Image:
+    # Image.open only parses headers; Pillow's own bomb check fires here on
+    # dimensions far above its global limit.
+    try:
+        return Image.open(fp)
+    except Image.DecompressionBombError as exc:
+        raise ImageRejectedError(str(exc), too_large=True) from exc
+
+
+def _count_frames(image: Image.Image, limit: Optional[int]) -> int:
+    if image.format != "GIF" or limit is None:
+        return getattr(image, "n_frames", 1)
+    # Image.seek() would decode every frame before the one sought, so the
+    # image descriptors are counted straight from the file instead.
+    fp = image.fp
+    position = fp.tell()
+    try:
+        fp.seek(0)
+        return _count_gif_frames(fp, limit)
+    finally:
+        fp.seek(position)
+
+
+def _count_gif_frames(fp, limit: int) -> int:
+    """Count image descriptors up to ``limit + 1``, skipping over the LZW data."""
+
+    header = fp.read(13)  # signature and logical screen descriptor
+    if len(header) < 13:
+        return 1
+    if header[10] & 0x80:
+        fp.seek(3 << ((header[10] & 7) + 1), io.SEEK_CUR)  # global colour table
+    count = 0
+    while count <= limit:
+        introducer = fp.read(1)
+        if introducer == b",":
+            descriptor = fp.read(9)
+            if len(descriptor) < 9:
+                break
+            count += 1
+            if descriptor[8] & 0x80:
+                fp.seek(3 << ((descriptor[8] & 7) + 1), io.SEEK_CUR)  # local colour table
+            fp.read(1)  # LZW minimum code size
+            _skip_sub_blocks(fp)
+        elif introducer == b"!":
+            fp.read(1)  # extension label
+            _skip_sub_blocks(fp)
+        else:
+            break  # trailer, end of data or a corrupt block
+    return max(1, count)
+
+
+def _skip_sub_blocks(fp) -> None:
+    while True:
+        size = fp.read(1)
+        if not size or size[0] == 0:
+            return
+        fp.seek(size[0], io.SEEK_CUR)
+
+
+def _draft(image: Image.Image, max_dimension: Optional[int]) -> None:
+    """Let JPEG decode at 1/2, 1/4 or 1/8 scale when the output is that much smaller.
+
+    Only the header has been read at this point, so skipping the full
+    resolution decode saves both time and memory. Other formats ignore
+    drafts and are shrunk by ``reduce()`` in ``_prepare_image`` instead.
+    """
+
+    requested = _draft_request(image, max_dimension)
+    if requested is not None:
+        image.draft(None, requested)
+
+
+def _draft_request(image: Image.Image, max_dimension: Optional[int]) -> Optional[Tuple[int, int]]:
+    if not max_dimension or image.format != "JPEG":
+        return None
+    width, height = fit_within(image.size, max_dimension)
+    requested = (
+        int(math.ceil(width * DRAFT_REDUCING_GAP)),
+        int(math.ceil(height * DRAFT_REDUCING_GAP)),
+    )
+    if requested[0] >= image.width or requested[1] >= image.height:
+        return None
+    return requested
+
+
+def _draft_scale(image: Image.Image, max_dimension: Optional[int]) -> int:
+    # Mirrors the scale JpegImageFile.draft picks for the same request.
+    requested = _draft_request(image, max_dimension)
+    if requested is None:
+        return 1
+    scale = min(image.width // requested[0], image.height // requested[1])
+    for candidate in (8, 4, 2):
+        if scale >= candidate:
+            return candidate
+    return 1
@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _temp_image_dir(tmp_path, monkeypatch) -> None:
+    # Apps built by tests write url results here instead of the project's temp/.
+    monkeypatch.setenv("TEMP_IMAGE_DIR", str(tmp_path / "temp"))
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Benchmark the transformation engine on synthetic images, offline.
+
+Every case decodes a generated JPEG or PNG source the way an upload is
+decoded, runs ``transform()`` and records wall time per stage, the peak RSS
+growth and the output size. Each case runs in a fresh Python process, so its
+peak memory is not hidden by memory an earlier case left to the allocator.
+Results are written as JSON and can be compared against a stored baseline,
+failing when a case got slower or hungrier than the allowed tolerance.
+
+No baseline is committed, since timings only compare on the same machine.
+Record one first, e.g. on the main branch, then compare a change against it:
+
+    python scripts/benchmark.py --preset quick --save-baseline
+    python scripts/benchmark.py --preset quick --compare
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import PIL  # noqa: E402
+from PIL import Image, ImageFilter  # noqa: E402
+
+from app.services import metrics  # noqa: E402
+from app.services.frame_executor import create_frame_executor  # noqa: E402
+from app.services.memory import current_rss  # noqa: E402
+from app.services.transformation_service import TransformationRequest, transform  # noqa: E402
+from app.utils.image_io import fit_within, load_image_from_bytes  # noqa: E402
+
+DEFAULT_TARGET = ROOT / "assets" / "pfp_transparent.png"
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+DEFAULT_OUTPUT_DIR = ROOT / "benchmarks" / "results"
+
+PRESETS = {
+    "quick": {
+        "sizes": [256, 1024],
+        "frames": [2, 12],
+        "inputs": ["jpeg", "png"],
+        "outputs": ["png", "gif"],
+    },
+    "full": {
+        "sizes": [256, 1024, 2048, 4096],
+        "frames": [2, 12, 48, 120],
+        "inputs": ["jpeg", "png"],
+        "outputs": ["png", "gif"],
+    },
+}
+STAGES = ("decode", "prepare", "blend", "quantize", "encode")
+
+
+@dataclass
+class Case:
+    size: int
+    input_format: str
+    output: str
+    frames: int = 1
+
+    @property
+    def name(self) -> str:
+        suffix = f"-{self.frames}f" if self.output == "gif" else ""
+        return f"{self.output}{suffix}-{self.size}px-{self.input_format}"
+
+
+def synthetic_photo(size: int, seed: int = 0) -> Image.Image:
+    """Deterministic image with smooth gradients, edges and fine texture, like a photo."""
+
+    rng = random.Random(seed)
+    red = Image.radial_gradient("L").resize((size, size), Image.Resampling.BICUBIC)
+    green = Image.linear_gradient("L").rotate(35).resize((size, size), Image.Resampling.BICUBIC)
+    blue = Image.effect_mandelbrot((size, size), (-2.1, -1.3, 0.7, 1.3), 60)
+    base = Image.merge("RGB", (red, green, blue))
+    base = base.filter(ImageFilter.GaussianBlur(radius=max(1, size // 256)))
+    grain = Image.frombytes("L", (size, size), rng.randbytes(size * size))
+    grain = grain.filter(ImageFilter.GaussianBlur(radius=0.8)).convert("RGB")
+    return Image.blend(base, grain, 0.18)
+
+
+def encode_source(image: Image.Image, input_format: str) -> bytes:
+    buffer = BytesIO()
+    if input_format == "jpeg":
+        image.save(buffer, format="JPEG", quality=88)
+    else:
+        image.save(buffer, format="PNG", compress_level=6)
+    return buffer.getvalue()
+
+
+def build_cases(
+    sizes: Sequence[int], frames: Sequence[int], inputs: Sequence[str], outputs: Sequence[str]
+) -> List[Case]:
+    cases = []
+    for size in sizes:
+        for input_format in inputs:
+            if "png" in outputs:
+                cases.append(Case(size, input_format, "png"))
+            if "gif" in outputs:
+                cases.extend(Case(size, input_format, "gif", count) for count in frames)
+    return cases
+
+
+def run_case(
+    case: Case, source_bytes: bytes, target: Image.Image, args: argparse.Namespace, executor: Any
+) -> Dict[str, Any]:
+    runs = []
+    # Cases run in a fresh process (see run_isolated), so the high-water mark
+    # of the RSS above its level here is the case's own peak.
+    rss_before = current_rss() or 0
+    for _ in range(args.repeat):
+        stages: Dict[str, float] = {}
+        started = time.perf_counter()
+        source = load_image_from_bytes(source_bytes, case.size)
+        stages["decode"] = time.perf_counter() - started
+
+        payload = TransformationRequest(
+            source=source,
+            target=target,
+            blend_ratio=0.65,
+            make_gif=case.output == "gif",
+            gif_frame_count=case.frames if case.output == "gif" else 2,
+            gif_duration=80,
+            max_dimension=case.size,
+            engine=args.engine,
+            gif_encoding=args.gif_encoding,
+        )
+        labels = {
+            "format": case.output,
+            "size": metrics.size_bucket(fit_within(source.size, case.size)),
+        }
+        before = {stage: metrics.STAGE_SECONDS.sum(stage=stage, **labels) for stage in STAGES[1:]}
+        result = transform(payload, executor=executor)
+        elapsed = time.perf_counter() - started
+        for stage in STAGES[1:]:
+            stages[stage] = metrics.STAGE_SECONDS.sum(stage=stage, **labels) - before[stage]
+        runs.append(
+            {
+                "seconds": elapsed,
+                "stages": stages,
+                "output_bytes": len(result.data),
+            }
+        )
+
+    return {
+        "case": case.name,
+        **asdict(case),
+        "seconds": statistics.median(run["seconds"] for run in runs),
+        "min_seconds": min(run["seconds"] for run in runs),
+        "stages": {
+            stage: statistics.median(run["stages"].get(stage, 0.0) for run in runs) for stage in STAGES
+        },
+        "peak_memory_bytes": max(0, max_rss() - rss_before),
+        "output_bytes": runs[-1]["output_bytes"],
+        "runs": len(runs),
+    }
+
+
+def run_isolated(case: Case, source_path: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run ``case`` in a fresh Python process and return its result."""
+
+    spec = {
+        "case": asdict(case),
+        "source": str(source_path),
+        "engine": args.engine,
+        "executor": args.executor,
+        "gif_encoding": args.gif_encoding,
+        "repeat": args.repeat,
+    }
+    completed = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--run-case", json.dumps(spec)],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case.name} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout)
+
+
+def _run_case_main(spec: Dict[str, Any]) -> int:
+    target = Image.open(DEFAULT_TARGET)
+    target.load()
+    args = argparse.Namespace(
+        engine=spec["engine"],
+        executor=spec["executor"],
+        gif_encoding=spec["gif_encoding"],
+        repeat=spec["repeat"],
+    )
+    source_bytes = Path(spec["source"]).read_bytes()
+    entry = run_case(Case(**spec["case"]), source_bytes, target, args, create_frame_executor(args.executor))
+    print(json.dumps(entry))
+    return 0
+
+
+def max_rss() -> int:
+    """High-water mark of this process's RSS in bytes."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    tolerance: float,
+    memory_tolerance: float,
+) -> List[str]:
+    """Return one message per case that regressed against ``baseline``."""
+
+    previous = {entry["case"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        old = previous.get(entry["case"])
+        if old is None:
+            continue
+        # The fastest run is the least disturbed by other load; sub-10ms
+        # differences on the smallest cases are ignored as noise.
+        slower = entry["min_seconds"] - old["min_seconds"]
+        if slower > 0.01 and entry["min_seconds"] > old["min_seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{entry['case']}: {old['min_seconds']:.3f}s -> {entry['min_seconds']:.3f}s "
+                f"(+{slower / old['min_seconds']:.0%})"
+            )
+        grown = entry["peak_memory_bytes"] - old["peak_memory_bytes"]
+        limit = old["peak_memory_bytes"] * (1 + memory_tolerance)
+        if grown > 8 * 1024 * 1024 and entry["peak_memory_bytes"] > limit:
+            regressions.append(
+                f"{entry['case']}: peak memory {old['peak_memory_bytes'] / 2**20:.0f} MB -> "
+                f"{entry['peak_memory_bytes'] / 2**20:.0f} MB"
+            )
+    return regressions
+
+
+def environment(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        import numpy
+
+        numpy_version: Optional[str] = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": numpy_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "engine": args.engine,
+        "executor": args.executor,
+        "gif_encoding": args.gif_encoding,
+        "repeat": args.repeat,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--sizes", type=_int_list, help="Override the preset, e.g. 256,1024.")
+    parser.add_argument("--frames", type=_int_list, help="GIF frame counts, e.g. 2,12,120.")
+    parser.add_argument("--inputs", type=_str_list, help="Source formats: jpeg,png.")
+    parser.add_argument("--outputs", type=_str_list, help="Output formats: png,gif.")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per case; the median is reported, the fastest compared."
+    )
+    parser.add_argument("--engine", choices=["pillow", "numpy"], default="pillow")
+    parser.add_argument("--executor", choices=["serial", "thread", "process"], default="serial")
+    parser.add_argument("--gif-encoding", choices=["full", "delta"], default="full")
+    parser.add_argument(
+        "--output", type=Path, help="Results file (default: benchmarks/results/<timestamp>.json)."
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--compare", action="store_true", help="Fail if a case regressed against --baseline.")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store the results as --baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown, as a fraction.")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed peak memory growth.")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.run_case:
+        return _run_case_main(json.loads(args.run_case))
+
+    preset = PRESETS[args.preset]
+    cases = build_cases(
+        args.sizes or preset["sizes"],
+        args.frames or preset["frames"],
+        args.inputs or preset["inputs"],
+        args.outputs or preset["outputs"],
+    )
+    if args.compare and not args.save_baseline and not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}. Baselines are not committed, since timings only "
+            "compare on one machine: run with --save-baseline first, e.g. on the main branch."
+        )
+        return 2
+
+    results = []
+    sources: Dict[tuple, Path] = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as scratch:
+        for case in cases:
+            key = (case.size, case.input_format)
+            if key not in sources:
+                sources[key] = Path(scratch) / f"source-{case.size}.{case.input_format}"
+                sources[key].write_bytes(encode_source(synthetic_photo(case.size), case.input_format))
+            entry = run_isolated(case, sources[key], args)
+            results.append(entry)
+            print(
+                f"{entry['case']:<28} {entry['seconds']:8.3f}s  "
+                + "  ".join(f"{stage} {entry['stages'][stage]:.3f}" for stage in STAGES)
+                + f"  peak {entry['peak_memory_bytes'] / 2**20:6.1f} MB"
+            )
+
+    report = {"environment": environment(args), "results": results}
+    output = args.output or DEFAULT_OUTPUT_DIR / f"{time.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def _str_list(value: str) -> List[str]:
+    return [part.strip().lower() for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Precompute memory-mapped target pyramids for the default and any custom targets.
+
+Each target is registered under the SHA-256 of its file, printed as its
+``target_id``. Requests pass that id to use a custom target without uploading it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.services.target_pyramid import DEFAULT_LEVEL_WIDTHS, build_pyramid  # noqa: E402
+
+DEFAULT_TARGET = ROOT / "assets" / "pfp_transparent.png"
+DEFAULT_OUTPUT = Path(os.environ.get("TARGET_PYRAMID_DIR", ROOT / "assets" / "pyramid"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        type=Path,
+        help="Custom target images to register (the default target is always built).",
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument(
+        "--widths",
+        type=lambda value: [int(part) for part in value.split(",")],
+        default=list(DEFAULT_LEVEL_WIDTHS),
+        help="Comma-separated level widths.",
+    )
+    args = parser.parse_args()
+
+    for target in [DEFAULT_TARGET, *args.targets]:
+        directory = build_pyramid(str(target), str(args.output), args.widths)
+        print(f"{target} -> {directory} (target_id {directory.name})")
+
+
+if __name__ == "__main__":
+    main()
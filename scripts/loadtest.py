@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""Load-test ``/api/transform`` through a real multi-worker WSGI server.
+
+The app from ``wsgi.py`` is started under gunicorn when it is installed, and
+otherwise under Werkzeug's forking server. A mix of JSON, binary, url and
+multipart requests is then sent at a fixed rate, open loop: requests go out on
+schedule whether or not earlier ones have finished, and latency is measured
+from the scheduled send time, so a backlog on the client counts against the
+server too. The report gives latency percentiles, throughput, the error
+rate per status and the peak RSS of the server's worker processes.
+
+    python scripts/loadtest.py --rate 2 --duration 30
+    python scripts/loadtest.py --mix json=3,binary=1,url=1 --workers 4 --gif-ratio 0.25
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --server-pid 1234
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT_DIR = ROOT / "benchmarks" / "results"
+RESPONSE_FORMATS = ("json", "binary", "url", "multipart")
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class Sample:
+    index: int
+    response_format: str
+    body: str
+    make_gif: bool
+    status: int
+    latency: float
+    response_bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+@dataclass
+class PlannedRequest:
+    index: int
+    response_format: str
+    body: str
+    make_gif: bool
+    content_type: str
+    data: bytes
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse ``json=3,binary=1`` into weights; a bare name counts as weight 1."""
+
+    weights: Dict[str, float] = {}
+    for part in value.split(","):
+        name, _, weight = part.strip().partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in RESPONSE_FORMATS:
+            raise argparse.ArgumentTypeError(f"Unknown response format {name!r}; use {', '.join(RESPONSE_FORMATS)}.")
+        weights[name] = float(weight) if weight else 1.0
+    if not weights or sum(weights.values()) <= 0:
+        raise argparse.ArgumentTypeError("The mix needs at least one format with a positive weight.")
+    return weights
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``, or ``None`` when there are none."""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def source_image(size: int, seed: int) -> bytes:
+    """A distinct PNG per seed, so requests do not collapse into result cache hits."""
+
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        box = (x0, y0, x0 + rng.randrange(8, size // 2 + 9), y0 + rng.randrange(8, size // 2 + 9))
+        draw.ellipse(box, fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def plan_requests(
+    count: int,
+    mix: Dict[str, float],
+    *,
+    size: int,
+    max_dimension: int,
+    gif_ratio: float,
+    gif_frames: int,
+    body: str,
+    source_pool: int,
+    seed: int,
+) -> List[PlannedRequest]:
+    """Build every request body up front, so encoding them does not skew the timing."""
+
+    rng = random.Random(seed)
+    formats = list(mix)
+    weights = [mix[name] for name in formats]
+    pool = source_pool if source_pool > 0 else count
+    sources: Dict[int, bytes] = {}
+    planned = []
+    for index in range(count):
+        key = index % pool
+        if key not in sources:
+            sources[key] = source_image(size, seed + key)
+        response_format = rng.choices(formats, weights)[0]
+        make_gif = rng.random() < gif_ratio
+        kind = body if body != "mixed" else ("json", "form")[index % 2]
+        fields = {
+            "response_format": response_format,
+            "max_dimension": str(max_dimension),
+            "make_gif": "true" if make_gif else "false",
+            "gif_frame_count": str(gif_frames),
+        }
+        if kind == "json":
+            document = {**fields, "source_image": base64.b64encode(sources[key]).decode("ascii")}
+            content_type, data = "application/json", json.dumps(document).encode("utf-8")
+        else:
+            content_type, data = _multipart_form(fields, "source_image", sources[key])
+        planned.append(PlannedRequest(index, response_format, kind, make_gif, content_type, data))
+    return planned
+
+
+def run_load(
+    base_url: str,
+    planned: Sequence[PlannedRequest],
+    rate: float,
+    concurrency: int,
+    timeout: float,
+) -> Tuple[List[Sample], float]:
+    """Send ``planned`` at ``rate`` per second; return the samples and the wall time."""
+
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def send(item: PlannedRequest, scheduled: float) -> None:
+        sample = _send(base_url, item, timeout)
+        sample.latency = time.perf_counter() - scheduled
+        with lock:
+            samples.append(sample)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+        for item in planned:
+            scheduled = started + item.index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, item, scheduled)
+    elapsed = time.perf_counter() - started
+    samples.sort(key=lambda sample: sample.index)
+    return samples, elapsed
+
+
+def summarize(samples: Sequence[Sample], elapsed: float) -> Dict[str, Any]:
+    succeeded = [sample for sample in samples if sample.ok]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        key = sample.error or str(sample.status)
+        statuses[key] = statuses.get(key, 0) + 1
+
+    def latencies(selected: Iterable[Sample]) -> Dict[str, Optional[float]]:
+        values = [sample.latency for sample in selected]
+        return {f"p{pct}": percentile(values, pct) for pct in PERCENTILES}
+
+    by_format = {}
+    for name in RESPONSE_FORMATS:
+        selected = [sample for sample in succeeded if sample.response_format == name]
+        if any(sample.response_format == name for sample in samples):
+            by_format[name] = {
+                "requests": sum(1 for sample in samples if sample.response_format == name),
+                "succeeded": len(selected),
+                **latencies(selected),
+            }
+    return {
+        "requests": len(samples),
+        "succeeded": len(succeeded),
+        "error_rate": (len(samples) - len(succeeded)) / len(samples) if samples else 0.0,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        "latency_seconds": latencies(succeeded),
+        "statuses": dict(sorted(statuses.items())),
+        "by_format": by_format,
+    }
+
+
+class RssMonitor:
+    """Peak RSS of a server process and each of its descendants, read from ``/proc``."""
+
+    def __init__(self, pid: int, interval: float = 0.25) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.peaks: Dict[int, int] = {}
+        self.peak_total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+
+    def start(self) -> "RssMonitor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        workers = {pid: peak for pid, peak in self.peaks.items() if pid != self.pid}
+        return {
+            "server_pid": self.pid,
+            "master_peak_bytes": self.peaks.get(self.pid),
+            "worker_peak_bytes": dict(sorted(workers.items())),
+            "max_worker_peak_bytes": max(workers.values(), default=None),
+            "total_peak_bytes": self.peak_total or None,
+        }
+
+    def sample(self) -> None:
+        total = 0
+        for pid in [self.pid, *_descendants(self.pid)]:
+            rss = _process_rss(pid)
+            if rss is None:
+                continue
+            total += rss
+            self.peaks[pid] = max(self.peaks.get(pid, 0), rss)
+        self.peak_total = max(self.peak_total, total)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+        self.sample()
+
+
+def start_server(workers: int, threads: int, server: str, port: int) -> subprocess.Popen:
+    """Start ``wsgi:app`` on ``port`` under gunicorn, or Werkzeug's forking server."""
+
+    if server == "auto":
+        server = "gunicorn" if _has_module("gunicorn") else "werkzeug"
+    if server == "gunicorn":
+        command = [
+            sys.executable, "-m", "gunicorn",
+            "--workers", str(workers),
+            "--threads", str(threads),
+            "--bind", f"127.0.0.1:{port}",
+            "--timeout", "600",
+            "wsgi:app",
+        ]
+    else:
+        # Werkzeug forks one process per request, at most ``workers`` at a time.
+        code = (
+            "from werkzeug.serving import run_simple\n"
+            "from wsgi import app\n"
+            f"run_simple('127.0.0.1', {port}, app, threaded=False, processes={workers})\n"
+        )
+        command = [sys.executable, "-c", code]
+    return subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def wait_until_healthy(base_url: str, process: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            stderr = process.stderr.read().decode("utf-8", errors="replace") if process.stderr else ""
+            raise RuntimeError(f"The server exited with status {process.returncode}:\n{stderr}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (OSError, urllib.error.URLError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not become healthy within {timeout:.0f}s.")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rate", type=float, default=1.0, help="Requests sent per second.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to send requests for.")
+    parser.add_argument("--requests", type=int, help="Send exactly this many requests instead of --duration.")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=parse_mix("json=4,binary=2,url=1,multipart=1"),
+        help="Weighted response formats, e.g. json=4,binary=2,url=1,multipart=1.",
+    )
+    parser.add_argument(
+        "--body", choices=["json", "form", "mixed"], default="mixed",
+        help="Send base64 JSON bodies, multipart uploads, or alternate between them.",
+    )
+    parser.add_argument("--size", type=int, default=512, help="Side of the generated source images.")
+    parser.add_argument("--max-dimension", type=int, default=512)
+    parser.add_argument("--gif-ratio", type=float, default=0.0, help="Fraction of requests asking for a GIF.")
+    parser.add_argument("--gif-frames", type=int, default=12)
+    parser.add_argument(
+        "--source-pool", type=int, default=0,
+        help="Distinct source images to cycle through; 0 makes every request unique (no cache hits).",
+    )
+    parser.add_argument("--concurrency", type=int, default=64, help="Most requests in flight at once.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Load an already running server instead of starting one.")
+    parser.add_argument("--server-pid", type=int, help="With --url: process to report worker RSS for.")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "werkzeug"], default="auto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="Threads per gunicorn worker.")
+    parser.add_argument("--port", type=int, default=0, help="Port for the started server; 0 picks a free one.")
+    parser.add_argument("--output", type=Path, help="Report file (default: benchmarks/results/load-<timestamp>.json).")
+    args = parser.parse_args(argv)
+
+    count = args.requests if args.requests is not None else max(1, int(args.rate * args.duration))
+    planned = plan_requests(
+        count,
+        args.mix,
+        size=args.size,
+        max_dimension=args.max_dimension,
+        gif_ratio=args.gif_ratio,
+        gif_frames=args.gif_frames,
+        body=args.body,
+        source_pool=args.source_pool,
+        seed=args.seed,
+    )
+
+    process = None
+    base_url = (args.url or "").rstrip("/")
+    server_pid = args.server_pid
+    if not base_url:
+        port = args.port or _free_port()
+        process = start_server(args.workers, args.threads, args.server, port)
+        base_url, server_pid = f"http://127.0.0.1:{port}", process.pid
+    try:
+        wait_until_healthy(base_url, process)
+        monitor = RssMonitor(server_pid).start() if server_pid else None
+        print(f"Sending {count} requests to {base_url} at {args.rate:g}/s ...")
+        samples, elapsed = run_load(base_url, planned, args.rate, args.concurrency, args.timeout)
+        memory = monitor.stop() if monitor else None
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    summary = summarize(samples, elapsed)
+    report = {
+        "settings": {
+            key: value for key, value in vars(args).items() if key != "output"
+        } | {"url": base_url, "requests": count},
+        "summary": summary,
+        "memory": memory,
+        "samples": [asdict(sample) for sample in samples],
+    }
+    print(render_summary(summary, memory))
+    output = args.output or DEFAULT_OUTPUT_DIR / f"load-{time.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    print(f"Report written to {output}")
+    return 0
+
+
+def render_summary(summary: Dict[str, Any], memory: Optional[Dict[str, Any]]) -> str:
+    def seconds(value: Optional[float]) -> str:
+        return f"{value:.3f}s" if value is not None else "-"
+
+    latency = summary["latency_seconds"]
+    lines = [
+        f"requests   {summary['requests']}  succeeded {summary['succeeded']}  "
+        f"error rate {summary['error_rate']:.1%}",
+        f"throughput {summary['throughput_rps']:.2f} req/s over {summary['elapsed_seconds']:.1f}s",
+        "latency    " + "  ".join(f"{name} {seconds(value)}" for name, value in latency.items()),
+        "statuses   " + "  ".join(f"{name}: {count}" for name, count in summary["statuses"].items()),
+    ]
+    for name, entry in summary["by_format"].items():
+        lines.append(
+            f"  {name:<10} {entry['succeeded']}/{entry['requests']}  "
+            + "  ".join(f"p{pct} {seconds(entry[f'p{pct}'])}" for pct in PERCENTILES)
+        )
+    if memory and memory["total_peak_bytes"]:
+        worker_peak = memory["max_worker_peak_bytes"]
+        lines.append(
+            f"RSS peak   worker {_megabytes(worker_peak)}  server total {_megabytes(memory['total_peak_bytes'])}"
+        )
+    return "\n".join(lines)
+
+
+def _megabytes(value: Optional[int]) -> str:
+    return f"{value / 2**20:.0f} MB" if value else "-"
+
+
+def _send(base_url: str, item: PlannedRequest, timeout: float) -> Sample:
+    request = urllib.request.Request(
+        f"{base_url}/api/transform",
+        data=item.data,
+        method="POST",
+        headers={"Content-Type": item.content_type},
+    )
+    sample = Sample(item.index, item.response_format, item.body, item.make_gif, status=0, latency=0.0)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            sample.status = response.status
+            sample.response_bytes = len(response.read())
+    except urllib.error.HTTPError as exc:
+        sample.status = exc.code
+        sample.response_bytes = len(exc.read())
+    except (OSError, urllib.error.URLError) as exc:
+        sample.error = type(exc).__name__
+    return sample
+
+
+def _multipart_form(fields: Dict[str, str], file_field: str, content: bytes) -> Tuple[str, bytes]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    parts.append(
+        (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="source.png"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        ).encode("utf-8")
+        + content
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+def _descendants(pid: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # The command name is parenthesised and may contain spaces; ppid follows it.
+            stat = (entry / "stat").read_text()
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+    found, pending = [], list(children.get(pid, []))
+    while pending:
+        child = pending.pop()
+        found.append(child)
+        pending.extend(children.get(child, []))
+    return found
+
+
+def _process_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def _has_module(name: str) -> bool:
+    import importlib.util
+
+    return importlib.util.find_spec(name) is not None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
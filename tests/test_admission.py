@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+from PIL import Image
+
+from app.services.admission import AdmissionController, AdmissionRejected, estimate_cost
+from app.services.transformation_service import TransformationRequest
+
+
+def _request(size, max_dimension: int, make_gif: bool = False, gif_frame_count: int = 2) -> TransformationRequest:
+    image = Image.new("RGB", size, "#123456")
+    return TransformationRequest(
+        source=image,
+        target=image,
+        blend_ratio=0.5,
+        make_gif=make_gif,
+        gif_frame_count=gif_frame_count,
+        gif_duration=80,
+        max_dimension=max_dimension,
+    )
+
+
+def test_cost_scales_with_output_pixels_frames_and_format() -> None:
+    still = estimate_cost(_request((2048, 1024), max_dimension=1024))
+    assert still == pytest.approx(1024 * 512 / 1_000_000)
+
+    gif = estimate_cost(_request((2048, 1024), max_dimension=1024, make_gif=True, gif_frame_count=10))
+    assert gif == pytest.approx(still * 10 * 1.5)
+
+
+def test_requests_over_budget_wait_and_are_rejected_after_the_limit() -> None:
+    controller = AdmissionController(budget=10, max_wait=0.05, retry_after=7)
+    first = controller.acquire(8)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire(5)
+    assert excinfo.value.retry_after == 7
+
+    # A cheap request still fits next to the running one.
+    small = controller.acquire(2)
+    small.release()
+
+    waiter = threading.Thread(target=lambda: controller.acquire(5, timeout=5).release())
+    waiter.start()
+    while controller.stats()["queue_depth"] == 0:
+        threading.Event().wait(0.01)
+    first.release()
+    first.release()  # releasing twice is harmless
+    waiter.join(5)
+
+    stats = controller.stats()
+    assert (stats["admitted"], stats["rejected"], stats["queue_depth"]) == (3, 1, 0)
+    assert stats["in_flight_cost"] == 0
+
+
+def test_oversized_request_runs_alone() -> None:
+    controller = AdmissionController(budget=1, max_wait=0)
+    ticket = controller.acquire(50)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(0.5)
+    ticket.release()
+    controller.acquire(0.5).release()
+
+
+def test_oversized_request_at_the_head_of_the_queue_drains_the_budget() -> None:
+    controller = AdmissionController(budget=10, max_wait=5)
+    small = controller.acquire(4)
+    oversized = []
+    thread = threading.Thread(target=lambda: oversized.append(controller.acquire(50)))
+    thread.start()
+    while controller.stats()["queue_depth"] == 0:
+        threading.Event().wait(0.005)
+
+    # Room is left for it, but nothing queued after the oversized request is admitted.
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(1, timeout=0.05)
+    small.release()
+    thread.join(5)
+    assert controller.stats()["running"] == 1
+    oversized[0].release()
+    controller.acquire(1).release()
+
+
+def test_waiting_requests_are_dispatched_fairly_between_clients() -> None:
+    controller = AdmissionController(budget=1, max_wait=5)
+    running = controller.acquire(1, client="heavy")
+    granted = []
+    lock = threading.Lock()
+
+    def request(client: str) -> None:
+        ticket = controller.acquire(1, client=client)
+        with lock:
+            granted.append((client, ticket))
+
+    threads = []
+    for client in ["heavy", "heavy", "heavy", "light"]:
+        thread = threading.Thread(target=request, args=(client,))
+        thread.start()
+        threads.append(thread)
+        while controller.stats()["queue_depth"] < len(threads):
+            threading.Event().wait(0.005)
+
+    clients = controller.clients()
+    assert (clients["heavy"]["queued"], clients["heavy"]["active"]) == (3, 1)
+    assert clients["light"]["queued"] == 1
+
+    running.release()
+    for count in range(1, 5):
+        while len(granted) < count:
+            threading.Event().wait(0.005)
+        granted[-1][1].release()
+    for thread in threads:
+        thread.join(5)
+
+    # The heavy client already has a request running, so the light client's
+    # request goes ahead of the whole heavy backlog.
+    assert [client for client, _ in granted] == ["light", "heavy", "heavy", "heavy"]
+    assert controller.clients() == {}
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+_SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "benchmark.py"
+_spec = importlib.util.spec_from_file_location("benchmark_script", _SCRIPT)
+benchmark = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = benchmark
+_spec.loader.exec_module(benchmark)
+
+
+def test_synthetic_sources_are_deterministic() -> None:
+    first = benchmark.encode_source(benchmark.synthetic_photo(64), "png")
+    assert first == benchmark.encode_source(benchmark.synthetic_photo(64), "png")
+    cases = benchmark.build_cases([256], [2, 12], ["jpeg"], ["png", "gif"])
+    assert [case.name for case in cases] == ["png-256px-jpeg", "gif-2f-256px-jpeg", "gif-12f-256px-jpeg"]
+
+
+def test_compare_flags_slowdowns_and_memory_growth_beyond_tolerance() -> None:
+    def entry(case, seconds, peak):
+        return {"case": case, "min_seconds": seconds, "peak_memory_bytes": peak}
+
+    baseline = {"results": [entry("a", 1.0, 100 << 20), entry("b", 1.0, 100 << 20), entry("c", 0.001, 0)]}
+    results = [entry("a", 1.1, 110 << 20), entry("b", 1.5, 200 << 20), entry("c", 0.005, 0), entry("new", 9, 0)]
+
+    regressions = benchmark.compare(results, baseline, tolerance=0.15, memory_tolerance=0.25)
+    assert len(regressions) == 2
+    assert all(message.startswith("b:") for message in regressions)
+
+
+def test_benchmark_writes_results_and_compares_to_baseline(tmp_path) -> None:
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    args = ["--sizes", "256", "--outputs", "png", "--inputs", "png", "--repeat", "1"]
+
+    assert benchmark.main([*args, "--output", str(output), "--baseline", str(baseline), "--save-baseline"]) == 0
+    report = json.loads(output.read_text())
+    (result,) = report["results"]
+    assert result["case"] == "png-256px-png"
+    assert set(result["stages"]) == {"decode", "prepare", "blend", "quantize", "encode"}
+    assert result["stages"]["encode"] > 0
+    # Measured in a fresh process, so the case's own allocations show up.
+    assert result["peak_memory_bytes"] > 0
+    assert report["environment"]["pillow"]
+    missing = tmp_path / "missing.json"
+    assert benchmark.main([*args, "--output", str(output), "--baseline", str(missing), "--compare"]) == 2
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+from PIL import Image, ImageChops
+
+from app.services.frame_executor import (
+    ProcessFrameExecutor,
+    ThreadFrameExecutor,
+    create_frame_executor,
+)
+from app.services.transformation_service import _build_render_context
+
+
+def _context():
+    source = Image.linear_gradient("L").resize((32, 32)).convert("RGBA")
+    target = Image.new("RGBA", (32, 32), "#ffcc00")
+    return _build_render_context(source, target)
+
+
+@pytest.mark.parametrize("executor_type", [ThreadFrameExecutor, ProcessFrameExecutor])
+def test_executors_match_serial_rendering(executor_type) -> None:
+    context = _context()
+    mixes = [0.0, 0.2, 0.5, 0.8]
+    executor = executor_type(max_workers=2, min_frames=1)
+    try:
+        frames = executor.render(context, mixes)
+    finally:
+        executor.shutdown()
+
+    assert len(frames) == len(mixes)
+    for frame, mix in zip(frames, mixes):
+        assert ImageChops.difference(frame, context.render(mix)).getbbox() is None
+
+
+def test_create_frame_executor() -> None:
+    assert create_frame_executor("serial") is None
+    executor = create_frame_executor("thread", max_workers=3, min_frames=5)
+    assert isinstance(executor, ThreadFrameExecutor)
+    assert executor.max_workers == 3
+    assert not executor.should_parallelise(4)
+    with pytest.raises(ValueError):
+        create_frame_executor("gpu")
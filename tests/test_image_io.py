@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.utils.image_io import (
+    ImageBudget,
+    ImageDecodingError,
+    ImageRejectedError,
+    check_budget,
+    decode_base64_bytes,
+    fit_within,
+    inspect_image,
+    load_image_from_bytes,
+    probe_image,
+)
+
+
+def _jpeg(size) -> bytes:
+    buffer = BytesIO()
+    Image.linear_gradient("L").resize(size).convert("RGB").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale() -> None:
+    data = _jpeg((2400, 1600))
+
+    full = load_image_from_bytes(data)
+    drafted = load_image_from_bytes(data, max_dimension=300)
+
+    assert full.size == (2400, 1600)
+    # DCT scaling stops at 1/4, keeping at least twice the output resolution.
+    assert drafted.size == (600, 400)
+    assert load_image_from_bytes(data, max_dimension=2000).size == (2400, 1600)
+
+
+def test_fit_within_preserves_aspect_ratio() -> None:
+    assert fit_within((4000, 1000), 1024) == (1024, 256)
+    assert fit_within((800, 600), 1024) == (800, 600)
+    assert fit_within((800, 600), None) == (800, 600)
+
+
+def test_probe_reads_header_and_budget_rejects_before_decoding() -> None:
+    image = Image.new("RGB", (2400, 1600))
+    exif = image.getexif()
+    exif[0x0112] = 6
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+
+    opened = Image.open(BytesIO(buffer.getvalue()))
+    probe = probe_image(opened, max_dimension=300)
+    assert (probe.format, probe.width, probe.height) == ("JPEG", 2400, 1600)
+    assert (probe.frame_count, probe.orientation) == (1, 6)
+    assert probe.decode_pixels == 600 * 400
+
+    # The JPEG draft keeps decoding cheap, so only the full-size decode is over budget.
+    budget = ImageBudget(max_decode_pixels=1_000_000)
+    check_budget(probe, budget)
+    with pytest.raises(ImageRejectedError) as excinfo:
+        check_budget(probe_image(opened), budget)
+    assert excinfo.value.too_large
+
+    with pytest.raises(ImageRejectedError) as excinfo:
+        check_budget(probe, ImageBudget(formats=frozenset({"PNG"})))
+    assert not excinfo.value.too_large
+
+
+def _gif(frames: int, size) -> bytes:
+    images = [Image.effect_noise(size, 40 + index).convert("P", palette=Image.ADAPTIVE) for index in range(frames)]
+    buffer = BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], duration=50, loop=0, comment=b"hi")
+    return buffer.getvalue()
+
+
+def test_gif_frames_are_counted_from_descriptors_and_budgeted() -> None:
+    data = _gif(7, (64, 48))
+    assert Image.open(BytesIO(data)).n_frames == 7
+
+    opened = Image.open(BytesIO(data))
+    assert probe_image(opened).frame_count == 7
+    assert probe_image(opened, frame_limit=2).frame_count == 3
+    # Counting reads the file directly: no frame is decoded or sought.
+    assert opened.tell() == 0
+    assert opened.load()[0, 0] == Image.open(BytesIO(data)).load()[0, 0]
+
+    assert inspect_image(Image.open(BytesIO(data)), None, ImageBudget()).frame_count == 7
+    with pytest.raises(ImageRejectedError) as excinfo:
+        inspect_image(Image.open(BytesIO(data)), None, ImageBudget(max_frame_pixels=6 * 64 * 48))
+    assert excinfo.value.too_large
+    with pytest.raises(ImageRejectedError):
+        load_image_from_bytes(data, budget=ImageBudget(max_frames=6))
+
+
+def test_base64_is_decoded_in_chunks_into_one_buffer() -> None:
+    data = bytes(range(256)) * 3000  # spans several decode chunks
+    encoded = base64.b64encode(data).decode("ascii")
+
+    assert decode_base64_bytes(encoded) == data
+    assert decode_base64_bytes(f"  data:image/png;base64,{encoded}\n") == data
+    for invalid in ("abc", "ab!c", "a===", encoded[:-4] + "ab\ncd", "data:image/png,abcd"):
+        with pytest.raises(ImageDecodingError):
+            decode_base64_bytes(invalid)
+
+
+def test_images_are_read_from_the_decoded_buffer() -> None:
+    buffer = BytesIO()
+    Image.new("RGB", (12, 8), "#ff0000").save(buffer, format="PNG")
+    decoded = decode_base64_bytes(base64.b64encode(buffer.getvalue()).decode("ascii"))
+
+    image = load_image_from_bytes(decoded)
+    assert image.size == (12, 8)
+    assert image.getpixel((0, 0)) == (255, 0, 0)
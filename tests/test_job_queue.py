@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import threading
+
+from app.services.job_queue import FAILED, SUCCEEDED, JobQueue
+
+
+def _wait(queue: JobQueue, job_id: str):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job.finished_at is not None:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_jobs_report_results_and_failures() -> None:
+    queue = JobQueue(max_workers=1)
+
+    def succeed(job):
+        job.progress = 0.5
+        return {"answer": 42}
+
+    def fail(job):
+        job.fail("bad input", 422)
+
+    ok = _wait(queue, queue.submit(succeed).id)
+    assert (ok.status, ok.progress, ok.result) == (SUCCEEDED, 1.0, {"answer": 42})
+
+    failed = _wait(queue, queue.submit(fail).id)
+    assert (failed.status, failed.error, failed.error_status) == (FAILED, "bad input", 422)
+    assert "result" not in failed.as_dict()
+    queue.shutdown()
+
+
+def test_finished_jobs_are_pruned_beyond_the_history_limit() -> None:
+    queue = JobQueue(max_workers=1, max_jobs=2)
+    ids = [queue.submit(lambda job: None).id for _ in range(2)]
+    for job_id in ids:
+        _wait(queue, job_id)
+
+    queue.submit(lambda job: None)
+    assert queue.get(ids[0]) is None
+    queue.shutdown()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from werkzeug.serving import make_server
+
+from app import create_app
+
+_SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "loadtest.py"
+_spec = importlib.util.spec_from_file_location("loadtest_script", _SCRIPT)
+loadtest = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = loadtest
+_spec.loader.exec_module(loadtest)
+
+
+def test_parse_mix_and_percentiles() -> None:
+    assert loadtest.parse_mix("json=3, binary,url=0.5") == {"json": 3.0, "binary": 1.0, "url": 0.5}
+    with pytest.raises(argparse.ArgumentTypeError):
+        loadtest.parse_mix("xml=1")
+
+    values = [float(value) for value in range(1, 101)]
+    assert loadtest.percentile(values, 50) == 50.0
+    assert loadtest.percentile(values, 99) == 99.0
+    assert loadtest.percentile([0.2], 95) == 0.2
+    assert loadtest.percentile([], 50) is None
+
+
+def test_plan_is_deterministic_and_alternates_bodies() -> None:
+    def plan():
+        return loadtest.plan_requests(
+            6,
+            {"json": 1, "multipart": 1},
+            size=64,
+            max_dimension=64,
+            gif_ratio=0.5,
+            gif_frames=2,
+            body="mixed",
+            source_pool=2,
+            seed=7,
+        )
+
+    first, second = plan(), plan()
+    assert [item.response_format for item in first] == [item.response_format for item in second]
+    assert [item.body for item in first] == ["json", "form"] * 3
+    assert first[0].content_type == "application/json"
+    assert first[1].content_type.startswith("multipart/form-data; boundary=")
+
+
+def test_run_load_reports_latency_and_statuses() -> None:
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        planned = loadtest.plan_requests(
+            4,
+            loadtest.parse_mix("json,binary,url,multipart"),
+            size=64,
+            max_dimension=64,
+            gif_ratio=0.0,
+            gif_frames=2,
+            body="mixed",
+            source_pool=0,
+            seed=1,
+        )
+        samples, elapsed = loadtest.run_load(
+            f"http://127.0.0.1:{server.server_port}", planned, rate=20.0, concurrency=4, timeout=60
+        )
+    finally:
+        server.shutdown()
+
+    summary = loadtest.summarize(samples, elapsed)
+    assert summary["requests"] == 4
+    assert summary["succeeded"] == 4, summary["statuses"]
+    assert summary["error_rate"] == 0.0
+    assert summary["latency_seconds"]["p50"] > 0
+    assert summary["statuses"] == {"200": 4}
+    assert "RSS" not in loadtest.render_summary(summary, None)
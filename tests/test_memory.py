@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from app.services import memory
+from app.services.memory import MemoryMeter, current_rss
+
+pytestmark = pytest.mark.skipif(current_rss() is None, reason="RSS is not readable on this platform")
+
+
+def test_meter_reports_peak_growth_after_memory_is_freed() -> None:
+    meter = MemoryMeter()
+    block = b"\x01" * (64 * 1024 * 1024)
+    meter.sample()
+    del block
+    peak = meter.close()
+    assert peak >= 48 * 1024 * 1024
+    assert meter.close() == peak
+
+
+def test_limit_is_checked_against_the_peak(monkeypatch) -> None:
+    readings = itertools.count(100 * 1024 * 1024, 4 * 1024 * 1024)
+    monkeypatch.setattr(memory, "current_rss", lambda: next(readings))
+
+    meter = MemoryMeter(limit_bytes=10 * 1024 * 1024)
+    assert not meter.over_limit()
+    assert not meter.over_limit()
+    assert meter.over_limit()
+    meter.close()
+    assert not MemoryMeter().over_limit()
+
+
+def test_meters_open_at_the_same_time_share_a_process_wide_ceiling(monkeypatch) -> None:
+    rss = [100 * 1024 * 1024]
+    monkeypatch.setattr(memory, "current_rss", lambda: rss[0])
+
+    first = MemoryMeter(limit_bytes=10 * 1024 * 1024)
+    second = MemoryMeter(limit_bytes=10 * 1024 * 1024)
+    # The growth each sees includes the other's, so they are held to their
+    # combined limit rather than their own.
+    assert (first.shared, second.shared) == (True, True)
+    rss[0] += 15 * 1024 * 1024
+    assert not first.over_limit()
+    rss[0] += 10 * 1024 * 1024
+    assert first.over_limit()
+    second.close()
+    # With one meter left open the ceiling shrinks back to its own limit.
+    rss[0] -= 12 * 1024 * 1024
+    assert first.over_limit()
+    rss[0] -= 5 * 1024 * 1024
+    assert not first.over_limit()
+    first.close()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import time
+
+from app.services.metrics import MetricsRegistry, StageTimer, render_samples, size_bucket
+
+
+def test_histograms_and_counters_render_in_prometheus_format() -> None:
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    errors = registry.counter("errors_total", "Errors.", ("type",))
+
+    latency.observe(0.05, route="a")
+    latency.observe(0.5, route="a")
+    latency.observe(5, route="a")
+    errors.inc(type='Bad "input"')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="a"} 5.55' in lines
+    assert 'latency_seconds_count{route="a"} 3' in lines
+    assert 'errors_total{type="Bad \\"input\\""} 1' in lines
+    assert render_samples("depth", "Depth.", "gauge", [({}, 2)]).splitlines()[-1] == "depth 2"
+
+
+def test_stage_timer_records_one_total_per_stage() -> None:
+    timer = StageTimer().set_labels(True, (300, 100))
+    assert (timer.format, timer.size) == ("gif", "512")
+    timer.add("blend", 0.25)
+    timer.add("blend", 0.25)
+    with timer.stage("encode"):
+        pass
+    assert timer.totals["blend"] == 0.5
+    # A nested stage's time is not counted again in the enclosing one.
+    with timer.stage("parse"):
+        with timer.stage("base64_decode"):
+            time.sleep(0.05)
+    assert timer.totals["base64_decode"] >= 0.05
+    assert timer.totals["parse"] < 0.04
+    timer.flush()
+    assert timer.totals == {}
+    assert size_bucket((8000, 10)) == "larger"
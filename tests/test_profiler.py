@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pstats
+
+from app.services.profiler import RequestProfiler, create_profiler, make_profile_token
+
+
+def test_only_signed_unexpired_tokens_start_a_capture(tmp_path) -> None:
+    profiler = RequestProfiler(str(tmp_path), secret="s3cret")
+
+    assert profiler.start(None) is None
+    assert profiler.start(make_profile_token("other")) is None
+    assert profiler.start(make_profile_token("s3cret", ttl_seconds=-10)) is None
+    capture = profiler.start(make_profile_token("s3cret"))
+    assert capture is not None and capture.reason == "token"
+
+    assert RequestProfiler(str(tmp_path), sample_rate=1.0).start().reason == "sample"
+    assert create_profiler(False, str(tmp_path), "s3cret") is None
+    assert create_profiler(True, str(tmp_path)) is None
+
+
+def test_captures_are_written_with_metadata_and_trimmed(tmp_path) -> None:
+    profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, max_captures=2)
+    for index in range(3):
+        capture = profiler.start()
+        capture.run(sorted, range(100))
+        path = capture.finish({"index": index})
+        assert capture.finish({"index": index}) is None
+
+    captures = profiler.captures()
+    assert [record["index"] for record in captures] == [2, 1]
+    assert len(list(tmp_path.glob("*.pstats"))) == 2
+    stats = pstats.Stats(str(path))
+    assert any(name == "sorted" or "sorted" in name for _, _, name in stats.stats)
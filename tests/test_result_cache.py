@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from PIL import Image
+
+from app.services.result_cache import ResultCache, request_key
+from app.services.transformation_service import TransformationRequest, TransformationResult
+
+
+def _request(**overrides) -> TransformationRequest:
+    image = Image.new("RGB", (8, 8))
+    fields = dict(
+        source=image,
+        target=image,
+        blend_ratio=0.5,
+        make_gif=False,
+        gif_frame_count=12,
+        gif_duration=80,
+        max_dimension=256,
+        source_digest="a" * 64,
+        target_digest="b" * 64,
+    )
+    fields.update(overrides)
+    return TransformationRequest(**fields)
+
+
+def _result(size: int) -> TransformationResult:
+    return TransformationResult(data=b"x" * size, mime_type="image/png", width=1, height=1, frame_count=1)
+
+
+def test_request_key_ignores_gif_settings_for_still_images() -> None:
+    assert request_key(_request()) == request_key(_request(gif_frame_count=30))
+    assert request_key(_request()) != request_key(_request(blend_ratio=0.6))
+    assert request_key(_request()) != request_key(_request(target_digest="c" * 64))
+    assert request_key(_request(make_gif=True)) != request_key(
+        _request(make_gif=True, gif_frame_count=30)
+    )
+    assert request_key(_request(source_digest=None)) is None
+
+
+def test_memory_tier_is_bounded_by_bytes() -> None:
+    cache = ResultCache(max_bytes=100)
+    cache.put("a", _result(60))
+    cache.put("b", _result(30))
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", _result(30))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 90
+
+
+def test_disk_tier_survives_a_new_cache_instance(tmp_path) -> None:
+    ResultCache(max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=1000).put("key", _result(10))
+
+    cache = ResultCache(max_bytes=100, disk_dir=str(tmp_path), disk_max_bytes=1000)
+    result = cache.get("key")
+    assert result is not None and result.data == b"x" * 10
+    assert cache.stats()["disk_hits"] == 1
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
 import base64
+import itertools
+import json
+import time
 from io import BytesIO
 
 from PIL import Image
 
 from app import create_app
+from app.routes import _client_identity
+from app.services import memory, transformation_service
+from app.services.profiler import RequestProfiler, make_profile_token
+from app.services.target_cache import default_target_cache
+from app.services.target_pyramid import build_pyramid
 
 
 def _encode_image(color: str = "#3478f6") -> str:
@@ -75,3 +83,417 @@ def test_transform_endpoint_rejects_missing_payload() -> None:
     assert response.status_code == 400
     assert response.is_json
     assert "source_image" in response.get_json()["error"]
+
+
+def test_transform_endpoint_streams_gif_to_temp_url() -> None:
+    app = create_app()
+    client = app.test_client()
+
+    response = client.post(
+        "/api/transform",
+        json={
+            "source_image": _encode_image("#222831"),
+            "make_gif": True,
+            "gif_frame_count": 5,
+            "response_format": "url",
+        },
+    )
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload["mime_type"] == "image/gif"
+    assert payload["frame_count"] == 5
+
+    filename = payload["url"].rsplit("/", 1)[-1]
+    image_response = client.get(f"/api/temp/{filename}")
+    assert image_response.status_code == 200
+    assert image_response.data.startswith(b"GIF89a")
+    assert image_response.data.endswith(b";")
+    image_response.close()
+
+
+def test_transform_endpoint_reports_delta_gif_savings() -> None:
+    app = create_app()
+    client = app.test_client()
+
+    response = client.post(
+        "/api/transform",
+        json={
+            "source_image": _encode_image("#222831"),
+            "make_gif": True,
+            "gif_frame_count": 6,
+            "gif_encoding": "delta",
+        },
+    )
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload["mime_type"] == "image/gif"
+    assert payload["bytes_saved"] >= 0
+
+    invalid = client.post(
+        "/api/transform",
+        json={"source_image": _encode_image(), "gif_encoding": "lossy"},
+    )
+    assert invalid.status_code == 400
+
+
+def test_transform_endpoint_serves_repeated_requests_from_result_cache() -> None:
+    app = create_app()
+    client = app.test_client()
+    cache = app.extensions["result_cache"]
+    body = {"source_image": _encode_image("#0f4c81"), "make_gif": True, "gif_frame_count": 3}
+
+    first = client.post("/api/transform", json={**body, "response_format": "binary"})
+    first_data = first.data
+    first.close()
+    assert cache.stats()["misses"] == 1
+
+    for response_format in ("binary", "json", "url"):
+        response = client.post("/api/transform", json={**body, "response_format": response_format})
+        assert response.status_code == 200
+        if response_format == "binary":
+            assert response.data == first_data
+        elif response_format == "json":
+            assert base64.b64decode(response.get_json()["image"]) == first_data
+        response.close()
+    assert cache.stats()["hits"] == 3
+
+    client.post("/api/transform", json={**body, "gif_frame_count": 4}).close()
+    assert cache.stats()["misses"] == 2
+
+
+def test_streamed_gifs_beyond_the_record_cap_are_not_kept() -> None:
+    app = create_app()
+    app.config["STREAM_RECORD_MAX_BYTES"] = 64
+    client = app.test_client()
+    cache = app.extensions["result_cache"]
+    body = {"source_image": _encode_image("#5b8c5a"), "make_gif": True, "response_format": "binary"}
+
+    for _ in range(2):
+        response = client.post("/api/transform", json=body)
+        assert response.status_code == 200
+        assert response.data.endswith(b";")
+        response.close()
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["entries"] == 0
+
+
+def test_transform_endpoint_rejects_images_from_their_headers() -> None:
+    app = create_app()
+    app.config["MAX_IMAGE_PIXELS"] = 40 * 40
+    client = app.test_client()
+
+    too_large = client.post("/api/transform", json={"source_image": _encode_image()})
+    assert too_large.status_code == 413
+
+    app.config["MAX_IMAGE_PIXELS"] = 40_000_000
+    buffer = BytesIO()
+    Image.new("RGB", (48, 48)).save(buffer, format="PPM")
+    unsupported = client.post(
+        "/api/transform",
+        data={"source_image": (BytesIO(buffer.getvalue()), "source.ppm")},
+        content_type="multipart/form-data",
+    )
+    assert unsupported.status_code == 422
+    assert "Unsupported image format" in unsupported.get_json()["error"]
+
+
+def test_transform_endpoint_multipart_response_carries_raw_image() -> None:
+    app = create_app()
+    client = app.test_client()
+
+    for make_gif in (False, True):
+        response = client.post(
+            "/api/transform",
+            json={
+                "source_image": _encode_image("#5b8c5a"),
+                "make_gif": make_gif,
+                "gif_frame_count": 3,
+                "response_format": "multipart",
+            },
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "multipart/mixed"
+        boundary = response.mimetype_params["boundary"].encode("ascii")
+
+        parts = response.data.split(b"--" + boundary)
+        assert parts[-1] == b"--\r\n"
+        meta_headers, meta_body = parts[1].split(b"\r\n\r\n", 1)
+        image_headers, image_body = parts[2].split(b"\r\n\r\n", 1)
+        metadata = json.loads(meta_body)
+        image = image_body[: -len(b"\r\n")]
+
+        assert b"application/json" in meta_headers
+        assert metadata["mime_type"].encode("ascii") in image_headers
+        assert metadata["frame_count"] == (3 if make_gif else 1)
+        assert Image.open(BytesIO(image)).size == (metadata["width"], metadata["height"])
+        response.close()
+
+
+def test_jobs_run_in_background_and_expose_result_url() -> None:
+    app = create_app()
+    client = app.test_client()
+
+    created = client.post(
+        "/api/jobs",
+        json={"source_image": _encode_image("#9a031e"), "make_gif": True, "gif_frame_count": 4},
+    )
+    assert created.status_code == 202
+    job = created.get_json()
+    assert job["status"] in {"queued", "running", "succeeded"}
+    assert created.headers["Location"] == job["status_url"]
+
+    deadline = time.monotonic() + 30
+    while job["status"] not in {"succeeded", "failed"} and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(job["status_url"]).get_json()
+
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 1.0
+    assert job["result"]["frame_count"] == 4
+    filename = job["result"]["url"].rsplit("/", 1)[-1]
+    image_response = client.get(f"/api/temp/{filename}")
+    assert image_response.data.startswith(b"GIF89a")
+    image_response.close()
+
+    assert client.get("/api/jobs/unknown").status_code == 404
+    assert client.post("/api/jobs", json={}).status_code == 400
+
+
+def test_jobs_are_rejected_when_the_queue_is_full() -> None:
+    app = create_app()
+    app.extensions["job_queue"].max_pending = 0
+    client = app.test_client()
+
+    response = client.post("/api/jobs", json={"source_image": _encode_image()})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_batch_endpoint_streams_one_line_per_source() -> None:
+    app = create_app()
+    client = app.test_client()
+
+    response = client.post(
+        "/api/transform/batch",
+        json={
+            "source_images": [_encode_image("#ff0000"), "not-base64", _encode_image("#0000ff")],
+            "target_image": _encode_image("#00ff00"),
+            "max_dimension": 64,
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = {line["index"]: line for line in map(json.loads, response.data.splitlines())}
+    assert sorted(lines) == [0, 1, 2]
+    assert lines[1]["status"] == 400
+    for index in (0, 2):
+        image = Image.open(BytesIO(base64.b64decode(lines[index]["image"])))
+        assert image.size == (48, 48)
+
+    invalid = client.post("/api/transform/batch", json={"source_images": []})
+    assert invalid.status_code == 400
+
+
+def test_batch_items_are_charged_to_the_admission_budget() -> None:
+    app = create_app()
+    admission = app.extensions["admission"]
+    admission.max_wait = 0
+    client = app.test_client()
+    body = {"source_images": [_encode_image(), _encode_image("#0000ff")], "max_dimension": 64}
+
+    busy = admission.acquire(admission.budget)
+    response = client.post("/api/transform/batch", json=body)
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert [line["status"] for line in lines] == [503, 503]
+    busy.release()
+
+    response = client.post("/api/transform/batch", json=body)
+    assert all("image" in json.loads(line) for line in response.data.splitlines())
+    stats = admission.stats()
+    assert (stats["admitted"], stats["rejected"], stats["in_flight_cost"]) == (3, 2, 0)
+
+
+def test_transform_returns_503_when_admission_budget_is_exhausted() -> None:
+    app = create_app()
+    admission = app.extensions["admission"]
+    admission.max_wait = 0
+    client = app.test_client()
+
+    busy = admission.acquire(admission.budget)
+    response = client.post("/api/transform", json={"source_image": _encode_image()})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+    busy.release()
+    response = client.post(
+        "/api/transform",
+        json={"source_image": _encode_image(), "make_gif": True, "response_format": "binary"},
+    )
+    assert response.status_code == 200
+    response.close()
+
+    stats = client.get("/api/admin/admission").get_json()
+    assert stats["rejected"] == 1
+    assert stats["running"] == 0
+
+
+def test_admin_clients_endpoint_reports_work_per_client() -> None:
+    app = create_app()
+    app.config["CLIENT_WEIGHTS"] = {"secret": 3}
+    with app.test_request_context(headers={"X-API-Key": "secret"}):
+        client, weight = _client_identity()
+    assert client.startswith("key:") and "secret" not in client
+    assert weight == 3
+    with app.test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.7"}):
+        assert _client_identity() == ("addr:10.0.0.7", 1.0)
+    # Unknown keys don't get a flow of their own.
+    with app.test_request_context(headers={"X-API-Key": "made-up"}, environ_base={"REMOTE_ADDR": "10.0.0.7"}):
+        assert _client_identity() == ("addr:10.0.0.7", 1.0)
+    app.config["CLIENT_API_KEYS"] = frozenset({"made-up"})
+    with app.test_request_context(headers={"X-API-Key": "made-up"}):
+        assert _client_identity()[0].startswith("key:")
+
+    ticket = app.extensions["admission"].acquire(2.5, client=client, weight=weight)
+    by_address = app.extensions["admission"].acquire(1, client="addr:10.0.0.7")
+    test_client = app.test_client()
+    assert test_client.get("/api/admin/clients").status_code == 401
+    app.config["ADMIN_API_KEY"] = "admin"
+    assert test_client.get("/api/admin/clients", headers={"X-Admin-Key": "nope"}).status_code == 401
+
+    clients = test_client.get("/api/admin/clients", headers={"X-Admin-Key": "admin"}).get_json()["clients"]
+    assert clients[client]["active"] == 1
+    assert clients[client]["active_cost"] == 2.5
+    # Remote addresses are reported hashed, like API keys.
+    assert "10.0.0.7" not in json.dumps(clients)
+    assert len(clients) == 2 and all(len(name.split(":")[1]) == 12 for name in clients)
+    ticket.release()
+    by_address.release()
+
+
+def test_metrics_endpoint_reports_stage_timings_and_errors() -> None:
+    app = create_app()
+    client = app.test_client()
+
+    client.post("/api/transform", json={"source_image": _encode_image(), "max_dimension": 256})
+    client.post("/api/transform", json={"source_image": "not base64!"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    for stage in ("parse", "base64_decode", "prepare", "blend", "encode"):
+        assert f'obamify_stage_seconds_count{{stage="{stage}",format="png",size="256"}}' in text
+    assert 'obamify_errors_total{type="RequestValidationError"}' in text
+    assert 'obamify_request_seconds_bucket{endpoint="transform",format="png",size="256",status="200",le="+Inf"}' in text
+    assert "obamify_admission_queue_depth 0" in text
+
+
+def test_signed_requests_are_profiled_and_listed(tmp_path) -> None:
+    app = create_app()
+    app.extensions["profiler"] = RequestProfiler(str(tmp_path), secret="s3cret")
+    client = app.test_client()
+
+    response = client.post(
+        "/api/transform",
+        json={"source_image": _encode_image(), "make_gif": True, "gif_frame_count": 4, "response_format": "binary"},
+        headers={"X-Profile-Token": make_profile_token("s3cret")},
+    )
+    response.get_data()
+    response.close()
+    client.post("/api/transform", json={"source_image": _encode_image()})
+
+    # Listing needs a profile token or the admin key.
+    assert client.get("/api/admin/profiles").status_code == 401
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Key": "wrong"}).status_code == 401
+    app.config["ADMIN_API_KEY"] = "admin"
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Key": "admin"}).status_code == 200
+    response = client.get("/api/admin/profiles", headers={"X-Profile-Token": make_profile_token("s3cret")})
+    profiles = response.get_json()["profiles"]
+    assert len(profiles) == 1
+    assert profiles[0]["reason"] == "token"
+    assert profiles[0]["params"]["make_gif"] is True
+    assert profiles[0]["source"]["size"] == [48, 48]
+    assert (tmp_path / profiles[0]["profile"]).exists()
+
+    app.extensions["profiler"] = None
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Key": "admin"}).status_code == 404
+
+
+def test_memory_header_and_ceiling(monkeypatch) -> None:
+    app = create_app()
+    app.config["MEMORY_DEBUG_HEADER"] = True
+    client = app.test_client()
+
+    readings = itertools.count(100 * 1024 * 1024, 1024 * 1024)
+    monkeypatch.setattr(memory, "current_rss", lambda: next(readings))
+    response = client.post("/api/transform", json={"source_image": _encode_image("#112233")})
+    assert response.status_code == 200
+    assert int(response.headers["X-Memory-Peak-Bytes"]) > 0
+
+    app.config["MEMORY_LIMIT_BYTES"] = 1
+    response = client.post(
+        "/api/transform", json={"source_image": _encode_image("#445566"), "make_gif": True}
+    )
+    assert response.status_code == 422
+    assert "would need" in response.get_json()["error"]
+
+    # Within the estimate, the RSS growth of a transform running alone stops it.
+    app.config["MEMORY_LIMIT_BYTES"] = 2 * 1024 * 1024
+    response = client.post(
+        "/api/transform", json={"source_image": _encode_image("#556677"), "make_gif": True}
+    )
+    assert response.status_code == 422
+    assert "needed more than 2 MB" in response.get_json()["error"]
+
+
+def test_streamed_gif_failures_get_error_responses(monkeypatch) -> None:
+    app = create_app()
+    client = app.test_client()
+    blend = transformation_service._blend_frame
+    calls = itertools.count(1)
+
+    def failing_blend(context, mix):
+        if next(calls) >= fail_at:
+            raise transformation_service.TransformationError("Frame could not be rendered.")
+        return blend(context, mix)
+
+    monkeypatch.setattr(transformation_service, "_blend_frame", failing_blend)
+    request = {"make_gif": True, "gif_frame_count": 6}
+
+    fail_at = 3
+    response = client.post(
+        "/api/transform", json={**request, "source_image": _encode_image("#102030"), "response_format": "url"}
+    )
+    assert response.status_code == 422
+    assert response.get_json()["error"] == "Frame could not be rendered."
+
+    # Binary errors before the first frame is out still get their status.
+    fail_at, calls = 1, itertools.count(1)
+    response = client.post(
+        "/api/transform", json={**request, "source_image": _encode_image("#203040"), "response_format": "binary"}
+    )
+    assert response.status_code == 422
+    assert response.is_json
+
+
+def test_registered_targets_are_used_by_id(tmp_path, monkeypatch) -> None:
+    app = create_app()
+    client = app.test_client()
+    target_path = tmp_path / "custom.png"
+    Image.new("RGB", (64, 64), "#00aaff").save(target_path, format="PNG")
+    target_id = build_pyramid(str(target_path), str(tmp_path))
+    monkeypatch.setattr(default_target_cache, "pyramid_dir", str(tmp_path))
+
+    request = {"source_image": _encode_image("#101010"), "blend_ratio": 1.0, "target_id": target_id.name}
+    response = client.post("/api/transform", json=request)
+    assert response.status_code == 200
+    image = Image.open(BytesIO(base64.b64decode(response.get_json()["image"]))).convert("RGB")
+    red, green, blue = image.getpixel((24, 24))
+    assert blue > red
+
+    response = client.post("/api/transform", json={**request, "target_id": "f" * 64})
+    assert response.status_code == 400
+    assert "registered" in response.get_json()["error"]
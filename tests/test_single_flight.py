@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.single_flight import SingleFlight, _try_lock
+
+
+def test_concurrent_identical_calls_share_one_result() -> None:
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def compute() -> object:
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "key", compute)
+        started.wait()
+        followers = [pool.submit(flight.do, "key", compute) for _ in range(3)]
+        results = [leader.result()] + [future.result() for future in followers]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert (flight.leaders, flight.coalesced, flight.in_flight()) == (1, 3, 0)
+
+
+def test_errors_are_shared_and_abandoned_calls_recompute() -> None:
+    flight = SingleFlight()
+
+    leader, call = flight.join("key")
+    assert leader
+    assert flight.join("key")[0] is False
+    flight.publish("key", call, error=ValueError("boom"))
+    with pytest.raises(ValueError):
+        flight.wait(call)
+
+    leader, call = flight.join("other")
+    flight.publish("other", call, None)
+    assert flight.wait(call) is None
+    assert flight.do("other", lambda: "fresh") == "fresh"
+
+
+def test_lock_holder_result_is_rechecked_by_other_processes(tmp_path) -> None:
+    # Two instances stand in for two worker processes sharing a lock directory.
+    first = SingleFlight(lock_dir=str(tmp_path))
+    second = SingleFlight(lock_dir=str(tmp_path))
+    shared_cache = {}
+    entered = threading.Event()
+
+    def slow() -> str:
+        entered.set()
+        time.sleep(0.2)
+        shared_cache["key"] = "computed"
+        return "computed"
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        holder = pool.submit(first.do, "key", slow)
+        entered.wait()
+        waiter = pool.submit(
+            second.do, "key", lambda: "recomputed", lambda: shared_cache.get("key")
+        )
+        assert holder.result() == "computed"
+        assert waiter.result() == "computed"
+
+
+def test_lock_wait_timeout_computes_without_releasing_the_holders_lock(tmp_path) -> None:
+    first = SingleFlight(lock_dir=str(tmp_path))
+    second = SingleFlight(lock_dir=str(tmp_path), wait_timeout=0.05)
+    entered, release = threading.Event(), threading.Event()
+
+    def holder() -> str:
+        entered.set()
+        release.wait(5)
+        return "computed"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        held = pool.submit(first.do, "key", holder)
+        entered.wait()
+        assert second.do("key", lambda: "own", lambda: None) == "own"
+        # The holder's lock is untouched by the waiter that gave up on it.
+        with open(next(tmp_path.glob("*.lock")), "a+b") as handle:
+            assert not _try_lock(handle)
+        release.set()
+        assert held.result() == "computed"
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+
+from PIL import Image, ImageChops
+
+from app.services.target_cache import TargetCache
+from app.services.target_pyramid import build_pyramid, load_pyramid
+
+
+def _write_target(path, color: str = "#ffcc00") -> None:
+    Image.new("RGB", (40, 20), color).save(path, format="PNG")
+
+
+def test_resized_variants_are_cached_per_size(tmp_path) -> None:
+    path = tmp_path / "target.png"
+    _write_target(path)
+    cache = TargetCache(max_variants=2)
+
+    first = cache.get_resized(str(path), (20, 10))
+    assert first.size == (20, 10) and first.mode == "RGBA"
+    assert cache.get_resized(str(path), (20, 10)) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get_resized(str(path), (10, 5))
+    cache.get_resized(str(path), (8, 4))
+    # The LRU holds two variants, so the least recently used one was evicted.
+    assert cache.get_resized(str(path), (20, 10)) is not first
+
+
+def test_changed_file_invalidates_cache(tmp_path) -> None:
+    path = tmp_path / "target.png"
+    _write_target(path, "#000000")
+    cache = TargetCache()
+
+    before = cache.get_resized(str(path), (20, 10))
+    _write_target(path, "#ffffff")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    after = cache.get_resized(str(path), (20, 10))
+
+    assert before.getpixel((0, 0))[:3] == (0, 0, 0)
+    assert after.getpixel((0, 0))[:3] == (255, 255, 255)
+
+
+def test_pyramid_levels_are_memory_mapped_and_used(tmp_path) -> None:
+    path = tmp_path / "target.png"
+    Image.radial_gradient("L").resize((600, 300)).convert("RGB").save(path, format="PNG")
+    pyramid_root = tmp_path / "pyramid"
+    build_pyramid(str(path), str(pyramid_root), widths=(128, 256, 512, 1024))
+
+    pyramid = load_pyramid(str(pyramid_root), str(path))
+    assert pyramid is not None
+    assert [level.size for level in pyramid.levels] == [(128, 64), (256, 128), (512, 256), (600, 300)]
+    assert pyramid.level_for((200, 100)).size == (256, 128)
+    assert pyramid.level_for((200, 280)).size == (600, 300)
+
+    direct = TargetCache().get_resized(str(path), (200, 100))
+    cache = TargetCache(pyramid_dir=str(pyramid_root))
+    assert cache.get(str(path)).size == (600, 300)
+    from_pyramid = cache.get_resized(str(path), (200, 100))
+    difference = ImageChops.difference(direct, from_pyramid).getextrema()
+    assert max(high for _, high in difference) <= 8
+
+
+def test_missing_pyramid_falls_back_to_decoding(tmp_path) -> None:
+    path = tmp_path / "target.png"
+    _write_target(path)
+
+    cache = TargetCache(pyramid_dir=str(tmp_path / "empty"))
+    assert cache.get_resized(str(path), (20, 10)).size == (20, 10)
+
+
+def test_registered_targets_are_found_by_id(tmp_path) -> None:
+    path = tmp_path / "custom.png"
+    _write_target(path, "#00aaff")
+    pyramid_root = tmp_path / "pyramid"
+    target_id = build_pyramid(str(path), str(pyramid_root), widths=(16,)).name
+
+    cache = TargetCache(pyramid_dir=str(pyramid_root))
+    assert cache.get_registered(target_id).size == (40, 20)
+    resized = cache.get_registered_resized(target_id, (20, 10))
+    assert resized.size == (20, 10)
+    assert cache.get_registered_resized(target_id, (20, 10)) is resized
+    assert not cache.is_registered("0" * 64)
+    assert not cache.is_registered("../pyramid")
+
+
+def test_concurrent_builders_write_through_separate_partial_files(tmp_path, monkeypatch) -> None:
+    from app.services import target_pyramid
+
+    path = tmp_path / "target.png"
+    _write_target(path)
+    partials = []
+    replace = os.replace
+
+    def recording_replace(source, destination):
+        partials.append(os.path.basename(source))
+        replace(source, destination)
+
+    monkeypatch.setattr(target_pyramid.os, "replace", recording_replace)
+    build_pyramid(str(path), str(tmp_path / "pyramid"), widths=(16,))
+    build_pyramid(str(path), str(tmp_path / "pyramid"), widths=(16,))
+
+    # Two builds of the same level never share a partial file name.
+    assert len(partials) == len(set(partials)) >= 4
+    assert not list((tmp_path / "pyramid").rglob("*.tmp"))
+    assert load_pyramid(str(tmp_path / "pyramid"), str(path)) is not None
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import time
+
+from app.services import temp_store
+from app.services.temp_store import BUCKET_SECONDS, TempImageStore, create_temp_store
+
+
+def _place(store: TempImageStore, created: int, name: str, size: int = 10, legacy: bool = False) -> str:
+    filename = f"{name}.{created}.png"
+    directory = store.directory if legacy else store.directory / str(created // BUCKET_SECONDS)
+    directory.mkdir(exist_ok=True)
+    (directory / filename).write_bytes(b"x" * size)
+    return filename
+
+
+def test_files_are_bucketed_by_hour_and_found_by_name(tmp_path) -> None:
+    store = TempImageStore(str(tmp_path), expiry_seconds=3600)
+    filename = store.save(b"png-bytes", "image/png")
+
+    created = int(filename.split(".")[1])
+    assert (tmp_path / str(created // BUCKET_SECONDS) / filename).read_bytes() == b"png-bytes"
+    assert store.path(filename) is not None
+    assert store.path("../etc.passwd") is None
+    assert store.stats()["bytes"] == len(b"png-bytes")
+
+    legacy = _place(store, int(time.time()), "legacy", legacy=True)
+    assert store.path(legacy) == tmp_path / legacy
+    store.close()
+
+
+def test_sweep_drops_expired_buckets_and_trims_the_boundary_bucket(tmp_path, monkeypatch) -> None:
+    store = TempImageStore(str(tmp_path), expiry_seconds=2 * BUCKET_SECONDS)
+    now = 100 * BUCKET_SECONDS + 1800
+    old = [_place(store, 90 * BUCKET_SECONDS + offset, f"old{offset}") for offset in (0, 100)]
+    boundary_expired = _place(store, 98 * BUCKET_SECONDS + 100, "boundary-expired")
+    boundary_fresh = _place(store, 98 * BUCKET_SECONDS + 3000, "boundary-fresh")
+    fresh = _place(store, 100 * BUCKET_SECONDS, "fresh")
+    legacy = _place(store, 50 * BUCKET_SECONDS, "legacy", legacy=True)
+
+    rmtree = temp_store.shutil.rmtree
+
+    def unlocked_rmtree(path, ignore_errors=False):
+        # Saves must not wait while whole directories are deleted.
+        assert not store._lock.locked()
+        rmtree(path, ignore_errors=ignore_errors)
+
+    monkeypatch.setattr(temp_store.shutil, "rmtree", unlocked_rmtree)
+    assert store.sweep(now=now) == 4
+    assert not (tmp_path / "90").exists()
+    assert not (tmp_path / legacy).exists()
+    assert not (tmp_path / "98" / boundary_expired).exists()
+    assert (tmp_path / "98" / boundary_fresh).exists()
+    assert (tmp_path / "100" / fresh).exists()
+    assert store.stats()["files"] == 2
+    assert all(store.is_expired(name, now) for name in old)
+
+
+def test_quota_evicts_the_oldest_files_first(tmp_path) -> None:
+    store = TempImageStore(str(tmp_path), expiry_seconds=10 * BUCKET_SECONDS, max_bytes=250)
+    now = int(time.time())
+    oldest = _place(store, now - 2 * BUCKET_SECONDS, "a", size=100)
+    older = _place(store, now - BUCKET_SECONDS, "b", size=100)
+    # Files from another process are picked up by the sweep.
+    assert store.sweep() == 0
+    assert store.stats()["bytes"] == 200
+
+    newest = store.save(b"y" * 100, "image/png")
+    assert store.path(oldest) is None
+    assert store.path(older) is not None
+    assert store.path(newest) is not None
+    assert store.stats()["evicted"] == 1
+    assert store.stats()["bytes"] == 200
+
+    # A single file larger than the quota is still kept.
+    huge = store.save(b"z" * 400, "image/png")
+    assert store.path(huge) is not None
+    assert store.stats()["files"] == 1
+    store.close()
+
+
+def test_created_store_sweeps_without_any_save(tmp_path) -> None:
+    stale = int(time.time()) - 3 * BUCKET_SECONDS
+    bucket = tmp_path / str(stale // BUCKET_SECONDS)
+    bucket.mkdir()
+    (bucket / f"old.{stale}.png").write_bytes(b"x")
+
+    store = create_temp_store(str(tmp_path), expiry_hours=1, sweep_interval=60)
+    deadline = time.time() + 5
+    while bucket.exists() and time.time() < deadline:
+        time.sleep(0.01)
+    assert not bucket.exists()
+    assert store.stats()["expired"] == 1
+    store.close()
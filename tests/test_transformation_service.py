@@ -1,14 +1,20 @@
 from __future__ import annotations
 
+import gc
+import tracemalloc
+import weakref
 from io import BytesIO
 
 import pytest
 from PIL import Image, ImageStat
 
 from app.services.transformation_service import (
+    TransformationError,
     TransformationRequest,
     TransformationResult,
+    estimate_memory,
     transform,
+    transform_stream,
 )
 
 
@@ -82,3 +88,310 @@ def test_blend_ratio_progressively_lightens_result() -> None:
 
     assert means[0] == pytest.approx(means[1])
     assert means[1] < means[2] < means[3]
+
+
+def test_numpy_engine_matches_pillow_within_tolerance() -> None:
+    np = pytest.importorskip("numpy")
+    from app.services import array_engine
+    from app.services.transformation_service import _blend_frame, _build_render_context
+
+    gradient = np.linspace(0, 255, 64 * 64 * 4, dtype=np.float32).reshape(64, 64, 4)
+    source = Image.fromarray(gradient.astype(np.uint8), "RGBA")
+    target = _solid_image("#ffcc00").convert("RGBA")
+    pillow_context = _build_render_context(source, target, "pillow")
+    numpy_context = _build_render_context(source, target, "numpy")
+
+    for mix in (0.0, 0.3, 0.65, 1.0):
+        reference = np.asarray(_blend_frame(pillow_context, mix), dtype=np.int16)
+        fused = np.asarray(_blend_frame(numpy_context, mix), dtype=np.int16)
+        assert np.abs(reference - fused).max() <= array_engine.PILLOW_TOLERANCE
+
+
+def test_unknown_engine_is_rejected() -> None:
+    request = TransformationRequest(
+        source=_solid_image("#336699"),
+        target=_solid_image("#ffcc00"),
+        blend_ratio=0.5,
+        make_gif=False,
+        gif_frame_count=4,
+        gif_duration=80,
+        max_dimension=None,
+        engine="cuda",
+    )
+
+    with pytest.raises(TransformationError):
+        transform(request)
+
+
+def test_animation_renders_each_distinct_mix_once(monkeypatch) -> None:
+    from app.services import transformation_service
+
+    calls = []
+    original = transformation_service._RenderContext.render
+
+    def counting_render(self, mix):
+        calls.append(mix)
+        return original(self, mix)
+
+    monkeypatch.setattr(transformation_service._RenderContext, "render", counting_render)
+    request = TransformationRequest(
+        source=_solid_image("#112233"),
+        target=_solid_image("#ddeeff"),
+        blend_ratio=0.8,
+        make_gif=True,
+        gif_frame_count=7,
+        gif_duration=80,
+        max_dimension=None,
+    )
+
+    result = transform(request)
+
+    assert result.frame_count == 7
+    assert len(calls) == 4
+    gif = Image.open(BytesIO(result.data))
+    assert gif.n_frames == 7
+    gif.seek(1)
+    second = gif.convert("RGB")
+    gif.seek(5)
+    assert second.tobytes() == gif.convert("RGB").tobytes()
+
+
+def test_long_animations_re_render_mirrored_frames_beyond_the_window(monkeypatch) -> None:
+    from app.services import transformation_service
+
+    calls = []
+    original = transformation_service._RenderContext.render
+
+    def counting_render(self, mix):
+        calls.append(mix)
+        return original(self, mix)
+
+    monkeypatch.setattr(transformation_service._RenderContext, "render", counting_render)
+    request = TransformationRequest(
+        source=_solid_image("#112233"),
+        target=_solid_image("#ddeeff"),
+        blend_ratio=0.8,
+        make_gif=True,
+        gif_frame_count=24,
+        gif_duration=80,
+        max_dimension=None,
+    )
+
+    result = transform(request)
+
+    # Positions 8-11 are within MIRROR_WINDOW of their mirrors 15-12 and reuse them.
+    assert transformation_service.MIRROR_WINDOW == 8
+    assert len(calls) == 20
+    assert result.frame_count == 24
+    gif = Image.open(BytesIO(result.data))
+    # The two middle positions share a mix and are written as one frame.
+    assert gif.n_frames == 23
+    gif.seek(1)
+    second = gif.convert("RGB")
+    gif.seek(21)
+    assert second.tobytes() == gif.convert("RGB").tobytes()
+
+
+def test_delta_encoding_keeps_a_bounded_number_of_indexed_frames(monkeypatch) -> None:
+    from app.services import gif_encoder, transformation_service
+
+    live = set()
+    peak = 0
+    original = gif_encoder.apply_palette
+
+    def tracking_apply_palette(frame, palette):
+        nonlocal peak
+        indexed = original(frame, palette)
+        live.add(id(indexed))
+        weakref.finalize(indexed, live.discard, id(indexed))
+        peak = max(peak, len(live))
+        return indexed
+
+    monkeypatch.setattr(gif_encoder, "apply_palette", tracking_apply_palette)
+    request = TransformationRequest(
+        source=_solid_image("#112233"),
+        target=_solid_image("#ddeeff"),
+        blend_ratio=0.8,
+        make_gif=True,
+        gif_frame_count=60,
+        gif_duration=80,
+        max_dimension=None,
+        gif_encoding="delta",
+    )
+
+    gc.disable()
+    try:
+        result = transform(request)
+    finally:
+        gc.enable()
+
+    assert result.frame_count == 60
+    # The previous frame and the ones waiting for a mirror within the window,
+    # rather than half of the 60 frames.
+    assert transformation_service.MIRROR_WINDOW == 8
+    assert peak <= 10
+
+
+def test_encoded_frames_are_freed_without_the_cyclic_collector() -> None:
+    from app.services.gif_encoder import GifStreamWriter
+
+    frame = Image.effect_noise((256, 256), 60).convert("P")
+    gc.disable()
+    tracemalloc.start()
+    try:
+        for _ in range(30):
+            block = GifStreamWriter.encode(frame)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    assert peak < 5 * len(block)
+
+
+def test_transform_stream_yields_gif_chunks_per_frame() -> None:
+    from app.services.transformation_service import transform_stream
+
+    request = TransformationRequest(
+        source=_solid_image("#112233"),
+        target=_solid_image("#ddeeff"),
+        blend_ratio=0.8,
+        make_gif=True,
+        gif_frame_count=7,
+        gif_duration=80,
+        max_dimension=None,
+    )
+
+    stream = transform_stream(request)
+    assert (stream.mime_type, stream.width, stream.height) == ("image/gif", 64, 64)
+    chunks = list(stream.chunks)
+
+    assert len(chunks) >= stream.frame_count
+    assert chunks[0].startswith(b"GIF89a")
+    assert chunks[-1].endswith(b";")
+    assert Image.open(BytesIO(b"".join(chunks))).n_frames == 7
+
+
+def test_numpy_batch_renderer_matches_single_frames_across_chunks() -> None:
+    np = pytest.importorskip("numpy")
+    from app.services import array_engine
+
+    rng = np.random.default_rng(7)
+    source = rng.integers(0, 256, size=(16, 24, 3), dtype=np.uint8)
+    target = rng.integers(0, 256, size=(16, 24, 3), dtype=np.uint8)
+    softened = rng.integers(0, 256, size=(16, 24, 3), dtype=np.uint8)
+    mixes = [0.1, 0.4, 0.7]
+    means = [100.0, 120.0, 140.0]
+
+    # A budget of two frames forces the renderer to split the batch.
+    batched = list(array_engine.blend_batch(source, target, softened, mixes, means, 2 * 16 * 24 * 3))
+
+    assert len(batched) == 3
+    for frame, mix, mean in zip(batched, mixes, means):
+        single = array_engine.blend_pixels(source, target, softened, mix, mean)
+        assert np.array_equal(frame, single)
+
+
+def test_delta_gif_encoding_is_smaller_and_reports_savings() -> None:
+    gradient = Image.linear_gradient("L").resize((96, 96)).convert("RGBA")
+
+    def _request(encoding: str) -> TransformationRequest:
+        return TransformationRequest(
+            source=gradient,
+            target=_solid_image("#ffcc00", size=96),
+            blend_ratio=0.6,
+            make_gif=True,
+            gif_frame_count=9,
+            gif_duration=80,
+            max_dimension=None,
+            gif_encoding=encoding,
+        )
+
+    full = transform(_request("full"))
+    delta = transform(_request("delta"))
+
+    assert full.bytes_saved == 0
+    assert delta.bytes_saved > 0
+    assert len(delta.data) < len(full.data)
+
+    animation = Image.open(BytesIO(delta.data))
+    assert animation.n_frames == 9
+    assert animation.size == (96, 96)
+    for index in range(animation.n_frames):
+        animation.seek(index)
+        animation.convert("RGB")
+
+
+def test_delta_savings_are_measured_per_frame_for_detailed_sources() -> None:
+    # Frame 0 is the bare source; a detailed one must not hide the savings.
+    source = Image.effect_mandelbrot((128, 128), (-2.0, -1.5, 1.0, 1.5), 100).convert("RGB")
+    request = TransformationRequest(
+        source=source,
+        target=_solid_image("#ffcc00", size=128),
+        blend_ratio=0.65,
+        make_gif=True,
+        gif_frame_count=12,
+        gif_duration=80,
+        max_dimension=None,
+        gif_encoding="delta",
+    )
+
+    delta = transform(request)
+    assert 0 < delta.bytes_saved < len(delta.data)
+
+
+def test_memory_estimate_refuses_requests_before_rendering() -> None:
+    request = TransformationRequest(
+        source=_solid_image("#112233", size=256),
+        target=_solid_image("#ddeeff"),
+        blend_ratio=0.5,
+        make_gif=True,
+        gif_frame_count=6,
+        gif_duration=80,
+        max_dimension=128,
+    )
+    # Six working frames of 128x128 RGBA plus three kept for the mirrored
+    # half: the output size, not the 256px upload.
+    assert estimate_memory(request) == 9 * 128 * 128 * 4
+    # A buffered result also holds its encoded output.
+    assert estimate_memory(request, buffered=True) == 9 * 128 * 128 * 4 + 3 * 128 * 128 * 6
+
+    request.memory_limit_bytes = estimate_memory(request) - 1
+    with pytest.raises(TransformationError, match="memory"):
+        transform_stream(request)
+
+
+def test_transform_many_prepares_shared_target_once_per_size(monkeypatch) -> None:
+    from app.services import transformation_service
+    from app.services.transformation_service import transform_many
+
+    calls = []
+    original = transformation_service._prepare_image
+
+    def counting_prepare(image, max_dimension):
+        calls.append(image)
+        return original(image, max_dimension)
+
+    monkeypatch.setattr(transformation_service, "_prepare_image", counting_prepare)
+    target = Image.new("RGB", (40, 40), "#00ff00")
+    payloads = [
+        TransformationRequest(
+            source=Image.new("RGB", size, "#ff0000"),
+            target=target,
+            blend_ratio=0.5,
+            make_gif=False,
+            gif_frame_count=2,
+            gif_duration=80,
+            max_dimension=64,
+        )
+        for size in [(32, 32), (24, 16), (32, 32)]
+    ]
+    payloads.append(lambda: payloads[0])
+    payloads.append(lambda: (_ for _ in ()).throw(TransformationError("bad source")))
+
+    results = dict(transform_many(payloads, max_workers=2))
+
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert isinstance(results[4], TransformationError)
+    assert (results[1].width, results[1].height) == (24, 16)
+    assert results[0].data == results[2].data == results[3].data
+    assert sum(image is target for image in calls) == 1